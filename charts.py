@@ -0,0 +1,284 @@
+"""
+Plotly figures from data binned on the server.
+
+Histograms, heatmaps and density contours are binned here with NumPy and sent to the browser as compact, pre-binned
+traces, instead of sending every hourly point for Plotly to bin client-side. The payload then depends only on the
+number of bins, not on the length of the weather record.
+
+Time series are likewise reduced to about two points per pixel of chart width, keeping each bucket's minimum and
+maximum so peaks survive. That bounds every trace to a few thousand points, so they are drawn as SVG. Re-aggregation
+only happens through the `select_time_window` slider, which re-downsamples the chosen window so detail appears as it
+narrows. Zooming or panning in the Plotly chart itself (relayout) is not sent back to the server, so it only
+magnifies the points already drawn.
+
+Finished figures are kept in `figure_cache`, keyed by a fingerprint of the data and parameters they are built from,
+so a rerun triggered by an unrelated widget reuses them instead of binning and building them again.
+"""
+import threading
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from models import cache
+
+DENSITY_BINS = 50
+CHART_WIDTH_PX = 1200  # rendered width of a full-width chart on a typical screen
+FIGURE_CACHE_SIZE = 32  # figures are bounded by binning and downsampling to a few hundred kB each
+
+
+def __as_numeric__(values) -> tuple:
+    """
+    :return: tuple of (float64 array, dtype to convert bin positions back to, e.g. datetime64 for a time axis)
+    """
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(float), values.dtype
+    return values.astype(float), None
+
+
+def __from_numeric__(values: np.ndarray, dtype):
+    return values if dtype is None else values.astype(np.int64).astype('datetime64[ns]')
+
+
+def get_bin_edges(values: np.ndarray, bins: int, value_range: tuple = None) -> np.ndarray:
+    """
+    `bins` equal-width bins spanning `value_range`, or the finite values.
+    """
+    if value_range is None:
+        finite = values[np.isfinite(values)]
+        value_range = (finite.min(), finite.max()) if finite.size else (0., 1.)
+    lower, upper = value_range
+    if upper <= lower:
+        upper = lower + 1.
+    return np.linspace(lower, upper, bins + 1)
+
+
+def bin_1d(x, bins: int, weights=None, value_range: tuple = None) -> tuple:
+    """
+    1D histogram ignoring missing values.
+    :param weights: values summed per bin, or None to count
+    :return: tuple of (bin centers, bin width, per-bin counts or sums)
+    """
+    x, dtype = __as_numeric__(x)
+    edges = get_bin_edges(x, bins, value_range=value_range)
+    weights = None if weights is None else np.asarray(weights, dtype=float)
+
+    valid = np.isfinite(x) if weights is None else np.isfinite(x) & np.isfinite(weights)
+    z, _ = np.histogram(x[valid], bins=edges, weights=None if weights is None else weights[valid])
+
+    return __from_numeric__((edges[:-1] + edges[1:]) / 2, dtype), edges[1] - edges[0], z
+
+
+def bin_2d(x, y, bins: tuple, weights=None, range_x: tuple = None, range_y: tuple = None) -> tuple:
+    """
+    2D histogram ignoring missing values.
+    :param bins: tuple of (x bins, y bins)
+    :param weights: values summed per bin, or None to count
+    :return: tuple of (x bin centers, y bin centers, counts or sums shaped (y bins, x bins) as Plotly expects)
+    """
+    x, x_dtype = __as_numeric__(x)
+    y, y_dtype = __as_numeric__(y)
+    x_edges = get_bin_edges(x, bins[0], value_range=range_x)
+    y_edges = get_bin_edges(y, bins[1], value_range=range_y)
+    weights = None if weights is None else np.asarray(weights, dtype=float)
+
+    valid = np.isfinite(x) & np.isfinite(y)
+    if weights is not None:
+        valid &= np.isfinite(weights)
+    z, _, _ = np.histogram2d(
+        x[valid], y[valid], bins=(x_edges, y_edges), weights=None if weights is None else weights[valid]
+    )
+
+    return (
+        __from_numeric__((x_edges[:-1] + x_edges[1:]) / 2, x_dtype),
+        __from_numeric__((y_edges[:-1] + y_edges[1:]) / 2, y_dtype),
+        z.T
+    )
+
+
+def density_contour(
+        x,
+        y,
+        x_title: str,
+        y_title: str,
+        title: str,
+        bins: int = DENSITY_BINS,
+        range_x: tuple = None,
+        range_y: tuple = None,
+        height: int = 600
+) -> go.Figure:
+    """
+    Pre-binned equivalent of `px.density_contour`: contours of the number of hours per (x, y) bin.
+    """
+    x_centers, y_centers, z = bin_2d(x, y, bins=(bins, bins), range_x=range_x, range_y=range_y)
+
+    fig = go.Figure(go.Contour(x=x_centers, y=y_centers, z=z, hovertemplate='count=%{z}<extra></extra>'))
+    fig.update_layout(title=title, height=height, xaxis_title=x_title, yaxis_title=y_title)
+    return fig
+
+
+def density_heatmap(
+        x,
+        y,
+        z,
+        x_title: str,
+        y_title: str,
+        title: str,
+        nbins_x: int = DENSITY_BINS,
+        nbins_y: int = DENSITY_BINS,
+        height: int = 600
+) -> go.Figure:
+    """
+    Pre-binned equivalent of `px.density_heatmap(..., histfunc='sum')`: `z` summed per (x, y) bin.
+    """
+    x_centers, y_centers, z = bin_2d(x, y, bins=(nbins_x, nbins_y), weights=z)
+
+    fig = go.Figure(go.Heatmap(x=x_centers, y=y_centers, z=z))
+    fig.update_layout(title=title, height=height, xaxis_title=x_title, yaxis_title=y_title)
+    return fig
+
+
+def histogram(x, ys: dict, x_title: str, title: str, nbins: int, height: int = 600) -> go.Figure:
+    """
+    Pre-binned equivalent of `px.histogram(..., histfunc='sum')` over several columns: each of `ys` (name -> values)
+    summed per x bin, stacked.
+    """
+    x, _ = __as_numeric__(x)
+    edges = get_bin_edges(x, nbins)
+
+    fig = go.Figure()
+    for name, values in ys.items():
+        centers, width, z = bin_1d(x, nbins, weights=values, value_range=(edges[0], edges[-1]))
+        fig.add_trace(go.Bar(x=centers, y=z, width=width, name=name))
+    fig.update_layout(
+        title=title, height=height, barmode='relative', bargap=0, xaxis_title=x_title, yaxis_title='sum of value'
+    )
+    return fig
+
+
+def downsample_min_max(y, buckets: int) -> np.ndarray:
+    """
+    Indices of the points to keep to draw `y` in `buckets` columns: the first and last point, and the minimum and
+    maximum of each bucket of consecutive points, so peaks and troughs are preserved. Buckets with no values keep
+    one missing point, so gaps stay visible.
+    :return: sorted indices into `y`, all of them if `y` has no more than two points per bucket
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= 2 * buckets:
+        return np.arange(n)
+
+    size = -(-n // buckets)
+    padded = np.full(size * buckets, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+
+    empty = np.isnan(padded).all(axis=1)
+    indices = np.concatenate([
+        offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1),
+        offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1),
+        offsets[empty],
+        [0, n - 1]
+    ])
+    return np.unique(indices[indices < n])
+
+
+def line(x, y, name: str, width_px: int = CHART_WIDTH_PX, time_window: tuple = None, **kwargs):
+    """
+    Line trace of a long series, downsampled to `width_px` min/max buckets.
+    :param time_window: optional (start, end) of `x` to draw, from `select_time_window`
+    :param kwargs: further trace properties, e.g. `line=dict(color=...)`
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    if time_window is not None:
+        in_window = (x >= np.datetime64(time_window[0])) & (x <= np.datetime64(time_window[1]))
+        x, y = x[in_window], y[in_window]
+
+    keep = downsample_min_max(y, buckets=width_px)
+    return go.Scatter(x=x[keep], y=y[keep], name=name, mode='lines', **kwargs)
+
+
+def get_resample_rule(index: pd.DatetimeIndex, width_px: int = CHART_WIDTH_PX) -> str:
+    """
+    Resampling period giving at most about `width_px` periods over `index`: whole hours up to a day, whole days
+    beyond, and never finer than one hour.
+    """
+    if len(index) < 2:
+        return '1h'
+    hours = int(np.ceil((index.max() - index.min()) / pd.Timedelta(hours=1) / width_px))
+    if hours <= 24:
+        return f'{max(hours, 1)}h'
+    return f'{int(np.ceil(hours / 24))}D'
+
+
+def select_time_window(index, key: str):
+    """
+    Slider to zoom time-series charts into part of the record. Charts re-aggregate to the chosen window, so
+    narrowing it shows finer detail; this is the only way to re-aggregate, as Plotly zoom is not sent to the server.
+    :return: (start, end) of the window, or None if `index` is not a DatetimeIndex spanning more than one time
+    """
+    if not isinstance(index, pd.DatetimeIndex) or len(index) < 2 or index.min() == index.max():
+        return None
+
+    start, end = index.min().to_pydatetime(), index.max().to_pydatetime()
+    return st.slider(
+        label='Time window',
+        min_value=start,
+        max_value=end,
+        value=(start, end),
+        format='YYYY-MM-DD',
+        key=key,
+        help='Zoom the time-series charts into part of the record for more detail.'
+    )
+
+
+@dataclass
+class FigureCache:
+    """
+    Bounded, least-recently-used cache of finished figures, keyed by the fingerprint of the function that builds a
+    figure and the arguments it is built from. Shared by every session, so it is thread-safe; cached figures are
+    shared too, so they must be finished (styled) inside the build function and not modified afterwards.
+    """
+    maxsize: int = FIGURE_CACHE_SIZE
+    entries: OrderedDict = field(default_factory=OrderedDict, repr=False)
+    hits: int = 0
+    misses: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def get(self, build, *args, **kwargs) -> go.Figure:
+        # pages are re-executed on every rerun, so build functions are identified by name and file, not identity
+        key = cache.fingerprint(build.__code__.co_filename, build.__qualname__, args, kwargs)
+
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        fig = build(*args, **kwargs)
+
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = fig
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return fig
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+figure_cache = FigureCache()
+
+
+def get_figure(build, *args, **kwargs) -> go.Figure:
+    """
+    `build(*args, **kwargs)`, from `figure_cache` when it was built from the same data and parameters before.
+    All inputs of the figure must be passed as arguments, since they are what the figure is cached by.
+    """
+    return figure_cache.get(build, *args, **kwargs)
@@ -0,0 +1,114 @@
+"""
+Downloads of result and weather tables, serialized only when they are requested.
+
+`download` lets users choose the columns and the format (CSV, Parquet or Arrow) and serializes only in the rerun
+where they ask for the file, so other reruns no longer format whole tables that nobody downloads. The download
+button is then given the bytes, which works with any Streamlit release that has `st.download_button`; a callable
+`data` would need a recent one. Serialized bytes are kept in `export_cache`, keyed by a fingerprint of the table,
+the columns and the format, so preparing the same export again is served from memory.
+"""
+import io
+import threading
+import pandas as pd
+import streamlit as st
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from models import cache
+
+EXPORT_CACHE_SIZE = 8  # exports of a year of hourly results are a few MB each
+# format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Arrow': ('arrow', 'application/vnd.apache.arrow.file')
+}
+
+
+def serialize(data: pd.DataFrame, export_format: str) -> bytes:
+    """
+    :param export_format: one of `EXPORT_FORMATS`; Arrow is the Arrow IPC file format, readable e.g. with
+        `pyarrow.ipc.open_file` or `pd.read_feather`
+    """
+    if export_format == 'CSV':
+        return data.to_csv().encode('utf-8')
+
+    buffer = io.BytesIO()
+    if export_format == 'Parquet':
+        data.to_parquet(buffer, compression='zstd')
+    elif export_format == 'Arrow':
+        import pyarrow as pa  # imported here since only Arrow exports need it directly
+
+        table = pa.Table.from_pandas(data)
+        with pa.ipc.new_file(buffer, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(f"export format must be one of: {list(EXPORT_FORMATS)}, not {export_format}")
+    return buffer.getvalue()
+
+
+@dataclass
+class ExportCache:
+    """
+    Bounded, least-recently-used cache of serialized exports, keyed by the fingerprint of the table, the columns
+    exported and the format. Shared by every session, each on its own thread, so it is thread-safe.
+    """
+    maxsize: int = EXPORT_CACHE_SIZE
+    entries: OrderedDict = field(default_factory=OrderedDict, repr=False)
+    hits: int = 0
+    misses: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def get(self, data: pd.DataFrame, columns: list, export_format: str) -> bytes:
+        key = cache.fingerprint(data, list(columns), export_format)
+
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        content = serialize(data[list(columns)], export_format)
+
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = content
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return content
+
+
+export_cache = ExportCache()
+
+
+def download(data: pd.DataFrame, file_name: str, key: str, container=st):
+    """
+    Column and format selection with a button that serializes `data` and offers the file for download.
+    Nothing is serialized until that button is clicked.
+    :param file_name: name of the downloaded file without its extension
+    :param key: unique prefix of the widget keys
+    :param container: Streamlit container to draw in, e.g. a column
+    """
+    columns = container.multiselect(
+        label='Columns',
+        options=list(data.columns),
+        default=list(data.columns),
+        key=f'{key}_columns',
+        help='Columns to export. The index (time) is always exported.'
+    )
+    export_format = container.radio(
+        label='Format',
+        options=list(EXPORT_FORMATS),
+        horizontal=True,
+        key=f'{key}_format',
+        help='Parquet and Arrow keep column types and are much smaller and faster to load than CSV.'
+    )
+    extension, mime = EXPORT_FORMATS[export_format]
+
+    if container.button(label=f'Prepare {export_format} download', key=f'{key}_prepare', disabled=not columns):
+        container.download_button(
+            label=f'Download as {export_format}',
+            data=export_cache.get(data, columns, export_format),
+            file_name=f'{file_name}.{extension}',
+            mime=mime,
+            key=f'{key}_download'
+        )
@@ -0,0 +1,311 @@
+"""
+Content-addressed caching of simulations.
+Inputs are identified by a fingerprint: a hash of their contents (weather table, equipment parameters, loads,
+tariffs) rather than of object identity, so an equipment object edited in place gets a new fingerprint and
+an equal one rebuilt on a later rerun gets the same.
+"""
+import hashlib
+import os
+import threading
+import uuid
+import weakref
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields, is_dataclass
+from models import simulate as sim
+
+
+def __update__(digest, value):
+    if isinstance(value, pd.DataFrame):
+        digest.update(b'DataFrame')
+        __update__(digest, list(value.columns))
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(b'Series')
+        __update__(digest, value.name)
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Index):
+        digest.update(f'{type(value).__name__}{value.dtype}'.encode())
+        digest.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f'ndarray{value.dtype}{value.shape}'.encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif is_dataclass(value):
+        digest.update(type(value).__qualname__.encode())
+        for f in fields(value):
+            __update__(digest, f.name)
+            __update__(digest, getattr(value, f.name))
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}{len(value)}'.encode())
+        for item in value:
+            __update__(digest, item)
+    elif isinstance(value, dict):
+        digest.update(f'dict{len(value)}'.encode())
+        for key, item in value.items():
+            __update__(digest, key)
+            __update__(digest, item)
+    else:
+        # scalars, strings and None; repr round-trips floats exactly
+        digest.update(f'{type(value).__name__}:{value!r}'.encode())
+
+
+def fingerprint(*values) -> str:
+    """
+    Content hash of any mix of DataFrames, arrays, dataclasses (e.g. equipment), containers and scalars.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        __update__(digest, value)
+    return digest.hexdigest()
+
+
+# fingerprints of the weather tables in use, by id, with a weak reference to the table they belong to. Shared by
+# every session's thread, so only read and written under the lock, and dropped when the table is garbage collected
+__weather_fingerprints__ = {}
+__weather_fingerprints_lock__ = threading.Lock()
+
+
+def __forget_weather__(key: int, reference: weakref.ref):
+    with __weather_fingerprints_lock__:
+        if key in __weather_fingerprints__ and __weather_fingerprints__[key][0] is reference:
+            del __weather_fingerprints__[key]
+
+
+def get_weather_fingerprint(weather: pd.DataFrame) -> str:
+    """
+    Fingerprint of a weather table. Weather tables are treated as immutable: each table is hashed once, while it
+    is alive, which keeps reruns on long records interactive. Mappings of weather arrays, which cannot be weakly
+    referenced, are hashed on every call.
+    """
+    key = id(weather)
+    with __weather_fingerprints_lock__:
+        entry = __weather_fingerprints__.get(key)
+    if entry is not None and entry[0]() is weather:
+        return entry[1]
+
+    weather_fingerprint = fingerprint(weather)
+    try:
+        reference = weakref.ref(weather, lambda reference, key=key: __forget_weather__(key, reference))
+    except TypeError:
+        return weather_fingerprint
+
+    with __weather_fingerprints_lock__:
+        __weather_fingerprints__[key] = (reference, weather_fingerprint)
+    return weather_fingerprint
+
+
+@dataclass
+class SimulationCache:
+    """
+    In-memory results and stage-level incremental re-simulation.
+    Whole results are kept by the fingerprint of their inputs, so a rerun with unchanged inputs returns the same
+    SimulationResults without touching disk or any stage. On a miss, each stage of `simulate.STAGES` is keyed by the
+    fingerprint of the inputs it declares (upstream stages by their own keys) and its results are kept in a bounded,
+    least-recently-used cache per stage, shared by both arms. A new tariff re-runs only the cost stage, a new
+    chiller capacity skips the cooling tower stage, and editing only the proposed design serves the whole baseline
+    from the cache. `hits` and `misses` count stages, `result_hits` and `result_misses` whole results.
+    """
+    maxsize: int = 8
+    entries: dict = field(default_factory=dict, repr=False)
+    results: OrderedDict = field(default_factory=OrderedDict, repr=False)
+    hits: int = 0
+    misses: int = 0
+    result_hits: int = 0
+    result_misses: int = 0
+
+    def __resolve__(self, name: str, inputs: sim.SimulationInputs, design: sim.DesignInputs, stage_keys: dict):
+        scope, *path = name.split('.')
+        if scope == 'stage':
+            return stage_keys[path[0]]
+        if name == 'inputs.weather':
+            return get_weather_fingerprint(inputs.weather)
+        value = {'inputs': inputs, 'design': design}[scope]
+        for attribute in path:
+            value = getattr(value, attribute)
+        return value
+
+    def simulate(self, inputs: sim.SimulationInputs, do_model: str = 'both', store=None) -> sim.SimulationResults:
+        """
+        Results for `inputs`: from memory when the same inputs were simulated before, otherwise from `store` and,
+        for the arms it does not hold, from `simulate_stages`.
+        :param store: optional `DiskCache` consulted only on a miss in memory; arms simulated here are saved to it
+        :return: SimulationResults, shared with later calls for the same inputs, so treat them as read-only
+        """
+        key = fingerprint(
+            do_model,
+            get_weather_fingerprint(inputs.weather),
+            inputs.load_it_kw,
+            inputs.energy_cost_dollar_per_kwh,
+            inputs.water_cost_dollar_per_m3,
+            inputs.baseline if do_model in ('both', 'baseline') else None,
+            inputs.proposed if do_model in ('both', 'proposed') else None
+        )
+        if key in self.results:
+            self.result_hits += 1
+            self.results.move_to_end(key)
+            return self.results[key]
+
+        self.result_misses += 1
+        if store is None:
+            results = self.simulate_stages(inputs, do_model=do_model)
+        else:
+            results = store.simulate(inputs, do_model=do_model, simulate=self.simulate_stages)
+        self.results[key] = results
+        while len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+        return results
+
+    def simulate_stages(self, inputs: sim.SimulationInputs, do_model: str = 'both') -> sim.SimulationResults:
+        """
+        Simulate `inputs`, running only the stages whose declared inputs are not in the stage cache.
+        """
+        stage_keys = {}
+
+        def __run_stage__(stage: sim.Stage, model: sim.ResultsBuffer, stage_inputs, design):
+            if stage.name == sim.STAGES[0].name:
+                stage_keys.clear()
+            key = fingerprint(stage.name, *(
+                self.__resolve__(name, inputs=stage_inputs, design=design, stage_keys=stage_keys)
+                for name in stage.inputs
+            ))
+            stage_keys[stage.name] = key
+
+            entries = self.entries.setdefault(stage.name, OrderedDict())
+            if key in entries:
+                self.hits += 1
+                entries.move_to_end(key)
+                columns, result = entries[key]
+                for column, values in columns.items():
+                    model[column] = values
+                return result
+
+            self.misses += 1
+            result = stage.run(system, model, stage_inputs, design)
+            entries[key] = ({column: model[column].copy() for column in stage.columns}, result)
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+            return result
+
+        system = sim.WaterCooledChiller()
+        return system.simulate(inputs=inputs, do_model=do_model, run_stage=__run_stage__)
+
+    def clear(self):
+        self.entries.clear()
+        self.results.clear()
+
+
+@dataclass
+class DiskCache:
+    """
+    Persistent, content-addressed store of simulated arms, shared across app restarts, batch jobs and processes.
+    Each arm is keyed by MODEL_VERSION and a fingerprint of its weather, IT load and design, and stored as a
+    zstd-compressed Parquet file of its hourly results. Tariffs are not part of the key: costs are recomputed on
+    load, and run parameters and part load ratio violations are re-derived from the design.
+    Files are written to a temporary name and atomically renamed, so concurrent readers never see a partial
+    file, and the least recently used files are evicted once the store exceeds `max_bytes`.
+    Requires a Parquet engine (pyarrow).
+    """
+    directory: str
+    max_bytes: int = 512 * 2 ** 20
+    hits: int = 0
+    misses: int = 0
+
+    def get_key(self, inputs: sim.SimulationInputs, design: sim.DesignInputs) -> str:
+        return fingerprint(sim.MODEL_VERSION, get_weather_fingerprint(inputs.weather), inputs.load_it_kw, design)
+
+    def __get_path__(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}.parquet')
+
+    def __load__(self, key: str, inputs: sim.SimulationInputs, design: sim.DesignInputs):
+        path = self.__get_path__(key)
+        try:
+            table = pd.read_parquet(path)
+            os.utime(path)
+        except (FileNotFoundError, OSError):
+            # missing, or evicted by another process between the lookup and the read
+            return None
+        index = sim.get_weather_index(inputs.weather)
+        if list(table.columns) != list(sim.RESULT_COLUMNS) or len(table.index) != len(index):
+            return None
+
+        model = sim.ResultsBuffer(index=index, data=np.ascontiguousarray(table.to_numpy().T))
+        model = sim.WaterCooledChiller().set_run_parameters(model, inputs=inputs, design=design)
+        sim.set_costs(
+            model,
+            energy_cost_dollar_per_kwh=inputs.energy_cost_dollar_per_kwh,
+            water_cost_dollar_per_m3=inputs.water_cost_dollar_per_m3
+        )
+        part_load_ratio_violations = design.chiller.check_part_load_ratio(model['chiller_part_load_ratio [-]'])
+        return model, part_load_ratio_violations
+
+    def __save__(self, key: str, model: sim.ResultsBuffer):
+        path = self.__get_path__(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f'{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+        try:
+            pd.DataFrame(model.data.T, columns=list(model.columns)).to_parquet(
+                temporary_path, compression='zstd', index=False
+            )
+            os.replace(temporary_path, path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        self.__evict__()
+
+    def __evict__(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.parquet'):
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+
+        total_bytes = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def simulate(self, inputs: sim.SimulationInputs, do_model: str = 'both', simulate=None) -> sim.SimulationResults:
+        """
+        Load each requested arm from the store, simulating and storing only the missing ones.
+        :param simulate: callable (inputs, do_model) -> SimulationResults for the missing arms, defaults to
+            `WaterCooledChiller().simulate`; e.g. `SimulationCache.simulate_stages` to re-simulate incrementally
+        """
+        simulate = sim.WaterCooledChiller().simulate if simulate is None else simulate
+
+        results = sim.SimulationResults(weather=inputs.weather if isinstance(inputs.weather, pd.DataFrame) else None)
+        keys, missing = {}, []
+        for arm in ('baseline', 'proposed'):
+            if do_model not in ('both', arm):
+                continue
+            keys[arm] = self.get_key(inputs, getattr(inputs, arm))
+            loaded = self.__load__(keys[arm], inputs=inputs, design=getattr(inputs, arm))
+            if loaded is None:
+                self.misses += 1
+                missing.append(arm)
+            else:
+                self.hits += 1
+                setattr(results, f'{arm}_buffer', loaded[0])
+                setattr(results, f'{arm}_part_load_ratio_violations', loaded[1])
+
+        if missing:
+            simulated = simulate(inputs, do_model='both' if len(missing) == 2 else missing[0])
+            for arm in missing:
+                setattr(results, f'{arm}_buffer', getattr(simulated, f'{arm}_buffer'))
+                setattr(
+                    results,
+                    f'{arm}_part_load_ratio_violations',
+                    getattr(simulated, f'{arm}_part_load_ratio_violations')
+                )
+                self.__save__(keys[arm], getattr(simulated, f'{arm}_buffer'))
+
+        return results
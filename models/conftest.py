@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from models import equipment as eq
+from models import simulate as sim
+from models import weather as wx
+
+
+@pytest.fixture(scope='session')
+def weather() -> pd.DataFrame:
+    """
+    Four weeks of synthetic hourly weather, from cold and dry to hot and humid, so every cooling tower regime
+    (free convection, modulating fan and saturated) occurs.
+    """
+    index = pd.date_range('2021-06-01', periods=28 * 24, freq='h', name='time')
+    hour = np.arange(len(index))
+    # warming from about 5 [C] to 40 [C] over the four weeks, with a daily swing
+    temperature_c = 5 + 35 * hour / len(hour) + 4 * np.sin(2 * np.pi * hour / 24)
+    raw = pd.DataFrame({column: np.nan for column in wx.RAW_COLUMNS}, index=index)
+    raw['temperature [C]'] = temperature_c
+    raw['relative_humidity [%]'] = 55 + 25 * np.sin(2 * np.pi * hour / 24 + 2)
+    raw['air_pressure [hPa]'] = 1013.25
+    return wx.derive_weather(raw, unit_system='SI')
+
+
+@pytest.fixture
+def baseline() -> sim.DesignInputs:
+    return sim.DesignInputs(
+        cooling_tower=eq.CoolingTower(
+            design_wetbulb_c=28,
+            design_approach_c=3.5,
+            design_range_c=5.5556,
+            design_water_flowrate_m3_hr=2800,
+            design_air_flowrate_m3_hr=1900000,
+            design_fan_power_kw=114,
+            operating_tower_water_supply_temperature_c=29.5
+        ),
+        chiller=eq.Chiller(design_cop=6.04, design_cooling_capacity_kw=16000, design_chw_supply_temperature_c=7.22),
+        additional_power_kw=3000,
+        additional_heat_load_kw=2700
+    )
+
+
+@pytest.fixture
+def proposed() -> sim.DesignInputs:
+    return sim.DesignInputs(
+        cooling_tower=eq.CoolingTower(
+            design_wetbulb_c=28,
+            design_approach_c=3.0,
+            design_range_c=5.5556,
+            design_water_flowrate_m3_hr=2800,
+            design_air_flowrate_m3_hr=2100000,
+            design_fan_power_kw=130,
+            operating_tower_water_supply_temperature_c=27.0,
+            operating_cycles_of_concentration=5
+        ),
+        chiller=eq.Chiller(design_cop=6.5, design_cooling_capacity_kw=15000, design_chw_supply_temperature_c=9.0),
+        additional_power_kw=2000,
+        additional_heat_load_kw=1800
+    )
+
+
+@pytest.fixture
+def inputs(weather, baseline, proposed) -> sim.SimulationInputs:
+    return sim.SimulationInputs(
+        weather=weather,
+        load_it_kw=10000,
+        energy_cost_dollar_per_kwh=0.1,
+        water_cost_dollar_per_m3=3.0,
+        baseline=baseline,
+        proposed=proposed
+    )
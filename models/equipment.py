@@ -1,11 +1,12 @@
-import streamlit
+import functools
+import numpy as np
 from scipy import optimize
-import psychrolib
 from dataclasses import dataclass, fields
+from models import psychrometrics
 import utils
 
 
-@dataclass
+@dataclass(frozen=True)
 class CurveBiquadratic:
     constant: float
     x: float
@@ -18,8 +19,16 @@ class CurveBiquadratic:
     y_min: float
     y_max: float
 
+    def evaluate(self, x, y):
+        """
+        Evaluate the curve for scalars or arrays, clipping inputs to the curve's bounds as EnergyPlus does.
+        """
+        x = np.clip(x, self.x_min, self.x_max)
+        y = np.clip(y, self.y_min, self.y_max)
+        return self.constant + self.x * x + self.x2 * x ** 2 + self.y * y + self.y2 * y ** 2 + self.xy * x * y
 
-@dataclass
+
+@dataclass(frozen=True)
 class CurveQuadratic:
     constant: float
     x: float
@@ -27,129 +36,174 @@ class CurveQuadratic:
     x_min: float
     x_max: float
 
+    def evaluate(self, x):
+        """
+        Evaluate the curve for scalars or arrays, clipping inputs to the curve's bounds as EnergyPlus does.
+        """
+        x = np.clip(x, self.x_min, self.x_max)
+        return self.constant + self.x * x + self.x2 * x ** 2
+
 
 @dataclass
-class CoolingTower:
+class PartLoadRatioViolations:
     """
-    Equipment class to define and simulate Cooling Towers.
-    All calculations implemented from EnergyPlus's reference documentation:
-    https://bigladdersoftware.com/epx/docs/8-3/engineering-reference/cooling-towers-and-evaporative-fluid.html#variable-speed-cooling-towers-empirical-models
+    Summary of the timesteps where a chiller operates outside the bounds of its part load ratio curve.
     """
-    design_wetbulb_c: float
-    design_approach_c: float
-    design_range_c: float
-    design_water_flowrate_m3_hr: float
-    design_air_flowrate_m3_hr: float
-    design_fan_power_kw: float
-    operating_tower_water_supply_temperature_c: float
-    count: int = 1
-    operating_cycles_of_concentration: float = 3.5
-    operating_percent_of_water_loss_to_drift: float = 0.02
-    __minimum_range_c__: float = 2.7777777
-    __maximum_water_flowrate_ratio__: float = 1.0
-    __minimum_air_flowrate_ratio__: float = 0.2
-    __maximum_air_flowrate_ratio__: float = 1.0
-    __tower_capacity_fraction_free_convection_regime__: float = 0.125
+    design_cooling_capacity_kw: float
+    x_min: float
+    x_max: float
+    out_of_bounds: np.ndarray
+    hours: int
+    worst_part_load_ratio: float = None
+    suggested_cooling_capacity_kw: float = None
+
+    @property
+    def message(self) -> str:
+        if not self.hours:
+            return ''
+        upsize_text = f" Consider up-sizing your chiller cooling capacity from " \
+                      f"{self.design_cooling_capacity_kw} [kW] to {self.suggested_cooling_capacity_kw} [kW] or " \
+                      f"greater." if self.suggested_cooling_capacity_kw else ''
+        return f"Part Load Ratio out of bounds for {self.hours} hour(s). `part_load_ratio` must be between " \
+               f"({self.x_min}, {self.x_max}), but reached {round(self.worst_part_load_ratio, 3)}.{upsize_text}"
+
+
+def __read_only__(array) -> np.ndarray:
+    array = np.array(array, dtype=float)
+    array.setflags(write=False)
+    return array
+
+
+def __get_cool_tools_basis__(fr_water, fr_air, wetbulb_c, range_c) -> np.ndarray:
     """
-    CoolTools model correlation coefficients
-     (https://bigladdersoftware.com/epx/docs/8-3/engineering-reference/cooling-towers-and-evaporative-fluid.html#tower-heat-rejection)
+    Monomial basis of the CoolTools correlation, ordered to match `CoolingTower.__cool_tools_coefficients__[1:]`.
+    Inputs are broadcast against each other, so any mix of scalars and arrays is accepted.
+    :return: np.ndarray of shape (35, *broadcast shape of inputs)
     """
-    __cool_tools_coefficients__: tuple = (
-        None,  # blank 0th element for alignment with CoolTools definition
-        0.52049709836241,  # c[1]
-        -10.617046395344,  # c[2]
-        10.7292974722538,  # c[3]
-        -2.74988377158227,  # c[4]
-        4.73629943913743,  # c[5]
-        -8.25759700874711,  # c[6]
-        1.57640938114136,  # c[7]
-        6.51119643791324,  # c[8]
-        1.50433525206692,  # c[9]
-        -3.2888529287801,  # c[10]
-        0.0257786145353773,  # c[11]
-        0.182464289315254,  # c[12]
-        -0.0818947291400898,  # c[13]
-        -0.215010003996285,  # c[14]
-        0.0186741309635284,  # c[15]
-        0.0536824177590012,  # c[16]
-        -0.00270968955115031,  # c[17]
-        0.00112277498589279,  # c[18]
-        -0.00127758497497718,  # c[19]
-        0.0000760420796601607,  # c[20]
-        1.43600088336017,  # c[21]
-        -0.5198695909109,  # c[22]
-        0.117339576910507,  # c[23]
-        1.50492810819924,  # c[24]
-        -0.135898905926974,  # c[25]
-        -0.152577581866506,  # c[26]
-        -0.0533843828114562,  # c[27]
-        0.00493294869565511,  # c[28]
-        -0.00796260394174197,  # c[29]
-        0.000222619828621544,  # c[30]
-        -0.0543952001568055,  # c[31]
-        0.00474266879161693,  # c[32]
-        -0.0185854671815598,  # c[33]
-        0.00115667701293848,  # c[34]
-        0.000807370664460284  # c[35]
+    fr_water, fr_air, wetbulb_c, range_c = np.broadcast_arrays(
+        np.asarray(fr_water, dtype=float),
+        np.asarray(fr_air, dtype=float),
+        np.asarray(wetbulb_c, dtype=float),
+        np.asarray(range_c, dtype=float)
     )
+    fr_air2 = fr_air ** 2
+    fr_water2 = fr_water ** 2
+    wetbulb2_c = wetbulb_c ** 2
+    range2_c = range_c ** 2
+    fr_air_water = fr_air * fr_water
+    wetbulb_range_c = wetbulb_c * range_c
+
+    return np.stack([
+        np.ones_like(fr_air),
+        fr_air,
+        fr_air2,
+        fr_air2 * fr_air,
+        fr_water,
+        fr_air_water,
+        fr_air2 * fr_water,
+        fr_water2,
+        fr_air * fr_water2,
+        fr_water2 * fr_water,
+        wetbulb_c,
+        fr_air * wetbulb_c,
+        fr_air2 * wetbulb_c,
+        fr_water * wetbulb_c,
+        fr_air_water * wetbulb_c,
+        fr_water2 * wetbulb_c,
+        wetbulb2_c,
+        fr_air * wetbulb2_c,
+        fr_water * wetbulb2_c,
+        wetbulb2_c * wetbulb_c,
+        range_c,
+        fr_air * range_c,
+        fr_air2 * range_c,
+        fr_water * range_c,
+        fr_air_water * range_c,
+        fr_water2 * range_c,
+        wetbulb_range_c,
+        fr_air * wetbulb_range_c,
+        fr_water * wetbulb_range_c,
+        wetbulb2_c * range_c,
+        range2_c,
+        fr_air * range2_c,
+        fr_water * range2_c,
+        wetbulb_c * range2_c,
+        range2_c * range_c
+    ])
+
+
+def __evaluate_biquadratic__(coefficients: np.ndarray, bounds: tuple, x, y):
+    """
+    Evaluate a biquadratic curve from its coefficients (constant, x, x2, y, y2, xy), clipping inputs to its
+    ((x_min, x_max), (y_min, y_max)) bounds like `CurveBiquadratic.evaluate`.
+    """
+    constant, c_x, c_x2, c_y, c_y2, c_xy = coefficients
+    x = np.clip(x, *bounds[0])
+    y = np.clip(y, *bounds[1])
+    return constant + c_x * x + c_x2 * x ** 2 + c_y * y + c_y2 * y ** 2 + c_xy * x * y
 
-    def __get_approach_temp__(self, fr_water, fr_air, wetbulb_c, range_c):
-        return (
-                + self.__cool_tools_coefficients__[1]
-                + self.__cool_tools_coefficients__[2] * fr_air
-                + self.__cool_tools_coefficients__[3] * fr_air ** 2
-                + self.__cool_tools_coefficients__[4] * fr_air ** 3
-                + self.__cool_tools_coefficients__[5] * fr_water
-                + self.__cool_tools_coefficients__[6] * fr_air * fr_water
-                + self.__cool_tools_coefficients__[7] * fr_air ** 2 * fr_water
-                + self.__cool_tools_coefficients__[8] * fr_water ** 2
-                + self.__cool_tools_coefficients__[9] * fr_air * fr_water ** 2
-                + self.__cool_tools_coefficients__[10] * fr_water ** 3
-                + self.__cool_tools_coefficients__[11] * wetbulb_c
-                + self.__cool_tools_coefficients__[12] * fr_air * wetbulb_c
-                + self.__cool_tools_coefficients__[13] * fr_air ** 2 * wetbulb_c
-                + self.__cool_tools_coefficients__[14] * fr_water * wetbulb_c
-                + self.__cool_tools_coefficients__[15] * fr_air * fr_water * wetbulb_c
-                + self.__cool_tools_coefficients__[16] * fr_water ** 2 * wetbulb_c
-                + self.__cool_tools_coefficients__[17] * wetbulb_c ** 2
-                + self.__cool_tools_coefficients__[18] * fr_air * wetbulb_c ** 2
-                + self.__cool_tools_coefficients__[19] * fr_water * wetbulb_c ** 2
-                + self.__cool_tools_coefficients__[20] * wetbulb_c ** 3
-                + self.__cool_tools_coefficients__[21] * range_c
-                + self.__cool_tools_coefficients__[22] * fr_air * range_c
-                + self.__cool_tools_coefficients__[23] * fr_air ** 2 * range_c
-                + self.__cool_tools_coefficients__[24] * fr_water * range_c
-                + self.__cool_tools_coefficients__[25] * fr_air * fr_water * range_c
-                + self.__cool_tools_coefficients__[26] * fr_water ** 2 * range_c
-                + self.__cool_tools_coefficients__[27] * wetbulb_c * range_c
-                + self.__cool_tools_coefficients__[28] * fr_air * wetbulb_c * range_c
-                + self.__cool_tools_coefficients__[29] * fr_water * wetbulb_c * range_c
-                + self.__cool_tools_coefficients__[30] * wetbulb_c ** 2 * range_c
-                + self.__cool_tools_coefficients__[31] * range_c ** 2
-                + self.__cool_tools_coefficients__[32] * fr_air * range_c ** 2
-                + self.__cool_tools_coefficients__[33] * fr_water * range_c ** 2
-                + self.__cool_tools_coefficients__[34] * wetbulb_c * range_c ** 2
-                + self.__cool_tools_coefficients__[35] * range_c ** 3
-        )
 
-    def get_reference_water_volumetric_flowrate(self):
-        def __solve_approach_temp__(fr_water):
-            calc_approach_c = self.__get_approach_temp__(
-                fr_water=fr_water,
-                fr_air=1.0,
-                wetbulb_c=self.design_wetbulb_c,
-                range_c=self.design_range_c
-            )
-            return abs(self.design_approach_c - calc_approach_c)
+def __evaluate_quadratic__(coefficients: np.ndarray, bounds: tuple, x):
+    """
+    Evaluate a quadratic curve from its coefficients (constant, x, x2), clipping inputs to its (x_min, x_max)
+    bounds like `CurveQuadratic.evaluate`.
+    """
+    constant, c_x, c_x2 = coefficients
+    x = np.clip(x, *bounds)
+    return constant + c_x * x + c_x2 * x ** 2
+
 
-        return min(optimize.newton(__solve_approach_temp__, 0.5), self.__maximum_water_flowrate_ratio__)
+@dataclass(frozen=True, eq=False)
+class CompiledCoolingTower:
+    """
+    Immutable form of a CoolingTower with its design-point derivations done once: the CoolTools coefficients as
+    arrays, the reference water flowrate ratio, the design water mass flowrate and the flowrate ratio clamp bounds.
+    The tower calculations run on this form, so repeat runs and design sweeps derive them once per design.
+    Equality and hashing follow the parameter values it was compiled from. Produced by `CoolingTower.compile`;
+    a design sweep stacks the compiled forms of its designs, so its numeric fields may be (designs, 1) arrays.
+    """
+    parameters: tuple
+    cool_tools_coefficients: np.ndarray
+    cool_tools_fr_air_collapse: np.ndarray
+    reference_fr_water: float
+    design_range_c: float
+    design_water_mass_flowrate_kg_s: float
+    design_air_flowrate_m3_hr: float
+    design_fan_power_kw: float
+    tws_temp_setpoint_c: float
+    cycles_of_concentration: float
+    drift_fraction: float
+    free_convection_capacity_fraction: float
+    maximum_fr_water: float
+    minimum_fr_air: float
+    maximum_fr_air: float
+
+    def __eq__(self, other):
+        return isinstance(other, CompiledCoolingTower) and self.parameters == other.parameters
+
+    def __hash__(self):
+        return hash(self.parameters)
+
+    def get_approach_temp(self, fr_water, fr_air, wetbulb_c, range_c) -> np.ndarray:
+        """
+        Batched CoolTools approach temperature [C].
+        Builds the monomial basis once for all inputs and contracts it against the coefficient vector,
+        so a full year of hourly inputs costs a handful of array operations.
+        """
+        basis = __get_cool_tools_basis__(
+            fr_water=fr_water,
+            fr_air=fr_air,
+            wetbulb_c=wetbulb_c,
+            range_c=range_c
+        )
+        return np.tensordot(self.cool_tools_coefficients, basis, axes=1)
 
     def get_tws_temp_at_max_fan(self, fr_water, wetbulb_c, range_c=None):
 
-        fr_air = 1.0
-        range_c = range_c if range_c else self.design_range_c
+        fr_air = self.maximum_fr_air
+        range_c = self.design_range_c if range_c is None else range_c
 
-        approach_temp_design_range = self.__get_approach_temp__(
+        approach_temp_design_range = self.get_approach_temp(
             fr_water=fr_water,
             fr_air=fr_air,
             wetbulb_c=wetbulb_c,
@@ -160,9 +214,72 @@ class CoolingTower:
 
     def get_tws_temp_free_convection(self, tws_temp_at_max_fan_c, twr_temp_c):
         return twr_temp_c - (
-                self.__tower_capacity_fraction_free_convection_regime__ * (twr_temp_c - tws_temp_at_max_fan_c)
+                self.free_convection_capacity_fraction * (twr_temp_c - tws_temp_at_max_fan_c)
         )
 
+    def get_approach_temp_cubic_in_fr_air(self, fr_water, wetbulb_c, range_c) -> np.ndarray:
+        """
+        With fr_water, wetbulb and range fixed, the CoolTools correlation is a cubic in fr_air.
+        :return: np.ndarray of shape (4, *broadcast shape of inputs) holding the constant, fr_air,
+            fr_air^2 and fr_air^3 coefficients of the approach temperature [C]
+        """
+        basis = __get_cool_tools_basis__(
+            fr_water=fr_water,
+            fr_air=1.0,
+            wetbulb_c=wetbulb_c,
+            range_c=range_c
+        )
+        return np.tensordot(self.cool_tools_fr_air_collapse, basis, axes=1)
+
+    @staticmethod
+    def __solve_fr_air__(cubic, active, minimum_fr_air, maximum_fr_air, tolerance, max_iterations) -> np.ndarray:
+        """
+        Batched, bracketed Newton solve for the root of a cubic in fr_air within the air flowrate ratio bounds.
+        Falls back to bisection whenever a Newton step leaves the bracket. Only hours flagged in `active` are
+        iterated, and each hour drops out of the working set as soon as it converges.
+        :param cubic: np.ndarray of shape (4, n) with the residual polynomial coefficients per hour,
+            positive at the minimum air flowrate ratio and non-positive at the maximum
+        :param active: boolean np.ndarray of shape (n,) selecting the hours to solve
+        :param minimum_fr_air: np.ndarray of shape (n,) of the lower air flowrate ratio bound per hour
+        :param maximum_fr_air: np.ndarray of shape (n,) of the upper air flowrate ratio bound per hour
+        :param tolerance: absolute tolerance on fr_air [-]
+        :param max_iterations: maximum number of Newton/bisection iterations
+        :return: np.ndarray of shape (n,) of fr_air, NaN where not `active`
+        """
+        fr_air = np.full(active.shape, np.nan)
+        idx = np.flatnonzero(active)
+        c0, c1, c2, c3 = cubic[:, idx]
+        lower = minimum_fr_air[idx]
+        upper = maximum_fr_air[idx]
+        x = upper.copy()
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for _ in range(max_iterations):
+                if idx.size == 0:
+                    break
+
+                residual = ((c3 * x + c2) * x + c1) * x + c0
+                slope = (3 * c3 * x + 2 * c2) * x + c1
+
+                # approach falls with increasing air flow, so the root sits between a positive and
+                # a non-positive residual
+                lower = np.where(residual > 0, x, lower)
+                upper = np.where(residual > 0, upper, x)
+
+                x_next = x - residual / slope
+                x_next = np.where((x_next > lower) & (x_next < upper), x_next, 0.5 * (lower + upper))
+
+                converged = (np.abs(x_next - x) <= tolerance) | (upper - lower <= tolerance)
+                fr_air[idx[converged]] = x_next[converged]
+
+                keep = ~converged
+                idx, x = idx[keep], x_next[keep]
+                c0, c1, c2, c3 = c0[keep], c1[keep], c2[keep], c3[keep]
+                lower, upper = lower[keep], upper[keep]
+
+        fr_air[idx] = x
+        return fr_air
+
     def get_tws_temp_and_fr_air(
             self,
             fr_water,
@@ -170,39 +287,72 @@ class CoolingTower:
             tws_temp_free_convection_c,
             tws_temp_setpoint_c,
             wetbulb_c,
-            range_c=None
+            range_c=None,
+            tolerance: float = 1e-6,
+            max_iterations: int = 50
     ):
-        def __solve_fr_air__(fr_air_estimate):
-            calc_approach_temp = self.__get_approach_temp__(
-                fr_water=fr_water,
-                fr_air=fr_air_estimate,
-                wetbulb_c=wetbulb_c,
-                range_c=range_c
+        """
+        Tower water supply temperature [C] and air flowrate ratio [-] for every timestep at once.
+        Hours that cannot reach setpoint run at full fan (fr_air = 1.0), hours that reach setpoint
+        in free convection turn the fan off (fr_air = 0.0), and the remaining hours modulate the fan
+        to hit setpoint, solving the approach cubic in fr_air for all of them in one batched solve.
+        :param tolerance: absolute tolerance on the solved air flowrate ratio [-]
+        :param max_iterations: maximum number of solver iterations per hour
+        :return: tuple of (tower water supply temperature [C], air flowrate ratio [-])
+        """
+        range_c = self.design_range_c if range_c is None else range_c
+
+        fr_water, tws_temp_at_max_fan_c, tws_temp_free_convection_c, tws_temp_setpoint_c, wetbulb_c, range_c, \
+            minimum_fr_air, maximum_fr_air = np.broadcast_arrays(
+                *(np.asarray(v, dtype=float) for v in (
+                    fr_water, tws_temp_at_max_fan_c, tws_temp_free_convection_c, tws_temp_setpoint_c,
+                    wetbulb_c, range_c, self.minimum_fr_air, self.maximum_fr_air
+                ))
             )
-            calc_tws_temp_c = wetbulb_c + calc_approach_temp
-            return abs(tws_temp_setpoint_c - calc_tws_temp_c)
+        shape = fr_water.shape
+
+        saturated = tws_temp_at_max_fan_c > tws_temp_setpoint_c
+        free_convection = ~saturated & (tws_temp_free_convection_c <= tws_temp_setpoint_c)
+        modulating = ~saturated & ~free_convection
 
-        range_c = range_c if range_c else self.design_range_c
+        cubic = self.get_approach_temp_cubic_in_fr_air(
+            fr_water=fr_water.ravel(),
+            wetbulb_c=wetbulb_c.ravel(),
+            range_c=range_c.ravel()
+        )
+        # residual of (calculated - setpoint) tower water supply temperature
+        cubic[0] += wetbulb_c.ravel() - tws_temp_setpoint_c.ravel()
+
+        residual_at_minimum_fr_air = np.polyval(cubic[::-1], minimum_fr_air.ravel())
+        # setpoint is still met with the fan at its minimum speed
+        at_minimum_fr_air = modulating.ravel() & (residual_at_minimum_fr_air <= 0)
+
+        fr_air_modulating = self.__solve_fr_air__(
+            cubic=cubic,
+            active=modulating.ravel() & ~at_minimum_fr_air & np.isfinite(residual_at_minimum_fr_air),
+            minimum_fr_air=minimum_fr_air.ravel(),
+            maximum_fr_air=maximum_fr_air.ravel(),
+            tolerance=tolerance,
+            max_iterations=max_iterations
+        )
+        fr_air_modulating[at_minimum_fr_air] = minimum_fr_air.ravel()[at_minimum_fr_air]
+        fr_air_modulating = fr_air_modulating.reshape(shape)
 
-        if tws_temp_at_max_fan_c > tws_temp_setpoint_c:
-            return tws_temp_at_max_fan_c, 1.0
+        tws_temp_modulating_c = wetbulb_c + self.get_approach_temp(
+            fr_water=fr_water,
+            fr_air=fr_air_modulating,
+            wetbulb_c=wetbulb_c,
+            range_c=range_c
+        )
 
-        elif tws_temp_free_convection_c <= tws_temp_setpoint_c:
-            return tws_temp_setpoint_c, 0.0
+        tws_temp_c = np.where(
+            saturated,
+            tws_temp_at_max_fan_c,
+            np.where(free_convection, tws_temp_setpoint_c, tws_temp_modulating_c)
+        )
+        fr_air = np.where(saturated, maximum_fr_air, np.where(free_convection, 0.0, fr_air_modulating))
 
-        else:
-            fr_air = optimize.minimize_scalar(
-                __solve_fr_air__,
-                bounds=(self.__minimum_air_flowrate_ratio__, self.__maximum_air_flowrate_ratio__),
-                method='bounded'
-            ).x
-            approach_temp_c = self.__get_approach_temp__(
-                fr_water=fr_water,
-                fr_air=fr_air,
-                wetbulb_c=wetbulb_c,
-                range_c=range_c
-            )
-            return wetbulb_c + approach_temp_c, fr_air
+        return tws_temp_c[()], fr_air[()]
 
     def get_fan_power(self, fr_air):
         return self.design_fan_power_kw * fr_air ** 3
@@ -218,21 +368,25 @@ class CoolingTower:
             fr_air,
             unit_system: str = 'SI'
     ):
+        """
+        Evaporation, drift, blowdown and total makeup water flowrates [m^3/s].
+        All inputs may be scalars or arrays; every flowrate is computed for all timesteps at once,
+        and the saturated humidity ratio is calculated without touching PsychroLib's process-global unit system,
+        so concurrent simulations can share the process.
+        :return: tuple of (evaporation, drift, blowdown, total) makeup water flowrates [m^3/s]
+        """
         def calculate_evaporation():
 
-            if unit_system == 'SI':
-                psychrolib.SetUnitSystem(psychrolib.SI)
-            elif unit_system == 'IP':
-                psychrolib.SetUnitSystem(psychrolib.IP)
-            else:
-                raise ValueError(f"`unit_system` parameter must be one of: `SI` or `IP`, not {unit_system}")
-
             air_mass_flowrate_kg_hr = air_flowrate_m3_hr / specific_volume_moist_air
             air_mass_flowrate_kg_s = air_mass_flowrate_kg_hr / 3600
 
-            saturated_humidity_ratio_kgh2o_kgair = psychrolib.GetSatHumRatio(TDryBulb=drybulb_c, Pressure=pressure_pa)
+            saturated_humidity_ratio_kgh2o_kgair = psychrometrics.get_sat_hum_ratio(
+                t_dry_bulb=drybulb_c,
+                pressure=pressure_pa,
+                unit_system=unit_system
+            )
 
-            return max(
+            return np.maximum(
                 air_mass_flowrate_kg_s * (saturated_humidity_ratio_kgh2o_kgair - humidity_ratio_kgh2o_kgair),
                 0
             ) / utils.STANDARD_DENSITY_OF_WATER_KG_M3
@@ -243,8 +397,8 @@ class CoolingTower:
             passing through the tower.
             :return:
             """
-            return max(
-                water_flowrate_m3_s * (self.operating_percent_of_water_loss_to_drift / 100) * fr_air,
+            return np.maximum(
+                water_flowrate_m3_s * self.drift_fraction * fr_air,
                 0
             )
 
@@ -254,10 +408,10 @@ class CoolingTower:
             concentration of mineral scale or other contaminants.
             :param flowrate_evaporation_m3_s: calculated evaporation flowrate [m^3/s]
             :param flowrate_drift_m3_s: calculated drift flowrate [m^3/s]
-            :return: float: blowdown flowrate [m^3/s]
+            :return: blowdown flowrate [m^3/s]
             """
-            return max(
-                flowrate_evaporation_m3_s / (self.operating_cycles_of_concentration - 1) - flowrate_drift_m3_s,
+            return np.maximum(
+                flowrate_evaporation_m3_s / (self.cycles_of_concentration - 1) - flowrate_drift_m3_s,
                 0
             )
 
@@ -275,6 +429,301 @@ class CoolingTower:
             makeup_flowrate_blowdown_m3_s, makeup_flowrate_total_m3_s
 
 
+@dataclass(frozen=True, eq=False)
+class CompiledChiller:
+    """
+    Immutable form of a Chiller: curve coefficients as arrays, ordered like the curves' fields, with their clamp
+    bounds. The chiller calculations run on this form. Equality and hashing follow the parameter values it was
+    compiled from. Produced by `Chiller.compile`; stacked like `CompiledCoolingTower` in design sweeps.
+    """
+    parameters: tuple
+    cooling_capacity_ratio_coefficients: np.ndarray
+    cooling_capacity_ratio_bounds: tuple
+    eir_function_of_temperature_coefficients: np.ndarray
+    eir_function_of_temperature_bounds: tuple
+    eir_function_of_part_load_ratio_coefficients: np.ndarray
+    part_load_ratio_bounds: tuple
+    design_cop: float
+    design_cooling_capacity_kw: float
+    design_chw_supply_temperature_c: float
+
+    def __eq__(self, other):
+        return isinstance(other, CompiledChiller) and self.parameters == other.parameters
+
+    def __hash__(self):
+        return hash(self.parameters)
+
+    def get_cooling_capacity(self, chw_leaving_temp_c, cw_entering_temp_c):
+        cooling_capacity_ratio = __evaluate_biquadratic__(
+            self.cooling_capacity_ratio_coefficients,
+            self.cooling_capacity_ratio_bounds,
+            chw_leaving_temp_c,
+            cw_entering_temp_c
+        )
+        return cooling_capacity_ratio * self.design_cooling_capacity_kw
+
+    def get_part_load_ratio(self, chw_leaving_temp_c, cw_entering_temp_c, cooling_output_kw):
+        cooling_capacity_kw = self.get_cooling_capacity(
+            chw_leaving_temp_c=chw_leaving_temp_c,
+            cw_entering_temp_c=cw_entering_temp_c
+        )
+        return cooling_output_kw / cooling_capacity_kw
+
+    def check_part_load_ratio(self, part_load_ratio) -> PartLoadRatioViolations:
+        """
+        Flag every timestep outside the bounds of the part load ratio curve, instead of failing on the first one.
+        :param part_load_ratio: scalar or array of part load ratios [-]
+        :return: PartLoadRatioViolations with a boolean mask, the number of hours out of bounds,
+            the part load ratio furthest outside the bounds and, if overloaded, a suggested cooling capacity [kW]
+        """
+        x_min, x_max = self.part_load_ratio_bounds
+
+        part_load_ratio = np.asarray(part_load_ratio, dtype=float)
+        below, above = part_load_ratio < x_min, part_load_ratio > x_max
+        out_of_bounds = below | above
+
+        violations = PartLoadRatioViolations(
+            design_cooling_capacity_kw=self.design_cooling_capacity_kw,
+            x_min=x_min,
+            x_max=x_max,
+            out_of_bounds=out_of_bounds,
+            hours=int(out_of_bounds.sum())
+        )
+
+        if above.any():
+            violations.worst_part_load_ratio = float(part_load_ratio[above].max())
+            violations.suggested_cooling_capacity_kw = \
+                round(self.design_cooling_capacity_kw * violations.worst_part_load_ratio * 1.2, -2)
+        elif below.any():
+            violations.worst_part_load_ratio = float(part_load_ratio[below].min())
+
+        return violations
+
+    def get_power(self, chw_leaving_temp_c, cw_entering_temp_c, cooling_output_kw):
+
+        part_load_ratio = self.get_part_load_ratio(
+            chw_leaving_temp_c=chw_leaving_temp_c,
+            cw_entering_temp_c=cw_entering_temp_c,
+            cooling_output_kw=cooling_output_kw
+        )
+
+        eir_function_of_part_load_ratio = __evaluate_quadratic__(
+            self.eir_function_of_part_load_ratio_coefficients,
+            self.part_load_ratio_bounds,
+            part_load_ratio
+        )
+
+        eir_function_of_temperatures = __evaluate_biquadratic__(
+            self.eir_function_of_temperature_coefficients,
+            self.eir_function_of_temperature_bounds,
+            chw_leaving_temp_c,
+            cw_entering_temp_c
+        )
+
+        energy_input_ratio = eir_function_of_part_load_ratio * eir_function_of_temperatures
+        reference_power = cooling_output_kw / self.design_cop
+
+        return reference_power * energy_input_ratio, eir_function_of_part_load_ratio, eir_function_of_temperatures
+
+
+@dataclass
+class CoolingTower:
+    """
+    Equipment class to define and simulate Cooling Towers.
+    All calculations implemented from EnergyPlus's reference documentation:
+    https://bigladdersoftware.com/epx/docs/8-3/engineering-reference/cooling-towers-and-evaporative-fluid.html#variable-speed-cooling-towers-empirical-models
+    """
+    design_wetbulb_c: float
+    design_approach_c: float
+    design_range_c: float
+    design_water_flowrate_m3_hr: float
+    design_air_flowrate_m3_hr: float
+    design_fan_power_kw: float
+    operating_tower_water_supply_temperature_c: float
+    count: int = 1
+    operating_cycles_of_concentration: float = 3.5
+    operating_percent_of_water_loss_to_drift: float = 0.02
+    __minimum_range_c__: float = 2.7777777
+    __maximum_water_flowrate_ratio__: float = 1.0
+    __minimum_air_flowrate_ratio__: float = 0.2
+    __maximum_air_flowrate_ratio__: float = 1.0
+    __tower_capacity_fraction_free_convection_regime__: float = 0.125
+    """
+    CoolTools model correlation coefficients
+     (https://bigladdersoftware.com/epx/docs/8-3/engineering-reference/cooling-towers-and-evaporative-fluid.html#tower-heat-rejection)
+    """
+    __cool_tools_coefficients__: tuple = (
+        None,  # blank 0th element for alignment with CoolTools definition
+        0.52049709836241,  # c[1]
+        -10.617046395344,  # c[2]
+        10.7292974722538,  # c[3]
+        -2.74988377158227,  # c[4]
+        4.73629943913743,  # c[5]
+        -8.25759700874711,  # c[6]
+        1.57640938114136,  # c[7]
+        6.51119643791324,  # c[8]
+        1.50433525206692,  # c[9]
+        -3.2888529287801,  # c[10]
+        0.0257786145353773,  # c[11]
+        0.182464289315254,  # c[12]
+        -0.0818947291400898,  # c[13]
+        -0.215010003996285,  # c[14]
+        0.0186741309635284,  # c[15]
+        0.0536824177590012,  # c[16]
+        -0.00270968955115031,  # c[17]
+        0.00112277498589279,  # c[18]
+        -0.00127758497497718,  # c[19]
+        0.0000760420796601607,  # c[20]
+        1.43600088336017,  # c[21]
+        -0.5198695909109,  # c[22]
+        0.117339576910507,  # c[23]
+        1.50492810819924,  # c[24]
+        -0.135898905926974,  # c[25]
+        -0.152577581866506,  # c[26]
+        -0.0533843828114562,  # c[27]
+        0.00493294869565511,  # c[28]
+        -0.00796260394174197,  # c[29]
+        0.000222619828621544,  # c[30]
+        -0.0543952001568055,  # c[31]
+        0.00474266879161693,  # c[32]
+        -0.0185854671815598,  # c[33]
+        0.00115667701293848,  # c[34]
+        0.000807370664460284  # c[35]
+    )
+    """
+    Power of fr_air in each CoolTools term c[1]..c[35], used to collapse the correlation into a cubic in fr_air
+    """
+    __cool_tools_fr_air_exponents__: tuple = (
+        0, 1, 2, 3, 0, 1, 2, 0, 1, 0,
+        0, 1, 2, 0, 1, 0, 0, 1, 0, 0,
+        0, 1, 2, 0, 1, 0, 0, 1, 0, 0,
+        0, 1, 0, 0, 0
+    )
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def __get_cool_tools_arrays__(coefficients: tuple, fr_air_exponents: tuple) -> tuple:
+        """
+        CoolTools coefficients c[1]..c[35] as an array, and the (4, 35) matrix collapsing them into the
+        constant, fr_air, fr_air^2 and fr_air^3 coefficients of the correlation, built once per coefficient set.
+        """
+        coefficients = np.asarray(coefficients[1:], dtype=float)
+        exponents = np.asarray(fr_air_exponents)
+        collapse = np.stack([np.where(exponents == power, coefficients, 0.0) for power in range(4)])
+        return __read_only__(coefficients), __read_only__(collapse)
+
+    def __get_approach_temp_array__(self, fr_water, fr_air, wetbulb_c, range_c) -> np.ndarray:
+        """
+        Batched CoolTools approach temperature [C].
+        Builds the monomial basis once for all inputs and contracts it against the coefficient vector,
+        so a full year of hourly inputs costs a handful of array operations.
+        """
+        coefficients, _ = self.__get_cool_tools_arrays__(
+            self.__cool_tools_coefficients__,
+            self.__cool_tools_fr_air_exponents__
+        )
+        basis = __get_cool_tools_basis__(
+            fr_water=fr_water,
+            fr_air=fr_air,
+            wetbulb_c=wetbulb_c,
+            range_c=range_c
+        )
+        return np.tensordot(coefficients, basis, axes=1)
+
+    def __get_approach_temp__(self, fr_water, fr_air, wetbulb_c, range_c):
+        return self.__get_approach_temp_array__(
+            fr_water=fr_water,
+            fr_air=fr_air,
+            wetbulb_c=wetbulb_c,
+            range_c=range_c
+        )[()]
+
+    def __solve_reference_water_volumetric_flowrate__(self):
+        """
+        Water flowrate ratio at which the tower meets its design approach with the fan at full speed: the root of
+        the signed approach residual, bracketed by the water flowrate ratio bounds. Clamped to the nearest bound
+        when the design approach is not met within them.
+        """
+        def __get_approach_residual__(fr_water):
+            calc_approach_c = self.__get_approach_temp__(
+                fr_water=fr_water,
+                fr_air=1.0,
+                wetbulb_c=self.design_wetbulb_c,
+                range_c=self.design_range_c
+            )
+            return calc_approach_c - self.design_approach_c
+
+        # approach rises with water flow, so the residual is negative below the root and positive above it
+        lower, upper = 0.0, self.__maximum_water_flowrate_ratio__
+        if __get_approach_residual__(upper) <= 0:
+            return upper
+        if __get_approach_residual__(lower) >= 0:
+            return lower
+        return optimize.brentq(__get_approach_residual__, lower, upper, xtol=1e-12)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def __compile__(parameters: tuple) -> CompiledCoolingTower:
+        ct = CoolingTower(*parameters)
+        coefficients, collapse = ct.__get_cool_tools_arrays__(
+            ct.__cool_tools_coefficients__,
+            ct.__cool_tools_fr_air_exponents__
+        )
+        return CompiledCoolingTower(
+            parameters=parameters,
+            cool_tools_coefficients=coefficients,
+            cool_tools_fr_air_collapse=collapse,
+            reference_fr_water=float(ct.__solve_reference_water_volumetric_flowrate__()),
+            design_range_c=ct.design_range_c,
+            design_water_mass_flowrate_kg_s=
+            (ct.design_water_flowrate_m3_hr / 3600) * utils.STANDARD_DENSITY_OF_WATER_KG_M3,
+            design_air_flowrate_m3_hr=ct.design_air_flowrate_m3_hr,
+            design_fan_power_kw=ct.design_fan_power_kw,
+            tws_temp_setpoint_c=ct.operating_tower_water_supply_temperature_c,
+            cycles_of_concentration=ct.operating_cycles_of_concentration,
+            drift_fraction=ct.operating_percent_of_water_loss_to_drift / 100,
+            free_convection_capacity_fraction=ct.__tower_capacity_fraction_free_convection_regime__,
+            maximum_fr_water=ct.__maximum_water_flowrate_ratio__,
+            minimum_fr_air=ct.__minimum_air_flowrate_ratio__,
+            maximum_fr_air=ct.__maximum_air_flowrate_ratio__
+        )
+
+    def compile(self) -> CompiledCoolingTower:
+        """
+        Compiled form of this tower, memoized on its parameter values: equal towers (e.g. the same design in
+        repeat runs) share one compilation, so the reference flow solve and the other design-point derivations
+        run once per design.
+        """
+        return self.__compile__(tuple(getattr(self, f.name) for f in fields(self)))
+
+    def get_reference_water_volumetric_flowrate(self):
+        return self.compile().reference_fr_water
+
+    def get_tws_temp_at_max_fan(self, fr_water, wetbulb_c, range_c=None):
+        return self.compile().get_tws_temp_at_max_fan(fr_water=fr_water, wetbulb_c=wetbulb_c, range_c=range_c)
+
+    def get_tws_temp_free_convection(self, tws_temp_at_max_fan_c, twr_temp_c):
+        return self.compile().get_tws_temp_free_convection(
+            tws_temp_at_max_fan_c=tws_temp_at_max_fan_c,
+            twr_temp_c=twr_temp_c
+        )
+
+    def get_tws_temp_and_fr_air(self, *args, **kwargs):
+        """
+        See `CompiledCoolingTower.get_tws_temp_and_fr_air`.
+        """
+        return self.compile().get_tws_temp_and_fr_air(*args, **kwargs)
+
+    def get_fan_power(self, fr_air):
+        return self.compile().get_fan_power(fr_air=fr_air)
+
+    def get_makeup_water_usage(self, *args, **kwargs):
+        """
+        See `CompiledCoolingTower.get_makeup_water_usage`.
+        """
+        return self.compile().get_makeup_water_usage(*args, **kwargs)
+
+
 @dataclass
 class Chiller:
     design_cop: float
@@ -336,107 +785,60 @@ class Chiller:
         x_max=1.04
     )
 
-    def __get_eir_function_of_part_load_ratio__(self, part_load_ratio):
-
-        c = self.__curve_energy_input_to_cooling_output_ratio_function_of_part_load_ratio__
-
-        if part_load_ratio < c.x_min or part_load_ratio > c.x_max:
-            if part_load_ratio > c.x_max:
-                upsize = round(self.design_cooling_capacity_kw * part_load_ratio * 1.2, -2)
-                upsize_text = f" Consider up-sizing your chiller cooling capacity from " \
-                              f"{self.design_cooling_capacity_kw} [kW] to {upsize} [kW] or greater."
-                streamlit.write(upsize_text)
-            else:
-                upsize_text = ''
-            raise ValueError(
-                f"Part Load Ratio out of bounds. `part_load_ratio` must be between "
-                f"({c.x_min}, {c.x_max}), but received {part_load_ratio}.{upsize_text}"
-            )
-
-        return \
-            c.constant + \
-            c.x * part_load_ratio + \
-            c.x2 * part_load_ratio ** 2
-
-    def __get_eir_function_of_temperatures__(self, chw_leaving_temp_c, cw_entering_temp_c):
-
-        c = self.__curve_energy_input_to_cooling_output_ratio_function_of_temperature__
-
-        # if chw_leaving_temp_c < c.x_min or chw_leaving_temp_c > c.x_max:
-        #     raise ValueError(
-        #         f"Temperature out of bounds. `chw_leaving_temp_c` must be between "
-        #         f"({c.x_min}, {c.x_max}), but received {chw_leaving_temp_c}."
-        #     )
-        # if cw_entering_temp_c < c.y_min or cw_entering_temp_c > c.y_max:
-        #     raise ValueError(
-        #         f"Temperature out of bounds. `cw_entering_temp_c` must be between "
-        #         f"({c.y_min}, {c.y_max}), but received {cw_entering_temp_c}."
-        #     )
-
-        chw_leaving_temp_c = c.x_min if chw_leaving_temp_c < c.x_min else chw_leaving_temp_c
-        chw_leaving_temp_c = c.x_max if chw_leaving_temp_c > c.x_max else chw_leaving_temp_c
-
-        cw_entering_temp_c = c.y_min if cw_entering_temp_c < c.y_min else cw_entering_temp_c
-        cw_entering_temp_c = c.y_max if cw_entering_temp_c > c.y_max else cw_entering_temp_c
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def __compile__(parameters: tuple) -> CompiledChiller:
+        chiller = Chiller(*parameters)
+        capacity = chiller.__curve_cooling_capacity_ratio_function_of_temperature__
+        eir_temps = chiller.__curve_energy_input_to_cooling_output_ratio_function_of_temperature__
+        eir_plr = chiller.__curve_energy_input_to_cooling_output_ratio_function_of_part_load_ratio__
+        return CompiledChiller(
+            parameters=parameters,
+            cooling_capacity_ratio_coefficients=__read_only__(
+                [capacity.constant, capacity.x, capacity.x2, capacity.y, capacity.y2, capacity.xy]
+            ),
+            cooling_capacity_ratio_bounds=((capacity.x_min, capacity.x_max), (capacity.y_min, capacity.y_max)),
+            eir_function_of_temperature_coefficients=__read_only__(
+                [eir_temps.constant, eir_temps.x, eir_temps.x2, eir_temps.y, eir_temps.y2, eir_temps.xy]
+            ),
+            eir_function_of_temperature_bounds=(
+                (eir_temps.x_min, eir_temps.x_max), (eir_temps.y_min, eir_temps.y_max)
+            ),
+            eir_function_of_part_load_ratio_coefficients=__read_only__([eir_plr.constant, eir_plr.x, eir_plr.x2]),
+            part_load_ratio_bounds=(eir_plr.x_min, eir_plr.x_max),
+            design_cop=chiller.design_cop,
+            design_cooling_capacity_kw=chiller.design_cooling_capacity_kw,
+            design_chw_supply_temperature_c=chiller.design_chw_supply_temperature_c
+        )
 
-        return \
-            c.constant + \
-            c.x * chw_leaving_temp_c + \
-            c.x2 * chw_leaving_temp_c ** 2 + \
-            c.y * cw_entering_temp_c + \
-            c.y2 * cw_entering_temp_c ** 2 + \
-            c.xy * chw_leaving_temp_c * cw_entering_temp_c
+    def compile(self) -> CompiledChiller:
+        """
+        Compiled form of this chiller, memoized on its parameter values like `CoolingTower.compile`.
+        """
+        return self.__compile__(tuple(getattr(self, f.name) for f in fields(self)))
 
     def get_cooling_capacity(self, chw_leaving_temp_c, cw_entering_temp_c):
-
-        c = self.__curve_cooling_capacity_ratio_function_of_temperature__
-
-        # if chw_leaving_temp_c < c.x_min or chw_leaving_temp_c > c.x_max:
-        #     raise ValueError(
-        #         f"Temperature out of bounds. `chw_leaving_temp_c` must be between "
-        #         f"({c.x_min}, {c.x_max}), but received {chw_leaving_temp_c}."
-        #     )
-        # if cw_entering_temp_c < c.y_min or cw_entering_temp_c > c.y_max:
-        #     raise ValueError(
-        #         f"Temperature out of bounds. `cw_entering_temp_c` must be between "
-        #         f"({c.y_min}, {c.y_max}), but received {cw_entering_temp_c}."
-        #     )
-
-        chw_leaving_temp_c = c.x_min if chw_leaving_temp_c < c.x_min else chw_leaving_temp_c
-        chw_leaving_temp_c = c.x_max if chw_leaving_temp_c > c.x_max else chw_leaving_temp_c
-
-        cw_entering_temp_c = c.y_min if cw_entering_temp_c < c.y_min else cw_entering_temp_c
-        cw_entering_temp_c = c.y_max if cw_entering_temp_c > c.y_max else cw_entering_temp_c
-
-        cooling_capacity_ratio = \
-            c.constant + \
-            c.x * chw_leaving_temp_c + \
-            c.x2 * chw_leaving_temp_c ** 2 + \
-            c.y * cw_entering_temp_c + \
-            c.y2 * cw_entering_temp_c ** 2 + \
-            c.xy * chw_leaving_temp_c * cw_entering_temp_c
-
-        return cooling_capacity_ratio * self.design_cooling_capacity_kw
-
-    def get_power(self, chw_leaving_temp_c, cw_entering_temp_c, cooling_output_kw):
-
-        cooling_capacity_kw = self.get_cooling_capacity(
+        return self.compile().get_cooling_capacity(
             chw_leaving_temp_c=chw_leaving_temp_c,
             cw_entering_temp_c=cw_entering_temp_c
         )
 
-        part_load_ratio = cooling_output_kw / cooling_capacity_kw
-
-        eir_function_of_part_load_ratio = self.__get_eir_function_of_part_load_ratio__(
-            part_load_ratio=part_load_ratio
-        )
-
-        eir_function_of_temperatures = self.__get_eir_function_of_temperatures__(
+    def get_part_load_ratio(self, chw_leaving_temp_c, cw_entering_temp_c, cooling_output_kw):
+        return self.compile().get_part_load_ratio(
             chw_leaving_temp_c=chw_leaving_temp_c,
-            cw_entering_temp_c=cw_entering_temp_c
+            cw_entering_temp_c=cw_entering_temp_c,
+            cooling_output_kw=cooling_output_kw
         )
 
-        energy_input_ratio = eir_function_of_part_load_ratio * eir_function_of_temperatures
-        reference_power = cooling_output_kw / self.design_cop
+    def check_part_load_ratio(self, part_load_ratio) -> PartLoadRatioViolations:
+        """
+        See `CompiledChiller.check_part_load_ratio`.
+        """
+        return self.compile().check_part_load_ratio(part_load_ratio)
 
-        return reference_power * energy_input_ratio, eir_function_of_part_load_ratio, eir_function_of_temperatures
+    def get_power(self, chw_leaving_temp_c, cw_entering_temp_c, cooling_output_kw):
+        return self.compile().get_power(
+            chw_leaving_temp_c=chw_leaving_temp_c,
+            cw_entering_temp_c=cw_entering_temp_c,
+            cooling_output_kw=cooling_output_kw
+        )
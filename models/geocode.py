@@ -0,0 +1,209 @@
+"""
+Geocoding behind a persistent cache.
+
+A geocoder is any object with a `name` and a `geocode(query) -> dict` method returning at least `label`,
+`latitude`, `longitude` and `country_code` (ISO 3166-1 alpha-3, as positionstack reports it) and raising
+ValueError for queries it cannot resolve. `PositionstackGeocoder` calls the positionstack API and
+`GazetteerGeocoder` looks places up in a local file, so it works fully offline. `GeocodeCache` sits in front of
+either and keeps results on disk for `ttl_s` seconds, per geocoder, so a repeated query is answered without a
+network round-trip.
+"""
+import functools
+import hashlib
+import json
+import os
+import time
+import uuid
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.casefold().split())
+
+
+@dataclass
+class PositionstackGeocoder:
+    """
+    Forward geocoding via https://positionstack.com/, with a timeout and retries on connection errors, rate
+    limiting (429) and server errors.
+    """
+    name = 'positionstack'
+    access_key: str
+    timeout_s: float = 10
+    retries: int = 2
+    backoff_s: float = 1
+    base_url: str = 'http://api.positionstack.com/v1/'
+
+    def geocode(self, query: str) -> dict:
+        import requests  # imported here so offline geocoding does not need it
+
+        for attempt in range(self.retries + 1):
+            try:
+                response = requests.get(
+                    f"{self.base_url}forward",
+                    params={'access_key': self.access_key, 'query': query},
+                    timeout=self.timeout_s
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            else:
+                retry = response.status_code >= 500 or response.status_code == 429
+                if not retry or attempt == self.retries:
+                    break
+                # rate limited responses may say how long to wait, in seconds
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    time.sleep(max(float(retry_after), self.backoff_s * 2 ** attempt))
+                    continue
+            time.sleep(self.backoff_s * 2 ** attempt)
+
+        if response.status_code == 200 and response.json().get('data'):
+            return response.json()['data'][0]
+        raise ValueError(f"Could not geocode query '{query}'\nError: '{response.text}'")
+
+
+@functools.lru_cache(maxsize=4)
+def load_gazetteer(path: str) -> pd.DataFrame:
+    """
+    Read a gazetteer: a .csv (or tab-separated .tsv / .txt) file with a header row and the columns `name`,
+    `latitude`, `longitude` and `country_code`, and optionally `label` (e.g. "Austin, TX, USA") and `population`,
+    used to choose between places of the same name.
+    """
+    gazetteer = pd.read_csv(path, sep=',' if path.lower().endswith('.csv') else '\t', dtype={'name': str})
+    missing = {'name', 'latitude', 'longitude', 'country_code'} - set(gazetteer.columns)
+    if missing:
+        raise ValueError(f"gazetteer {path} is missing columns: {sorted(missing)}")
+
+    if 'label' not in gazetteer.columns:
+        gazetteer['label'] = gazetteer['name'] + ', ' + gazetteer['country_code']
+    if 'population' in gazetteer.columns:
+        gazetteer = gazetteer.sort_values('population', ascending=False, kind='stable')
+    gazetteer['key_name'] = gazetteer['name'].map(normalize_query)
+    gazetteer['key_label'] = gazetteer['label'].map(normalize_query)
+    return gazetteer.reset_index(drop=True)
+
+
+@dataclass
+class GazetteerGeocoder:
+    """
+    Offline geocoding from a local gazetteer file (see `load_gazetteer`). A query matches a place's full label or
+    its name; for a query like "Paris, France" with no such label, places named by the first part are matched
+    and those whose label contains the rest are preferred. Ties go to the most populous place.
+    """
+    name = 'gazetteer'
+    path: str
+
+    def geocode(self, query: str) -> dict:
+        gazetteer = load_gazetteer(self.path)
+        key = normalize_query(query)
+
+        matches = gazetteer[gazetteer['key_label'] == key]
+        if matches.empty:
+            matches = gazetteer[gazetteer['key_name'] == key]
+        if matches.empty and ',' in key:
+            name, rest = (part.strip() for part in key.split(',', 1))
+            matches = gazetteer[gazetteer['key_name'] == name]
+            qualified = matches[matches['key_label'].str.contains(rest, regex=False)]
+            matches = qualified if not qualified.empty else matches
+        if matches.empty:
+            raise ValueError(f"Could not geocode query '{query}'\nError: 'not found in gazetteer {self.path}'")
+
+        place = matches.iloc[0]
+        return {
+            'label': place['label'],
+            'name': place['name'],
+            'latitude': float(place['latitude']),
+            'longitude': float(place['longitude']),
+            'country_code': place['country_code']
+        }
+
+
+@dataclass
+class GeocodeCache:
+    """
+    Geocoding results by geocoder and normalized query, kept in memory and, with a `directory`, on disk as one
+    JSON file per query, so they survive restarts and are shared by processes. Results from different geocoders
+    (e.g. the offline gazetteer and positionstack) are kept apart. Results older than `ttl_s` are geocoded again.
+    Only resolved queries are cached.
+    :param backend: geocoder to ask on a miss, e.g. `PositionstackGeocoder` or `GazetteerGeocoder`
+    """
+    backend: object = None
+    directory: str = None
+    ttl_s: float = 30 * 24 * 3600
+    entries: dict = field(default_factory=dict, repr=False)
+    hits: int = 0
+    misses: int = 0
+
+    def __get_path__(self, key: str) -> str:
+        return os.path.join(self.directory, f'{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}.json')
+
+    def __load__(self, key: str):
+        if key in self.entries:
+            return self.entries[key]
+        if self.directory is None:
+            return None
+        try:
+            with open(self.__get_path__(key)) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        self.entries[key] = entry
+        return entry
+
+    def __save__(self, key: str, entry: dict):
+        self.entries[key] = entry
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.__get_path__(key)
+        temporary_path = f'{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(temporary_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temporary_path, path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    def __get_key__(self, query: str) -> str:
+        return f"{getattr(self.backend, 'name', type(self.backend).__name__)}:{normalize_query(query)}"
+
+    def geocode(self, query: str) -> dict:
+        """
+        :return: the backend's result for `query`, from the cache when it holds one younger than `ttl_s`
+        """
+        key = self.__get_key__(query)
+        entry = self.__load__(key)
+        if entry is not None and time.time() - entry['time'] < self.ttl_s:
+            self.hits += 1
+            return entry['result']
+
+        if self.backend is None:
+            raise ValueError(f"Could not geocode query '{query}'\nError: 'not cached and no geocoder is set'")
+        self.misses += 1
+        result = self.backend.geocode(query)
+        self.__save__(key, {'query': query, 'time': time.time(), 'result': result})
+        return result
+
+    def geocode_many(self, queries: list, max_workers: int = 8) -> dict:
+        """
+        Geocode many queries, e.g. the sites of a portfolio, asking the backend for distinct uncached queries
+        concurrently rather than one round-trip at a time.
+        :return: dict of query -> result, or the exception raised for a query that could not be geocoded: a
+            ValueError, or a network error left after retries
+        """
+        def __geocode__(query):
+            try:
+                return self.geocode(query)
+            except (ValueError, OSError) as e:
+                # requests' exceptions (requests.RequestException) are OSErrors, so requests need not be imported
+                return e
+
+        # one backend call per normalized query, however it is spelled
+        distinct = {normalize_query(query): query for query in reversed(queries)}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = dict(zip(distinct, executor.map(__geocode__, distinct.values())))
+        return {query: results[normalize_query(query)] for query in queries}
@@ -0,0 +1,318 @@
+"""
+Portfolio runner: many sites, each with a baseline and any number of proposals, simulated across all cores.
+
+A manifest lists one weather source per site and one job per (site, design, loads, tariffs). The weather of
+every site is written once to a `weather.WeatherArchive` that worker processes memory-map, so jobs share it
+instead of each job pickling its own copy of the weather. A failing or timed-out job is recorded in the
+results rather than aborting the run, and all annual totals are written to one consolidated results file.
+Timeouts are raised inside the job where the platform has SIGALRM; the parent also holds every job to a deadline,
+so a job stuck where the alarm cannot interrupt it, or on a platform without SIGALRM, is recorded as timed out and
+its worker processes are replaced. Jobs in flight when a worker process dies are run again, one at a time, and only
+a job that breaks its pool again is recorded as failed.
+"""
+import collections
+import json
+import os
+import signal
+import tempfile
+import time
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from models import equipment as eq
+from models import simulate as sim
+from models import cache
+from models import weather as wx
+
+# time [s] a job may run past its timeout before the parent gives up on it, leaving the worker's own alarm time
+# to fire and covering the start-up of a freshly spawned worker
+TIMEOUT_GRACE_S = 10
+# times a job is run again after its worker pool broke while it was running, before it is recorded as failed
+BROKEN_POOL_RETRIES = 1
+
+
+@dataclass(frozen=True)
+class PortfolioJob:
+    """
+    One design simulated against one site's weather.
+    """
+    job_id: str
+    site: str
+    design: sim.DesignInputs
+    load_it_kw: float
+    energy_cost_dollar_per_kwh: float
+    water_cost_dollar_per_m3: float
+    scenario: str = 'baseline'
+
+
+@dataclass(frozen=True)
+class PortfolioManifest:
+    """
+    `sites` maps each site name to its weather: a DataFrame shaped like the Weather page's table,
+    or the path of a .csv (as downloaded from the Weather page) or .parquet file holding one.
+    """
+    sites: dict
+    jobs: list = field(default_factory=list)
+
+
+def read_weather(source) -> pd.DataFrame:
+    if isinstance(source, pd.DataFrame):
+        return source
+    extension = os.path.splitext(str(source))[1].lower()
+    if extension == '.csv':
+        return pd.read_csv(source, index_col=0, parse_dates=True)
+    if extension == '.parquet':
+        return pd.read_parquet(source)
+    raise ValueError(f"weather source must be a DataFrame, `.csv` or `.parquet` file, not {source}")
+
+
+def load_manifest(path: str) -> PortfolioManifest:
+    """
+    Read a JSON manifest of the form:
+        {
+            "sites": {"<site>": "<weather .csv or .parquet, relative to the manifest>"},
+            "jobs": [{
+                "job_id": "...", "site": "<site>", "scenario": "baseline",
+                "load_it_kw": ..., "energy_cost_dollar_per_kwh": ..., "water_cost_dollar_per_m3": ...,
+                "cooling_tower": {<CoolingTower fields>}, "chiller": {<Chiller fields>},
+                "additional_power_kw": ..., "additional_heat_load_kw": ...
+            }]
+        }
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    sites = {site: os.path.join(directory, source) for site, source in manifest['sites'].items()}
+
+    jobs = []
+    for job in manifest['jobs']:
+        if job['site'] not in sites:
+            raise ValueError(f"job `{job['job_id']}` references unknown site `{job['site']}`")
+        jobs.append(PortfolioJob(
+            job_id=job['job_id'],
+            site=job['site'],
+            scenario=job.get('scenario', 'baseline'),
+            design=sim.DesignInputs(
+                cooling_tower=eq.CoolingTower(**job['cooling_tower']),
+                chiller=eq.Chiller(**job['chiller']),
+                additional_power_kw=job['additional_power_kw'],
+                additional_heat_load_kw=job['additional_heat_load_kw']
+            ),
+            load_it_kw=job['load_it_kw'],
+            energy_cost_dollar_per_kwh=job['energy_cost_dollar_per_kwh'],
+            water_cost_dollar_per_m3=job['water_cost_dollar_per_m3']
+        ))
+
+    return PortfolioManifest(sites=sites, jobs=jobs)
+
+
+# per-worker state: the weather archive, the weather this worker has already sliced from it,
+# and the optional persistent result store
+__weather_archive__ = [None]
+__site_weather__ = {}
+__result_store__ = [None]
+
+
+def __init_worker__(archive_directory: str, cache_directory: str = None):
+    __weather_archive__[0] = wx.WeatherArchive(directory=archive_directory)
+    __site_weather__.clear()
+    __result_store__[0] = None if cache_directory is None else cache.DiskCache(directory=cache_directory)
+
+
+def __get_site_weather__(site: str) -> dict:
+    if site not in __site_weather__:
+        __site_weather__[site] = __weather_archive__[0].get_arrays(site, columns=sim.WEATHER_COLUMNS)
+    return __site_weather__[site]
+
+
+def __raise_timeout__(signum, frame):
+    raise TimeoutError('job exceeded its timeout')
+
+
+def __run_job__(job: PortfolioJob, timeout_s: float) -> dict:
+    """
+    Simulate one job in a worker process. Every exception, including the timeout, is caught and reported,
+    so one bad job cannot take down the rest of the portfolio.
+    """
+    row = {'job_id': job.job_id, 'site': job.site, 'scenario': job.scenario, 'status': 'ok', 'error': None}
+    start = time.perf_counter()
+
+    # timeouts are raised inside the job where SIGALRM exists (POSIX), leaving the worker free for the next job
+    use_alarm = timeout_s is not None and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, __raise_timeout__)
+        signal.setitimer(signal.ITIMER_REAL, timeout_s)
+    try:
+        inputs = sim.SimulationInputs(
+            weather=__get_site_weather__(job.site),
+            load_it_kw=job.load_it_kw,
+            energy_cost_dollar_per_kwh=job.energy_cost_dollar_per_kwh,
+            water_cost_dollar_per_m3=job.water_cost_dollar_per_m3,
+            baseline=job.design
+        )
+        if __result_store__[0] is None:
+            results = sim.WaterCooledChiller().simulate(inputs, do_model='baseline')
+        else:
+            results = __result_store__[0].simulate(inputs, do_model='baseline')
+        metrics = sim.get_annual_metrics(
+            results=results.baseline_buffer,
+            load_it_kw=job.load_it_kw,
+            additional_power_kw=job.design.additional_power_kw,
+            part_load_ratio_out_of_bounds=results.baseline_part_load_ratio_violations.out_of_bounds,
+            energy_cost_dollar_per_kwh=job.energy_cost_dollar_per_kwh,
+            water_cost_dollar_per_m3=job.water_cost_dollar_per_m3
+        )
+        row.update({metric: float(value) for metric, value in metrics.items()})
+    except Exception as e:
+        row.update({'status': 'timeout' if isinstance(e, TimeoutError) else 'failed', 'error': repr(e)})
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    row['elapsed_s'] = time.perf_counter() - start
+    return row
+
+
+def __start_executor__(max_workers: int, archive_directory: str, cache_directory: str) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=__init_worker__,
+        initargs=(archive_directory, cache_directory)
+    )
+
+
+def __terminate_executor__(executor: ProcessPoolExecutor):
+    """
+    Shut down a pool without waiting for the jobs it is running, killing its worker processes.
+    """
+    # the executor has no public handle on its processes; shutting down alone would wait for a stuck job forever
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.kill()
+    for process in processes:
+        process.join()
+
+
+def write_results(results: pd.DataFrame, path: str):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        results.to_csv(path, index=False)
+    elif extension == '.parquet':
+        results.to_parquet(path, index=False)
+    else:
+        raise ValueError(f"results file must be one of: `.csv` or `.parquet`, not {path}")
+
+
+def run_portfolio(
+        manifest: PortfolioManifest,
+        output_path: str = None,
+        max_workers: int = None,
+        timeout_s: float = 600,
+        cache_directory: str = None
+) -> pd.DataFrame:
+    """
+    Simulate every job of a portfolio across a process pool.
+    :param manifest: sites and jobs to run, e.g. from `load_manifest`
+    :param output_path: optional `.csv` or `.parquet` file for the consolidated results
+    :param max_workers: number of worker processes, defaulting to all cores
+    :param timeout_s: per-job time limit [s], or None for no limit. Enforced inside workers on platforms with
+        SIGALRM (POSIX), and by the parent `TIMEOUT_GRACE_S` later, which terminates the job's worker processes
+    :param cache_directory: optional `cache.DiskCache` directory, so jobs simulated by an earlier run are loaded
+        instead of re-simulated
+    :return: pd.DataFrame with one row per job: job_id, site, scenario, status (`ok`, `failed` or `timeout`),
+        error, elapsed_s and the `simulate.ANNUAL_METRICS`, which are NaN for jobs that did not finish
+    """
+    unknown_sites = {job.site for job in manifest.jobs} - set(manifest.sites)
+    if unknown_sites:
+        raise ValueError(f"jobs reference sites missing from the manifest: {sorted(unknown_sites)}")
+
+    rows = {}
+    with tempfile.TemporaryDirectory() as directory:
+        sites = dict.fromkeys(job.site for job in manifest.jobs)
+        wx.write_weather_archive(
+            directory,
+            sites={site: read_weather(manifest.sites[site]) for site in sites},
+            columns=sim.WEATHER_COLUMNS
+        )
+
+        # at most one job per worker is in flight, so a job starts when it is submitted and its deadline is known
+        max_workers = max_workers or os.cpu_count() or 1
+        queue = collections.deque(enumerate(manifest.jobs))
+        running = {}  # future -> (job index, job, time submitted)
+        retries = collections.Counter()  # job index -> times its pool broke while it ran
+        executor = __start_executor__(max_workers, directory, cache_directory)
+        try:
+            while queue or running:
+                while queue and len(running) < max_workers:
+                    # a job whose pool broke is run again alone, so another crash is its own, not a neighbour's
+                    if running and (retries[queue[0][0]] or any(retries[i] for i, _, _ in running.values())):
+                        break
+                    i, job = queue.popleft()
+                    running[executor.submit(__run_job__, job, timeout_s)] = (i, job, time.monotonic())
+
+                wait_s = None
+                if timeout_s is not None:
+                    first_deadline = min(submitted for _, _, submitted in running.values()) + timeout_s
+                    wait_s = max(first_deadline + TIMEOUT_GRACE_S - time.monotonic(), 0)
+                done, _ = wait(running, timeout=wait_s, return_when=FIRST_COMPLETED)
+
+                broken, requeued = False, []
+                for future in done:
+                    i, job, _ = running.pop(future)
+                    try:
+                        rows[i] = future.result()
+                    except BrokenProcessPool as e:
+                        # a worker process died, e.g. out of memory, failing every job in flight in the pool: run
+                        # them again, but give up on a job that keeps breaking pools
+                        broken = True
+                        retries[i] += 1
+                        if retries[i] <= BROKEN_POOL_RETRIES:
+                            requeued.append((i, job))
+                        else:
+                            rows[i] = {
+                                'job_id': job.job_id, 'site': job.site, 'scenario': job.scenario,
+                                'status': 'failed', 'error': repr(e)
+                            }
+                    except Exception as e:
+                        rows[i] = {
+                            'job_id': job.job_id, 'site': job.site, 'scenario': job.scenario,
+                            'status': 'failed', 'error': repr(e)
+                        }
+
+                now = time.monotonic()
+                expired = [
+                    future for future, (_, _, submitted) in running.items()
+                    if timeout_s is not None and now - submitted > timeout_s + TIMEOUT_GRACE_S
+                ]
+                for future in expired:
+                    i, job, submitted = running.pop(future)
+                    rows[i] = {
+                        'job_id': job.job_id, 'site': job.site, 'scenario': job.scenario, 'status': 'timeout',
+                        'error': repr(TimeoutError('job exceeded its timeout; its worker process was terminated')),
+                        'elapsed_s': now - submitted
+                    }
+
+                if broken or expired:
+                    # the pool cannot be trusted with more jobs: requeue the jobs still running in it and those it
+                    # broke, in order, and continue in a new pool
+                    requeued += [(i, job) for i, job, _ in running.values()]
+                    queue.extendleft(sorted(requeued, key=lambda item: item[0], reverse=True))
+                    running.clear()
+                    __terminate_executor__(executor)
+                    executor = __start_executor__(max_workers, directory, cache_directory)
+        except BaseException:
+            __terminate_executor__(executor)
+            raise
+        executor.shutdown()
+
+    results = pd.DataFrame([rows[i] for i in sorted(rows)], columns=[
+        'job_id', 'site', 'scenario', 'status', 'error', 'elapsed_s', *sim.ANNUAL_METRICS
+    ])
+
+    if output_path is not None:
+        write_results(results, output_path)
+
+    return results
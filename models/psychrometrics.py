@@ -0,0 +1,451 @@
+"""
+Array-native psychrometrics.
+
+Equations follow PsychroLib (https://github.com/psychrometrics/psychrolib), ASHRAE Handbook - Fundamentals (2017)
+ch. 1, but every function accepts scalars or arrays and takes its system of units as an argument instead of
+relying on PsychroLib's process-global `SetUnitSystem`. Iterative solves (dew point, wet bulb) run on whole arrays,
+with each element leaving the working set as soon as it converges.
+
+Closed-form results match PsychroLib to floating-point precision. Dew-point and wet-bulb temperatures match
+PsychroLib within its own solver tolerance: 0.001 [C] in SI and 0.0018 [F] in IP (see test_psychrometrics.py).
+Missing inputs (NaN) propagate to NaN outputs, and inputs outside the range of validity of an equation give NaN
+for their element, rather than raising, so one bad hour does not abort a whole series.
+"""
+import numpy as np
+
+ZERO_FAHRENHEIT_AS_RANKINE = 459.67
+ZERO_CELSIUS_AS_KELVIN = 273.15
+R_DA_IP = 53.350  # universal gas constant for dry air [ft-lbf/lb_da-R]
+R_DA_SI = 287.042  # universal gas constant for dry air [J/kg_da-K]
+MAX_ITER_COUNT = 100
+MIN_HUM_RATIO = 1e-7
+FREEZING_POINT_WATER_IP = 32.0
+FREEZING_POINT_WATER_SI = 0.0
+TRIPLE_POINT_WATER_IP = 32.018
+TRIPLE_POINT_WATER_SI = 0.01
+TOLERANCE_IP = 0.001 * 9. / 5.
+TOLERANCE_SI = 0.001
+SAT_VAP_PRES_BOUNDS_IP = (-148., 392.)
+SAT_VAP_PRES_BOUNDS_SI = (-100., 200.)
+
+
+def __is_ip__(unit_system: str) -> bool:
+    if unit_system == 'SI':
+        return False
+    elif unit_system == 'IP':
+        return True
+    else:
+        raise ValueError(f"`unit_system` parameter must be one of: `SI` or `IP`, not {unit_system}")
+
+
+def __as_array__(*values):
+    return [np.asarray(v, dtype=float) for v in values]
+
+
+def __mask_out_of_range__(values: np.ndarray, lower: float, upper: float) -> np.ndarray:
+    """
+    `values` with finite values outside [lower, upper] replaced by NaN, so they propagate like missing values.
+    """
+    return np.where((values < lower) | (values > upper), np.nan, values)
+
+
+def get_sat_vap_pres(t_dry_bulb, unit_system: str = 'SI') -> np.ndarray:
+    """
+    Saturation vapor pressure, ASHRAE Handbook - Fundamentals (2017) ch. 1 eqn 5 & 6.
+    The ice/water branch switches at the triple point of water, as in PsychroLib.
+    :param t_dry_bulb: dry-bulb temperature in °F [IP] or °C [SI]
+    :return: vapor pressure of saturated air in Psi [IP] or Pa [SI]
+    """
+    (t_dry_bulb,) = __as_array__(t_dry_bulb)
+
+    if __is_ip__(unit_system):
+        lower, upper = SAT_VAP_PRES_BOUNDS_IP
+        t_dry_bulb = __mask_out_of_range__(t_dry_bulb, lower, upper)
+        t = t_dry_bulb + ZERO_FAHRENHEIT_AS_RANKINE
+        ln_pws_ice = -1.0214165E+04 / t - 4.8932428 - 5.3765794E-03 * t + 1.9202377E-07 * t ** 2 \
+            + 3.5575832E-10 * t ** 3 - 9.0344688E-14 * t ** 4 + 4.1635019 * np.log(t)
+        ln_pws_water = -1.0440397E+04 / t - 1.1294650E+01 - 2.7022355E-02 * t + 1.2890360E-05 * t ** 2 \
+            - 2.4780681E-09 * t ** 3 + 6.5459673 * np.log(t)
+        triple_point = TRIPLE_POINT_WATER_IP
+    else:
+        lower, upper = SAT_VAP_PRES_BOUNDS_SI
+        t_dry_bulb = __mask_out_of_range__(t_dry_bulb, lower, upper)
+        t = t_dry_bulb + ZERO_CELSIUS_AS_KELVIN
+        ln_pws_ice = -5.6745359E+03 / t + 6.3925247 - 9.677843E-03 * t + 6.2215701E-07 * t ** 2 \
+            + 2.0747825E-09 * t ** 3 - 9.484024E-13 * t ** 4 + 4.1635019 * np.log(t)
+        ln_pws_water = -5.8002206E+03 / t + 1.3914993 - 4.8640239E-02 * t + 4.1764768E-05 * t ** 2 \
+            - 1.4452093E-08 * t ** 3 + 6.5459673 * np.log(t)
+        triple_point = TRIPLE_POINT_WATER_SI
+
+    return np.exp(np.where(t_dry_bulb <= triple_point, ln_pws_ice, ln_pws_water))
+
+
+def __get_d_ln_pws__(t_dry_bulb: np.ndarray, unit_system: str) -> np.ndarray:
+    """
+    Derivative of the natural log of saturation vapor pressure with respect to dry-bulb temperature.
+    """
+    if __is_ip__(unit_system):
+        t = t_dry_bulb + ZERO_FAHRENHEIT_AS_RANKINE
+        d_ice = 1.0214165E+04 / t ** 2 - 5.3765794E-03 + 2 * 1.9202377E-07 * t \
+            + 3 * 3.5575832E-10 * t ** 2 - 4 * 9.0344688E-14 * t ** 3 + 4.1635019 / t
+        d_water = 1.0440397E+04 / t ** 2 - 2.7022355E-02 + 2 * 1.2890360E-05 * t \
+            - 3 * 2.4780681E-09 * t ** 2 + 6.5459673 / t
+        triple_point = TRIPLE_POINT_WATER_IP
+    else:
+        t = t_dry_bulb + ZERO_CELSIUS_AS_KELVIN
+        d_ice = 5.6745359E+03 / t ** 2 - 9.677843E-03 + 2 * 6.2215701E-07 * t \
+            + 3 * 2.0747825E-09 * t ** 2 - 4 * 9.484024E-13 * t ** 3 + 4.1635019 / t
+        d_water = 5.8002206E+03 / t ** 2 - 4.8640239E-02 + 2 * 4.1764768E-05 * t \
+            - 3 * 1.4452093E-08 * t ** 2 + 6.5459673 / t
+        triple_point = TRIPLE_POINT_WATER_SI
+
+    return np.where(t_dry_bulb <= triple_point, d_ice, d_water)
+
+
+def get_hum_ratio_from_vap_pres(vap_pres, pressure) -> np.ndarray:
+    """
+    ASHRAE Handbook - Fundamentals (2017) ch. 1 eqn 20. Identical in SI and IP.
+    :return: humidity ratio in lb_H₂O lb_Air⁻¹ [IP] or kg_H₂O kg_Air⁻¹ [SI]
+    """
+    vap_pres, pressure = __as_array__(vap_pres, pressure)
+    vap_pres = __mask_out_of_range__(vap_pres, 0, np.inf)
+    return np.maximum(0.621945 * vap_pres / (pressure - vap_pres), MIN_HUM_RATIO)
+
+
+def get_vap_pres_from_hum_ratio(hum_ratio, pressure) -> np.ndarray:
+    """
+    ASHRAE Handbook - Fundamentals (2017) ch. 1 eqn 20 solved for pw. Identical in SI and IP.
+    :return: partial pressure of water vapor in moist air in Psi [IP] or Pa [SI]
+    """
+    hum_ratio, pressure = __as_array__(hum_ratio, pressure)
+    hum_ratio = __mask_out_of_range__(hum_ratio, 0, np.inf)
+    bounded_hum_ratio = np.maximum(hum_ratio, MIN_HUM_RATIO)
+    return pressure * bounded_hum_ratio / (0.621945 + bounded_hum_ratio)
+
+
+def get_vap_pres_from_rel_hum(t_dry_bulb, rel_hum, unit_system: str = 'SI') -> np.ndarray:
+    """
+    :param rel_hum: relative humidity in range [0, 1]
+    :return: partial pressure of water vapor in moist air in Psi [IP] or Pa [SI]
+    """
+    t_dry_bulb, rel_hum = __as_array__(t_dry_bulb, rel_hum)
+    rel_hum = __mask_out_of_range__(rel_hum, 0, 1)
+    return rel_hum * get_sat_vap_pres(t_dry_bulb, unit_system=unit_system)
+
+
+def get_rel_hum_from_vap_pres(t_dry_bulb, vap_pres, unit_system: str = 'SI') -> np.ndarray:
+    """
+    :return: relative humidity in range [0, 1]
+    """
+    t_dry_bulb, vap_pres = __as_array__(t_dry_bulb, vap_pres)
+    vap_pres = __mask_out_of_range__(vap_pres, 0, np.inf)
+    return vap_pres / get_sat_vap_pres(t_dry_bulb, unit_system=unit_system)
+
+
+def get_t_dew_point_from_vap_pres(t_dry_bulb, vap_pres, unit_system: str = 'SI') -> np.ndarray:
+    """
+    Dew-point temperature by Newton-Raphson on the log of saturation vapor pressure, as in PsychroLib,
+    iterated on all elements at once with a per-element convergence mask.
+    :return: dew-point temperature in °F [IP] or °C [SI]
+    """
+    t_dry_bulb, vap_pres = np.broadcast_arrays(*__as_array__(t_dry_bulb, vap_pres))
+    is_ip = __is_ip__(unit_system)
+    lower, upper = SAT_VAP_PRES_BOUNDS_IP if is_ip else SAT_VAP_PRES_BOUNDS_SI
+    tolerance = TOLERANCE_IP if is_ip else TOLERANCE_SI
+
+    vap_pres = __mask_out_of_range__(
+        vap_pres,
+        get_sat_vap_pres(lower, unit_system=unit_system),
+        get_sat_vap_pres(upper, unit_system=unit_system)
+    )
+
+    t_dew_point = np.array(t_dry_bulb, dtype=float, copy=True).ravel()
+    ln_vap_pres = np.log(vap_pres.ravel())
+    idx = np.flatnonzero(np.isfinite(t_dew_point) & np.isfinite(ln_vap_pres))
+    t_dew_point[~np.isfinite(ln_vap_pres)] = np.nan
+
+    for _ in range(MAX_ITER_COUNT + 1):
+        if idx.size == 0:
+            break
+        t_iter = t_dew_point[idx]
+        ln_vap_pres_iter = np.log(get_sat_vap_pres(t_iter, unit_system=unit_system))
+        t_next = t_iter - (ln_vap_pres_iter - ln_vap_pres[idx]) / __get_d_ln_pws__(t_iter, unit_system=unit_system)
+        t_next = np.clip(t_next, lower, upper)
+        t_dew_point[idx] = t_next
+        idx = idx[np.abs(t_next - t_iter) > tolerance]
+    else:
+        raise ValueError("Convergence not reached in get_t_dew_point_from_vap_pres. Stopping.")
+
+    return np.minimum(t_dew_point.reshape(t_dry_bulb.shape), t_dry_bulb)
+
+
+def get_sat_hum_ratio(t_dry_bulb, pressure, unit_system: str = 'SI') -> np.ndarray:
+    """
+    ASHRAE Handbook - Fundamentals (2017) ch. 1 eqn 36, solved for W.
+    :return: humidity ratio of saturated air in lb_H₂O lb_Air⁻¹ [IP] or kg_H₂O kg_Air⁻¹ [SI]
+    """
+    t_dry_bulb, pressure = __as_array__(t_dry_bulb, pressure)
+    sat_vap_pres = get_sat_vap_pres(t_dry_bulb, unit_system=unit_system)
+    sat_hum_ratio = 0.621945 * sat_vap_pres / (pressure - sat_vap_pres)
+    return np.maximum(sat_hum_ratio, MIN_HUM_RATIO)
+
+
+def get_hum_ratio_from_t_wet_bulb(t_dry_bulb, t_wet_bulb, pressure, unit_system: str = 'SI') -> np.ndarray:
+    """
+    ASHRAE Handbook - Fundamentals (2017) ch. 1 eqn 33 and 35.
+    :return: humidity ratio in lb_H₂O lb_Air⁻¹ [IP] or kg_H₂O kg_Air⁻¹ [SI]
+    """
+    t_dry_bulb, t_wet_bulb, pressure = __as_array__(t_dry_bulb, t_wet_bulb, pressure)
+    # a wet bulb above dry bulb is not a valid state
+    t_wet_bulb = np.where(t_wet_bulb > t_dry_bulb, np.nan, t_wet_bulb)
+
+    ws_star = get_sat_hum_ratio(t_wet_bulb, pressure, unit_system=unit_system)
+
+    if __is_ip__(unit_system):
+        above_freezing = ((1093 - 0.556 * t_wet_bulb) * ws_star - 0.240 * (t_dry_bulb - t_wet_bulb)) \
+            / (1093 + 0.444 * t_dry_bulb - t_wet_bulb)
+        below_freezing = ((1220 - 0.04 * t_wet_bulb) * ws_star - 0.240 * (t_dry_bulb - t_wet_bulb)) \
+            / (1220 + 0.444 * t_dry_bulb - 0.48 * t_wet_bulb)
+        freezing_point = FREEZING_POINT_WATER_IP
+    else:
+        above_freezing = ((2501. - 2.326 * t_wet_bulb) * ws_star - 1.006 * (t_dry_bulb - t_wet_bulb)) \
+            / (2501. + 1.86 * t_dry_bulb - 4.186 * t_wet_bulb)
+        below_freezing = ((2830. - 0.24 * t_wet_bulb) * ws_star - 1.006 * (t_dry_bulb - t_wet_bulb)) \
+            / (2830. + 1.86 * t_dry_bulb - 2.1 * t_wet_bulb)
+        freezing_point = FREEZING_POINT_WATER_SI
+
+    hum_ratio = np.where(t_wet_bulb >= freezing_point, above_freezing, below_freezing)
+    return np.maximum(hum_ratio, MIN_HUM_RATIO)
+
+
+def get_t_dew_point_from_hum_ratio(t_dry_bulb, hum_ratio, pressure, unit_system: str = 'SI') -> np.ndarray:
+    """
+    :return: dew-point temperature in °F [IP] or °C [SI]
+    """
+    vap_pres = get_vap_pres_from_hum_ratio(hum_ratio, pressure)
+    return get_t_dew_point_from_vap_pres(t_dry_bulb, vap_pres, unit_system=unit_system)
+
+
+def get_t_wet_bulb_from_hum_ratio(t_dry_bulb, hum_ratio, pressure, unit_system: str = 'SI') -> np.ndarray:
+    """
+    Wet-bulb temperature by bisection between dew point and dry bulb, as in PsychroLib,
+    iterated on all elements at once with a per-element convergence mask.
+    :return: wet-bulb temperature in °F [IP] or °C [SI]
+    """
+    t_dry_bulb, hum_ratio, pressure = np.broadcast_arrays(*__as_array__(t_dry_bulb, hum_ratio, pressure))
+    hum_ratio = __mask_out_of_range__(hum_ratio, 0, np.inf)
+    tolerance = TOLERANCE_IP if __is_ip__(unit_system) else TOLERANCE_SI
+
+    shape = t_dry_bulb.shape
+    t_dry_bulb, pressure = t_dry_bulb.ravel(), pressure.ravel()
+    bounded_hum_ratio = np.maximum(hum_ratio.ravel(), MIN_HUM_RATIO)
+
+    t_wet_bulb_sup = t_dry_bulb.copy()
+    t_wet_bulb_inf = get_t_dew_point_from_hum_ratio(t_dry_bulb, bounded_hum_ratio, pressure, unit_system=unit_system)
+    t_wet_bulb = (t_wet_bulb_inf + t_wet_bulb_sup) / 2
+
+    idx = np.flatnonzero((t_wet_bulb_sup - t_wet_bulb_inf) > tolerance)
+
+    for _ in range(MAX_ITER_COUNT):
+        if idx.size == 0:
+            break
+        w_star = get_hum_ratio_from_t_wet_bulb(
+            t_dry_bulb[idx], t_wet_bulb[idx], pressure[idx], unit_system=unit_system
+        )
+        too_wet = w_star > bounded_hum_ratio[idx]
+        t_wet_bulb_sup[idx] = np.where(too_wet, t_wet_bulb[idx], t_wet_bulb_sup[idx])
+        t_wet_bulb_inf[idx] = np.where(too_wet, t_wet_bulb_inf[idx], t_wet_bulb[idx])
+        t_wet_bulb[idx] = (t_wet_bulb_sup[idx] + t_wet_bulb_inf[idx]) / 2
+        idx = idx[(t_wet_bulb_sup[idx] - t_wet_bulb_inf[idx]) > tolerance]
+    else:
+        raise ValueError("Convergence not reached in get_t_wet_bulb_from_hum_ratio. Stopping.")
+
+    return t_wet_bulb.reshape(shape)
+
+
+def get_hum_ratio_from_rel_hum(t_dry_bulb, rel_hum, pressure, unit_system: str = 'SI') -> np.ndarray:
+    """
+    :param rel_hum: relative humidity in range [0, 1]
+    :return: humidity ratio in lb_H₂O lb_Air⁻¹ [IP] or kg_H₂O kg_Air⁻¹ [SI]
+    """
+    vap_pres = get_vap_pres_from_rel_hum(t_dry_bulb, rel_hum, unit_system=unit_system)
+    return get_hum_ratio_from_vap_pres(vap_pres, pressure)
+
+
+def get_hum_ratio_from_t_dew_point(t_dew_point, pressure, unit_system: str = 'SI') -> np.ndarray:
+    """
+    ASHRAE Handbook - Fundamentals (2017) ch. 1 eqn 13.
+    :return: humidity ratio in lb_H₂O lb_Air⁻¹ [IP] or kg_H₂O kg_Air⁻¹ [SI]
+    """
+    vap_pres = get_sat_vap_pres(t_dew_point, unit_system=unit_system)
+    return get_hum_ratio_from_vap_pres(vap_pres, pressure)
+
+
+def get_rel_hum_from_hum_ratio(t_dry_bulb, hum_ratio, pressure, unit_system: str = 'SI') -> np.ndarray:
+    """
+    :return: relative humidity in range [0, 1]
+    """
+    vap_pres = get_vap_pres_from_hum_ratio(hum_ratio, pressure)
+    return get_rel_hum_from_vap_pres(t_dry_bulb, vap_pres, unit_system=unit_system)
+
+
+def get_t_wet_bulb_from_t_dew_point(t_dry_bulb, t_dew_point, pressure, unit_system: str = 'SI') -> np.ndarray:
+    """
+    :return: wet-bulb temperature in °F [IP] or °C [SI]
+    """
+    t_dry_bulb, t_dew_point = __as_array__(t_dry_bulb, t_dew_point)
+    # a dew point above dry bulb is not a valid state
+    t_dew_point = np.where(t_dew_point > t_dry_bulb, np.nan, t_dew_point)
+    hum_ratio = get_hum_ratio_from_t_dew_point(t_dew_point, pressure, unit_system=unit_system)
+    return get_t_wet_bulb_from_hum_ratio(t_dry_bulb, hum_ratio, pressure, unit_system=unit_system)
+
+
+def get_moist_air_enthalpy(t_dry_bulb, hum_ratio, unit_system: str = 'SI') -> np.ndarray:
+    """
+    ASHRAE Handbook - Fundamentals (2017) ch. 1 eqn 30.
+    :return: moist air enthalpy in Btu lb⁻¹ [IP] or J kg⁻¹ [SI]
+    """
+    t_dry_bulb, hum_ratio = __as_array__(t_dry_bulb, hum_ratio)
+    hum_ratio = __mask_out_of_range__(hum_ratio, 0, np.inf)
+    bounded_hum_ratio = np.maximum(hum_ratio, MIN_HUM_RATIO)
+
+    if __is_ip__(unit_system):
+        return 0.240 * t_dry_bulb + bounded_hum_ratio * (1061 + 0.444 * t_dry_bulb)
+    return (1.006 * t_dry_bulb + bounded_hum_ratio * (2501. + 1.86 * t_dry_bulb)) * 1000
+
+
+def get_moist_air_volume(t_dry_bulb, hum_ratio, pressure, unit_system: str = 'SI') -> np.ndarray:
+    """
+    ASHRAE Handbook - Fundamentals (2017) ch. 1 eqn 26.
+    :return: specific volume of moist air in ft³ lb⁻¹ of dry air [IP] or in m³ kg⁻¹ of dry air [SI]
+    """
+    t_dry_bulb, hum_ratio, pressure = __as_array__(t_dry_bulb, hum_ratio, pressure)
+    hum_ratio = __mask_out_of_range__(hum_ratio, 0, np.inf)
+    bounded_hum_ratio = np.maximum(hum_ratio, MIN_HUM_RATIO)
+
+    if __is_ip__(unit_system):
+        return R_DA_IP * (t_dry_bulb + ZERO_FAHRENHEIT_AS_RANKINE) * (1 + 1.607858 * bounded_hum_ratio) \
+            / (144 * pressure)
+    return R_DA_SI * (t_dry_bulb + ZERO_CELSIUS_AS_KELVIN) * (1 + 1.607858 * bounded_hum_ratio) / pressure
+
+
+def get_degree_of_saturation(t_dry_bulb, hum_ratio, pressure, unit_system: str = 'SI') -> np.ndarray:
+    """
+    ASHRAE Handbook - Fundamentals (2009) ch. 1 eqn 12.
+    :return: degree of saturation [-]
+    """
+    (hum_ratio,) = __as_array__(hum_ratio)
+    hum_ratio = __mask_out_of_range__(hum_ratio, 0, np.inf)
+    return np.maximum(hum_ratio, MIN_HUM_RATIO) / get_sat_hum_ratio(t_dry_bulb, pressure, unit_system=unit_system)
+
+
+def calc_psychrometrics_from_hum_ratio(t_dry_bulb, hum_ratio, pressure, unit_system: str = 'SI') -> tuple:
+    """
+    :return: tuple of (wet-bulb temperature, dew-point temperature, relative humidity [0, 1],
+        partial pressure of water vapor, moist air enthalpy, moist air specific volume, degree of saturation)
+    """
+    t_wet_bulb = get_t_wet_bulb_from_hum_ratio(t_dry_bulb, hum_ratio, pressure, unit_system=unit_system)
+    t_dew_point = get_t_dew_point_from_hum_ratio(t_dry_bulb, hum_ratio, pressure, unit_system=unit_system)
+    rel_hum = get_rel_hum_from_hum_ratio(t_dry_bulb, hum_ratio, pressure, unit_system=unit_system)
+    vap_pres = get_vap_pres_from_hum_ratio(hum_ratio, pressure)
+    moist_air_enthalpy = get_moist_air_enthalpy(t_dry_bulb, hum_ratio, unit_system=unit_system)
+    moist_air_volume = get_moist_air_volume(t_dry_bulb, hum_ratio, pressure, unit_system=unit_system)
+    degree_of_saturation = get_degree_of_saturation(t_dry_bulb, hum_ratio, pressure, unit_system=unit_system)
+    return t_wet_bulb, t_dew_point, rel_hum, vap_pres, moist_air_enthalpy, moist_air_volume, degree_of_saturation
+
+
+def calc_psychrometrics_from_rel_hum(t_dry_bulb, rel_hum, pressure, unit_system: str = 'SI') -> tuple:
+    """
+    Array equivalent of `psychrolib.CalcPsychrometricsFromRelHum`.
+    :param rel_hum: relative humidity in range [0, 1]
+    :return: tuple of (humidity ratio, wet-bulb temperature, dew-point temperature, partial pressure of water vapor,
+        moist air enthalpy, moist air specific volume, degree of saturation)
+    """
+    hum_ratio = get_hum_ratio_from_rel_hum(t_dry_bulb, rel_hum, pressure, unit_system=unit_system)
+    t_wet_bulb, t_dew_point, _, vap_pres, moist_air_enthalpy, moist_air_volume, degree_of_saturation = \
+        calc_psychrometrics_from_hum_ratio(t_dry_bulb, hum_ratio, pressure, unit_system=unit_system)
+    return hum_ratio, t_wet_bulb, t_dew_point, vap_pres, moist_air_enthalpy, moist_air_volume, degree_of_saturation
+
+
+def calc_psychrometrics_from_t_dew_point(t_dry_bulb, t_dew_point, pressure, unit_system: str = 'SI') -> tuple:
+    """
+    Array equivalent of `psychrolib.CalcPsychrometricsFromTDewPoint`.
+    :return: tuple of (humidity ratio, wet-bulb temperature, relative humidity [0, 1],
+        partial pressure of water vapor, moist air enthalpy, moist air specific volume, degree of saturation)
+    """
+    hum_ratio = get_hum_ratio_from_t_dew_point(t_dew_point, pressure, unit_system=unit_system)
+    t_wet_bulb, _, rel_hum, vap_pres, moist_air_enthalpy, moist_air_volume, degree_of_saturation = \
+        calc_psychrometrics_from_hum_ratio(t_dry_bulb, hum_ratio, pressure, unit_system=unit_system)
+    return hum_ratio, t_wet_bulb, rel_hum, vap_pres, moist_air_enthalpy, moist_air_volume, degree_of_saturation
+
+
+METHOD_RELATIVE_HUMIDITY = 'relative_humidity'
+METHOD_DEW_POINT = 'dew_point'
+METHOD_INTERPOLATED = 'interpolated'
+METHOD_MISSING = 'missing'
+
+
+def get_hum_ratio_by_method(t_dry_bulb, t_dew_point, rel_hum, pressure, unit_system: str = 'SI') -> tuple:
+    """
+    Humidity ratio of an hourly series, choosing the calculation path per hour instead of per series:
+    relative humidity where it is valid, dew point where relative humidity is missing or invalid,
+    and linear interpolation of humidity ratio (capped at saturation) for hours missing both.
+    Hours missing dry bulb or pressure, or with either outside the range of validity of the equations, or with
+    nothing to interpolate from, are left as NaN and labeled METHOD_MISSING.
+    :param t_dew_point: 1-D array of dew-point temperatures in °F [IP] or °C [SI], or None
+    :param rel_hum: 1-D array of relative humidity in range [0, 1], or None
+    :return: tuple of (humidity ratio, method) where method holds one of the METHOD_* labels per hour
+    """
+    t_dry_bulb, pressure = np.broadcast_arrays(*__as_array__(t_dry_bulb, pressure))
+    t_dry_bulb, pressure = t_dry_bulb.ravel(), pressure.ravel()
+    missing = np.full(t_dry_bulb.shape, np.nan)
+    t_dew_point = missing if t_dew_point is None else np.broadcast_to(np.asarray(t_dew_point, float), missing.shape)
+    rel_hum = missing if rel_hum is None else np.broadcast_to(np.asarray(rel_hum, float), missing.shape)
+
+    lower, upper = SAT_VAP_PRES_BOUNDS_IP if __is_ip__(unit_system) else SAT_VAP_PRES_BOUNDS_SI
+    has_state = (t_dry_bulb >= lower) & (t_dry_bulb <= upper) & (pressure > 0)
+    use_rel_hum = has_state & (rel_hum >= 0) & (rel_hum <= 1)
+    use_dew_point = has_state & ~use_rel_hum & (t_dew_point >= lower) & (t_dew_point <= upper)
+
+    hum_ratio = missing.copy()
+    hum_ratio[use_rel_hum] = get_hum_ratio_from_rel_hum(
+        t_dry_bulb[use_rel_hum], rel_hum[use_rel_hum], pressure[use_rel_hum], unit_system=unit_system
+    )
+    hum_ratio[use_dew_point] = get_hum_ratio_from_t_dew_point(
+        np.minimum(t_dew_point[use_dew_point], t_dry_bulb[use_dew_point]),
+        pressure[use_dew_point],
+        unit_system=unit_system
+    )
+
+    method = np.full(t_dry_bulb.shape, METHOD_MISSING, dtype=object)
+    method[use_rel_hum] = METHOD_RELATIVE_HUMIDITY
+    method[use_dew_point] = METHOD_DEW_POINT
+
+    known = use_rel_hum | use_dew_point
+    use_interpolation = has_state & ~known
+    if known.any() and use_interpolation.any():
+        position = np.arange(hum_ratio.size)
+        hum_ratio[use_interpolation] = np.minimum(
+            np.interp(position[use_interpolation], position[known], hum_ratio[known]),
+            get_sat_hum_ratio(t_dry_bulb[use_interpolation], pressure[use_interpolation], unit_system=unit_system)
+        )
+        method[use_interpolation] = METHOD_INTERPOLATED
+
+    return hum_ratio, method
+
+
+def calc_psychrometrics(t_dry_bulb, t_dew_point, rel_hum, pressure, unit_system: str = 'SI') -> tuple:
+    """
+    Single vectorized pass over an hourly series with gaps, selecting the calculation path per hour
+    (see `get_hum_ratio_by_method`), so every output is always present and one missing value only affects its hour.
+    :param rel_hum: relative humidity in range [0, 1], or None
+    :return: tuple of (humidity ratio, wet-bulb temperature, dew-point temperature, relative humidity [0, 1],
+        partial pressure of water vapor, moist air enthalpy, moist air specific volume, degree of saturation,
+        method used per hour)
+    """
+    hum_ratio, method = get_hum_ratio_by_method(t_dry_bulb, t_dew_point, rel_hum, pressure, unit_system=unit_system)
+    t_dry_bulb, pressure = np.broadcast_arrays(*__as_array__(t_dry_bulb, pressure))
+    t_wet_bulb, t_dew_point, rel_hum, vap_pres, moist_air_enthalpy, moist_air_volume, degree_of_saturation = \
+        calc_psychrometrics_from_hum_ratio(t_dry_bulb.ravel(), hum_ratio, pressure.ravel(), unit_system=unit_system)
+    return hum_ratio, t_wet_bulb, t_dew_point, rel_hum, vap_pres, moist_air_enthalpy, moist_air_volume, \
+        degree_of_saturation, method
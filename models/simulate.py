@@ -1,38 +1,431 @@
 import pandas as pd
 import numpy as np
-import streamlit as st
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
+from models import equipment as eq
 import utils
 
 
-def build_common_model():
+MODEL_VERSION = '1'
+"""
+Version of the simulation physics. Bump it whenever the same inputs would produce different results,
+so persisted results from older versions are no longer served.
+"""
+
+
+@dataclass(frozen=True)
+class DesignInputs:
+    """
+    Equipment and operational characteristics of one arm (baseline or proposed) of a simulation.
+    """
+    cooling_tower: eq.CoolingTower
+    chiller: eq.Chiller
+    additional_power_kw: float
+    additional_heat_load_kw: float
+
+
+@dataclass(frozen=True)
+class SimulationInputs:
+    """
+    Everything a simulation depends on, so the engine can run without Streamlit:
+    in worker processes, benchmarks or behind a cache.
+    `weather` is the table produced by the Weather page (`get_weather_data`), or a mapping of column -> np.ndarray
+    holding at least `WEATHER_COLUMNS`, e.g. a zero-copy slice from `weather.WeatherArchive.get_arrays`.
+    `load_it_kw` is a constant IT load, or an hourly np.ndarray aligned with `weather` for a time-varying one.
+    """
+    weather: pd.DataFrame
+    load_it_kw: float
+    energy_cost_dollar_per_kwh: float
+    water_cost_dollar_per_m3: float
+    baseline: DesignInputs = None
+    proposed: DesignInputs = None
+
+
+WEATHER_COLUMNS = (
+    'temperature [C]',
+    'Psychrometrics (out): wet_bulb [C]',
+    'Psychrometrics (out): humidity_ratio [kgH2O/kgAir]',
+    'air_pressure [Pa]',
+    'Psychrometrics (out): specific_volume_moist_air [m^3/kg]'
+)
+"""
+Weather columns the engine reads, in the order `build_common_model` returns them as arrays.
+"""
+
+ANNUAL_METRICS = (
+    'total_energy [kWh]',
+    'ct_fan_energy [kWh]',
+    'chiller_energy [kWh]',
+    'peak_power_consumption [kW]',
+    'PUE [-]',
+    'ct_makeup_evaporation [m^3]',
+    'ct_makeup_drift [m^3]',
+    'ct_makeup_blowdown [m^3]',
+    'ct_makeup_total [m^3]',
+    'WUE [L/kWh]',
+    'Energy Cost [$]',
+    'Water Cost [$]',
+    'Total Cost [$]',
+    'chiller_part_load_ratio_violations [hours]'
+)
+
+
+RESULT_COLUMNS = (
+    'ct_tower_water_supply_temp_at_max_fan [C]',
+    'ct_tower_water_supply_temp_free_convection [C]',
+    'ct_tower_water_supply_temp [C]',
+    'ct_operating_fr_water [-]',
+    'ct_air_flowrate_ratio [-]',
+    'ct_fan_power [kW]',
+    'ct_makeup_flowrate_evaporation [m^3]',
+    'ct_makeup_flowrate_drift [m^3]',
+    'ct_makeup_flowrate_blowdown [m^3]',
+    'ct_makeup_flowrate_total [m^3]',
+    'chiller_operating_cooling_capacity [kW]',
+    'chiller_part_load_ratio [-]',
+    'chiller_electric_input_ratio_function_of_part_load_ratio [-]',
+    'chiller_electric_input_ratio_function_of_temperatures [-]',
+    'chiller_power [kW]',
+    'chiller_coefficient_of_performance [-]',
+    'total_power_consumption [kW]',
+    'PUE [-]',
+    'WUE [L/kWh]',
+    'ct_makeup_flowrate_evaporation_cumulative [m^3]',
+    'ct_makeup_flowrate_drift_cumulative [m^3]',
+    'ct_makeup_flowrate_blowdown_cumulative [m^3]',
+    'ct_makeup_flowrate_total_cumulative [m^3]',
+    'Water Cost [$]',
+    'Energy Cost [$]'
+)
+"""
+Schema of the hourly results of one arm, in the order they follow the weather columns in the results table.
+Design and load parameters are not part of it: see RunParameters.
+"""
 
-    weather = st.session_state.weather_data
-    model = weather.copy()
 
-    drybulb_c = model['temperature [C]'].to_numpy()
-    wetbulb_c = model['Psychrometrics (out): wet_bulb [C]'].to_numpy()
-    humidity_ratio_kgh2o_kgair = model['Psychrometrics (out): humidity_ratio [kgH2O/kgAir]'].to_numpy()
-    pressure_pa = model['air_pressure [Pa]'].to_numpy()
-    specific_volume_moist_air = model['Psychrometrics (out): specific_volume_moist_air [m^3/kg]'].to_numpy()
-
-    model['it_load_kw'] = st.session_state.load_it_kw
+@dataclass
+class RunParameters:
+    """
+    Design and load parameters of one arm, kept once per run instead of as hourly columns.
+    Each is a scalar that broadcasts against the hourly results when used, or an hourly np.ndarray when the
+    input varies in time (e.g. an hourly `SimulationInputs.load_it_kw`).
+    """
+    it_load_kw: float = None
+    additional_power_kw: float = None
+    additional_heat_load_kw: float = None
+    total_heat_load_kw: float = None
+    ct_range_c: float = None
+    ct_tws_temp_setpoint_c: float = None
+    ct_design_air_flowrate_m3_hr: float = None
+    ct_design_water_flowrate_m3_hr: float = None
+    ct_reference_fr_water: float = None
+    chiller_design_cooling_capacity_kw: float = None
+    chiller_design_chw_supply_temp_c: float = None
+
+    def scalars(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self) if np.ndim(getattr(self, f.name)) == 0}
+
+    def arrays(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self) if np.ndim(getattr(self, f.name)) > 0}
 
-    return model, drybulb_c, wetbulb_c, humidity_ratio_kgh2o_kgair, pressure_pa, specific_volume_moist_air
 
+@dataclass
+class ResultsBuffer:
+    """
+    Hourly results of one arm as a struct of arrays: one preallocated (columns, hours) float block that the
+    simulation stages write into in place, instead of concatenating a new DataFrame onto the model at every stage.
+    Indexing by column name returns (or assigns into) a view of that column's row, or the RunParameters value
+    of that name.
+    """
+    index: pd.Index
+    columns: tuple = RESULT_COLUMNS
+    data: np.ndarray = None
+    parameters: RunParameters = field(default_factory=RunParameters)
+
+    def __post_init__(self):
+        if self.data is None:
+            self.data = np.full((len(self.columns), len(self.index)), np.nan)
+        self.__positions__ = {column: i for i, column in enumerate(self.columns)}
+
+    def __getitem__(self, column: str):
+        if column in self.__positions__:
+            return self.data[self.__positions__[column]]
+        return getattr(self.parameters, column)
+
+    def __setitem__(self, column: str, values):
+        if column in self.__positions__:
+            self.data[self.__positions__[column]] = values
+        elif hasattr(self.parameters, column):
+            setattr(self.parameters, column, values if np.ndim(values) == 0 else np.asarray(values, dtype=float))
+        else:
+            raise KeyError(f"`{column}` is neither a result column nor a run parameter")
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.__positions__ or hasattr(self.parameters, column)
+
+    def to_frame(self, weather: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        DataFrame view of the results. Without `weather` or time-varying parameters this wraps the buffer without
+        copying it; `weather` columns and time-varying parameters are prepended as columns, as in the tables
+        shown on the Performance page. Scalar parameters are in `.attrs['parameters']`.
+        """
+        results = pd.DataFrame(self.data.T, index=self.index, columns=list(self.columns), copy=False)
+        frames = [frame for frame in (weather, pd.DataFrame(self.parameters.arrays(), index=self.index)) if
+                  frame is not None and len(frame.columns)]
+        if frames:
+            results = pd.concat([*frames, results], axis=1)
+        results.attrs['parameters'] = self.parameters.scalars()
+        return results
 
-def apply_operational_efficiencies(model, baseline: bool = True):
 
-    if baseline:
-        add_power_kw = st.session_state.baseline_add_power_kw
-        add_heat_load_kw = st.session_state.baseline_add_heat_load_kw
+@dataclass
+class SimulationResults:
+    """
+    Results of a simulation, held as ResultsBuffers. The `baseline` and `proposed` DataFrames, with the
+    weather columns prepended, are built (copying the weather) on first access and kept until that arm's buffer
+    is replaced, so repeat accesses return the same frame; treat it as read-only.
+    `baseline_buffer.to_frame()` is a view of one arm's results alone.
+    """
+    weather: pd.DataFrame = None
+    baseline_buffer: ResultsBuffer = None
+    proposed_buffer: ResultsBuffer = None
+    baseline_part_load_ratio_violations: eq.PartLoadRatioViolations = None
+    proposed_part_load_ratio_violations: eq.PartLoadRatioViolations = None
+
+    def __post_init__(self):
+        # arm -> (buffer, DataFrame built from it)
+        self.__frames__ = {}
+
+    def __get_frame__(self, arm: str) -> pd.DataFrame:
+        buffer = getattr(self, f'{arm}_buffer')
+        if buffer is None:
+            return None
+        if arm not in self.__frames__ or self.__frames__[arm][0] is not buffer:
+            self.__frames__[arm] = (buffer, buffer.to_frame(weather=self.weather))
+        return self.__frames__[arm][1]
+
+    @property
+    def baseline(self) -> pd.DataFrame:
+        return self.__get_frame__('baseline')
+
+    @property
+    def proposed(self) -> pd.DataFrame:
+        return self.__get_frame__('proposed')
+
+
+def get_weather_index(weather) -> pd.Index:
+    """
+    Index of the hourly results for a weather table, or for a mapping of weather arrays: its `time` array when
+    it has one, otherwise a RangeIndex.
+    """
+    if isinstance(weather, pd.DataFrame):
+        return weather.index
+    if 'time' in weather:
+        return pd.DatetimeIndex(weather['time'], name='time')
+    return pd.RangeIndex(len(weather[WEATHER_COLUMNS[0]]))
+
+
+def __read_only__(array: np.ndarray) -> np.ndarray:
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def build_common_model(weather):
+    """
+    Weather arrays the engine reads, from a weather table or a mapping of column -> np.ndarray (e.g. a memory-mapped
+    `weather.WeatherArchive` slice). Neither is copied: weather is shared by both arms, by the cache and by the
+    session that fetched it, so float64 columns are used as they are, through read-only views that let no stage
+    write into them. Each arm's ResultsBuffer holds only the columns it derives.
+    """
+    if isinstance(weather, pd.DataFrame):
+        drybulb_c, wetbulb_c, humidity_ratio_kgh2o_kgair, pressure_pa, specific_volume_moist_air = \
+            (__read_only__(weather[column].to_numpy(dtype=float)) for column in WEATHER_COLUMNS)
     else:
-        add_power_kw = st.session_state.proposed_add_power_kw
-        add_heat_load_kw = st.session_state.proposed_add_heat_load_kw
+        drybulb_c, wetbulb_c, humidity_ratio_kgh2o_kgair, pressure_pa, specific_volume_moist_air = \
+            (__read_only__(np.asarray(weather[column], dtype=float)) for column in WEATHER_COLUMNS)
+
+    return weather, drybulb_c, wetbulb_c, humidity_ratio_kgh2o_kgair, pressure_pa, specific_volume_moist_air
+
+
+def apply_operational_efficiencies(model, load_it_kw: float, design: DesignInputs):
 
-    model['additional_power_kw'] = add_power_kw
-    model['additional_heat_load_kw'] = add_heat_load_kw
-    model['total_heat_load_kw'] = st.session_state.load_it_kw + add_heat_load_kw
+    model['additional_power_kw'] = design.additional_power_kw
+    model['additional_heat_load_kw'] = design.additional_heat_load_kw
+    model['total_heat_load_kw'] = load_it_kw + design.additional_heat_load_kw
+
+    return model
+
+
+def simulate_cooling_tower(
+        ct: eq.CompiledCoolingTower,
+        ch: eq.CompiledChiller,
+        total_heat_load_kw,
+        drybulb_c,
+        wetbulb_c,
+        humidity_ratio_kgh2o_kgair,
+        pressure_pa,
+        specific_volume_moist_air
+) -> dict:
+    """
+    Cooling tower operation for every timestep at once.
+    Equipment parameters and loads are broadcast against the weather arrays, so the same code serves a single
+    design over (hours,) and a design sweep over (designs, hours).
+    :param ct: compiled tower, from `CoolingTower.compile` or stacked by a design sweep
+    :param ch: compiled chiller, from `Chiller.compile` or stacked by a design sweep
+    :return: dict of result column name -> np.ndarray of hourly values
+    """
+    range_c = ct.design_range_c
+    tws_temp_setpoint_c = ct.tws_temp_setpoint_c
+
+    # accounting for estimate of heat load from chiller compressor
+    total_heat_load_kw = total_heat_load_kw + total_heat_load_kw / ch.design_cop
+
+    # q = m * cp * dT
+    required_water_flowrate_kg_s = total_heat_load_kw / (utils.SPECIFIC_HEAT_CAPACITY_OF_WATER_KJ_KGC * range_c)
+    fr_water = np.minimum(
+        required_water_flowrate_kg_s / ct.design_water_mass_flowrate_kg_s * 1.1,
+        ct.maximum_fr_water
+    )
+
+    tws_temp_at_max_fan_c = ct.get_tws_temp_at_max_fan(
+        fr_water=fr_water,
+        wetbulb_c=wetbulb_c,
+        range_c=range_c
+    )
+
+    tws_temp_free_convection_c = ct.get_tws_temp_free_convection(
+        tws_temp_at_max_fan_c=tws_temp_at_max_fan_c,
+        twr_temp_c=tws_temp_setpoint_c + range_c
+    )
+
+    tws_temp, fr_air = ct.get_tws_temp_and_fr_air(
+        fr_water=fr_water,
+        tws_temp_at_max_fan_c=tws_temp_at_max_fan_c,
+        tws_temp_free_convection_c=tws_temp_free_convection_c,
+        tws_temp_setpoint_c=tws_temp_setpoint_c,
+        wetbulb_c=wetbulb_c,
+        range_c=range_c
+    )
+
+    ct_fan_kw = ct.get_fan_power(fr_air=fr_air)
+
+    makeup_flowrate_evaporation_m3_s, makeup_flowrate_drift_m3_s, \
+        makeup_flowrate_blowdown_m3_s, makeup_flowrate_total_m3_s = ct.get_makeup_water_usage(
+            drybulb_c=drybulb_c,
+            humidity_ratio_kgh2o_kgair=humidity_ratio_kgh2o_kgair,
+            pressure_pa=pressure_pa,
+            specific_volume_moist_air=specific_volume_moist_air,
+            air_flowrate_m3_hr=ct.design_air_flowrate_m3_hr * fr_air,
+            water_flowrate_m3_s=required_water_flowrate_kg_s / utils.STANDARD_DENSITY_OF_WATER_KG_M3,
+            fr_air=fr_air
+        )
+
+    return {
+        'ct_tower_water_supply_temp_at_max_fan [C]': tws_temp_at_max_fan_c,
+        'ct_tower_water_supply_temp_free_convection [C]': tws_temp_free_convection_c,
+        'ct_tower_water_supply_temp [C]': tws_temp,
+        'ct_operating_fr_water [-]': fr_water,
+        'ct_air_flowrate_ratio [-]': fr_air,
+        'ct_fan_power [kW]': ct_fan_kw,
+        'ct_makeup_flowrate_evaporation [m^3]': makeup_flowrate_evaporation_m3_s * 3600,
+        'ct_makeup_flowrate_drift [m^3]': makeup_flowrate_drift_m3_s * 3600,
+        'ct_makeup_flowrate_blowdown [m^3]': makeup_flowrate_blowdown_m3_s * 3600,
+        'ct_makeup_flowrate_total [m^3]': makeup_flowrate_total_m3_s * 3600
+    }
+
+
+def simulate_chiller(chiller: eq.CompiledChiller, total_heat_load_kw, tws_temp_c):
+    """
+    Chiller operation for every timestep at once, broadcasting like `simulate_cooling_tower`.
+    :param chiller: compiled chiller, from `Chiller.compile` or stacked by a design sweep
+    :param total_heat_load_kw: cooling output required of the chiller [kW]
+    :param tws_temp_c: tower water supply (condenser water entering) temperature [C]
+    :return: tuple of (dict of result column name -> np.ndarray, PartLoadRatioViolations)
+    """
+    chw_supply_temp = chiller.design_chw_supply_temperature_c
+
+    cooling_capacity_kw = chiller.get_cooling_capacity(
+        chw_leaving_temp_c=chw_supply_temp,
+        cw_entering_temp_c=tws_temp_c
+    )
+
+    part_load_ratio = total_heat_load_kw / cooling_capacity_kw
+    part_load_ratio_violations = chiller.check_part_load_ratio(part_load_ratio=part_load_ratio)
+
+    power_kw, eir_plr, eir_temps = chiller.get_power(
+        chw_leaving_temp_c=chw_supply_temp,
+        cw_entering_temp_c=tws_temp_c,
+        cooling_output_kw=total_heat_load_kw
+    )
+
+    cop = total_heat_load_kw / power_kw
+
+    return {
+        'chiller_operating_cooling_capacity [kW]': cooling_capacity_kw,
+        'chiller_part_load_ratio [-]': part_load_ratio,
+        'chiller_electric_input_ratio_function_of_part_load_ratio [-]': eir_plr,
+        'chiller_electric_input_ratio_function_of_temperatures [-]': eir_temps,
+        'chiller_power [kW]': power_kw,
+        'chiller_coefficient_of_performance [-]': cop
+    }, part_load_ratio_violations
+
+
+def get_annual_metrics(
+        results,
+        load_it_kw,
+        additional_power_kw,
+        part_load_ratio_out_of_bounds,
+        energy_cost_dollar_per_kwh: float,
+        water_cost_dollar_per_m3: float
+) -> dict:
+    """
+    Annual energy, water and cost totals from hourly results, summed over the last (hours) axis.
+    NaN hours are skipped, as in the hourly results' column sums.
+    :param results: mapping of result column name -> hourly values, e.g. the merged outputs of
+        `simulate_cooling_tower` and `simulate_chiller`, or a simulated model DataFrame
+    :param part_load_ratio_out_of_bounds: boolean mask of hours outside the chiller's part load ratio curve
+    :return: dict of ANNUAL_METRICS name -> total, an np.ndarray when simulating several designs at once
+    """
+    ct_fan_kw = np.asarray(results['ct_fan_power [kW]'])
+    chiller_kw = np.asarray(results['chiller_power [kW]'])
+    total_power_kw = load_it_kw + additional_power_kw + ct_fan_kw + chiller_kw
+
+    #  hourly timestep, so 1 kW = 1 kWh
+    it_energy_kwh = np.sum(np.broadcast_to(load_it_kw, total_power_kw.shape), axis=-1)
+    total_energy_kwh = np.nansum(total_power_kw, axis=-1)
+    makeup_m3 = {
+        name: np.nansum(np.asarray(results[f'ct_makeup_flowrate_{name} [m^3]']), axis=-1)
+        for name in ('evaporation', 'drift', 'blowdown', 'total')
+    }
+    energy_cost = total_energy_kwh * energy_cost_dollar_per_kwh
+    water_cost = makeup_m3['total'] * water_cost_dollar_per_m3
+
+    return {
+        'total_energy [kWh]': total_energy_kwh,
+        'ct_fan_energy [kWh]': np.nansum(ct_fan_kw, axis=-1),
+        'chiller_energy [kWh]': np.nansum(chiller_kw, axis=-1),
+        'peak_power_consumption [kW]': np.nanmax(total_power_kw, axis=-1),
+        'PUE [-]': total_energy_kwh / it_energy_kwh,
+        'ct_makeup_evaporation [m^3]': makeup_m3['evaporation'],
+        'ct_makeup_drift [m^3]': makeup_m3['drift'],
+        'ct_makeup_blowdown [m^3]': makeup_m3['blowdown'],
+        'ct_makeup_total [m^3]': makeup_m3['total'],
+        'WUE [L/kWh]': makeup_m3['total'] * 1000 / it_energy_kwh,
+        'Energy Cost [$]': energy_cost,
+        'Water Cost [$]': water_cost,
+        'Total Cost [$]': energy_cost + water_cost,
+        'chiller_part_load_ratio_violations [hours]': np.sum(part_load_ratio_out_of_bounds, axis=-1)
+    }
+
+
+def set_costs(model: ResultsBuffer, energy_cost_dollar_per_kwh: float, water_cost_dollar_per_m3: float):
+    """
+    Hourly energy and water costs, the only results that depend on the tariffs.
+    """
+    model['Water Cost [$]'] = model['ct_makeup_flowrate_total [m^3]'] * water_cost_dollar_per_m3
+
+    #  hourly timestep, so 1 kW = 1 kWh
+    model['Energy Cost [$]'] = model['total_power_consumption [kW]'] * 1 * energy_cost_dollar_per_kwh
 
     return model
 
@@ -46,192 +439,353 @@ class WaterCooledChiller:
     pressure_pa: np.ndarray = None
     specific_volume_moist_air: np.ndarray = None
 
-    baseline: pd.DataFrame = None
-    proposed: pd.DataFrame = None
-
-    def simulate(self, do_model: str = 'both'):
-
-        def __set_cooling_tower_params__(model, ct):
-            model['ct_range_c'] = ct.design_range_c
-            model['ct_tws_temp_setpoint_c'] = ct.operating_tower_water_supply_temperature_c
-            model['ct_design_air_flowrate_m3_hr'] = ct.design_air_flowrate_m3_hr
-            model['ct_design_water_flowrate_m3_hr'] = ct.design_water_flowrate_m3_hr
-            model['ct_reference_fr_water'] = ct.get_reference_water_volumetric_flowrate()
-            return model
+    def set_run_parameters(self, model, inputs: SimulationInputs, design: DesignInputs):
+        ct = design.cooling_tower
+        chiller = design.chiller
+
+        model['it_load_kw'] = inputs.load_it_kw
+        model = apply_operational_efficiencies(model, load_it_kw=inputs.load_it_kw, design=design)
+
+        model['ct_range_c'] = ct.design_range_c
+        model['ct_tws_temp_setpoint_c'] = ct.operating_tower_water_supply_temperature_c
+        model['ct_design_air_flowrate_m3_hr'] = ct.design_air_flowrate_m3_hr
+        model['ct_design_water_flowrate_m3_hr'] = ct.design_water_flowrate_m3_hr
+        model['ct_reference_fr_water'] = ct.get_reference_water_volumetric_flowrate()
+
+        model['chiller_design_cooling_capacity_kw'] = chiller.design_cooling_capacity_kw
+        model['chiller_design_chw_supply_temp_c'] = chiller.design_chw_supply_temperature_c
+        return model
+
+    def __cooling_tower_stage__(self, model, inputs: SimulationInputs, design: DesignInputs):
+        results = simulate_cooling_tower(
+            ct=design.cooling_tower.compile(),
+            ch=design.chiller.compile(),
+            total_heat_load_kw=model['total_heat_load_kw'],
+            drybulb_c=self.drybulb_c,
+            wetbulb_c=self.wetbulb_c,
+            humidity_ratio_kgh2o_kgair=self.humidity_ratio_kgh2o_kgair,
+            pressure_pa=self.pressure_pa,
+            specific_volume_moist_air=self.specific_volume_moist_air
+        )
+        for column, values in results.items():
+            model[column] = values
+
+    def __chiller_stage__(self, model, inputs: SimulationInputs, design: DesignInputs):
+        results, part_load_ratio_violations = simulate_chiller(
+            chiller=design.chiller.compile(),
+            total_heat_load_kw=model['total_heat_load_kw'],
+            tws_temp_c=model['ct_tower_water_supply_temp [C]']
+        )
+        for column, values in results.items():
+            model[column] = values
+        return part_load_ratio_violations
+
+    def __performance_stage__(self, model, inputs: SimulationInputs, design: DesignInputs):
+        def __calculate_cumsum_water__(df):
+            for name in ('evaporation', 'drift', 'blowdown', 'total'):
+                flowrate = df[f'ct_makeup_flowrate_{name} [m^3]']
+                cumulative = df[f'ct_makeup_flowrate_{name}_cumulative [m^3]']
+                # like pd.Series.cumsum: NaN hours are skipped, and stay NaN
+                np.nancumsum(flowrate, out=cumulative)
+                cumulative[np.isnan(flowrate)] = np.nan
+            return df
+
+        model['total_power_consumption [kW]'] = model['it_load_kw'] + model['additional_power_kw'] + \
+            model['ct_fan_power [kW]'] + model['chiller_power [kW]']
+
+        model['PUE [-]'] = model['total_power_consumption [kW]'] / model['it_load_kw']
+
+        #  hourly timestep, so 1 kW = 1 kWh
+        model['WUE [L/kWh]'] = (model['ct_makeup_flowrate_total [m^3]'] * 1000) / (model['it_load_kw'] * 1)
+
+        __calculate_cumsum_water__(df=model)
+
+    def __cost_stage__(self, model, inputs: SimulationInputs, design: DesignInputs):
+        set_costs(
+            model,
+            energy_cost_dollar_per_kwh=inputs.energy_cost_dollar_per_kwh,
+            water_cost_dollar_per_m3=inputs.water_cost_dollar_per_m3
+        )
+
+    def simulate_design(self, model: ResultsBuffer, inputs: SimulationInputs, design: DesignInputs, run_stage=None):
+        """
+        Run every stage of STAGES for one design into `model`.
+        :param run_stage: optional callable (stage, model, inputs, design) -> stage result, used in place of
+            `stage.run(self, model, inputs, design)`, e.g. to serve unchanged stages from a cache
+        :return: tuple of (model, PartLoadRatioViolations)
+        """
+        model = self.set_run_parameters(model, inputs=inputs, design=design)
+
+        stage_results = {}
+        for stage in STAGES:
+            if run_stage is None:
+                stage_results[stage.name] = stage.run(self, model, inputs, design)
+            else:
+                stage_results[stage.name] = run_stage(stage, model, inputs, design)
+
+        return model, stage_results['chiller']
+
+    def simulate(self, inputs: SimulationInputs, do_model: str = 'both', run_stage=None) -> SimulationResults:
+
+        weather, self.drybulb_c, self.wetbulb_c, self.humidity_ratio_kgh2o_kgair, \
+            self.pressure_pa, self.specific_volume_moist_air = build_common_model(weather=inputs.weather)
+
+        # weather arrays are not prepended to the result tables; only a weather table is
+        results = SimulationResults(weather=weather if isinstance(weather, pd.DataFrame) else None)
+        index = get_weather_index(weather)
 
-        def __simulate_cooling_tower__(model, ct, ch):
-
-            range_c = model['ct_range_c'].to_numpy()
-            tws_temp_setpoint_c = model['ct_tws_temp_setpoint_c'].to_numpy()
-            design_air_flowrate_m3_hr = model['ct_design_air_flowrate_m3_hr'].to_numpy()
-            design_water_flowrate_m3_hr = model['ct_design_water_flowrate_m3_hr'].to_numpy()
-
-            total_heat_load_kw = model['total_heat_load_kw']
-            # accounting for estimate of heat load from chiller compressor
-            total_heat_load_kw = total_heat_load_kw + total_heat_load_kw / ch.design_cop
-
-            design_water_mass_flowrate_kg_s = \
-                (design_water_flowrate_m3_hr / 3600) * utils.STANDARD_DENSITY_OF_WATER_KG_M3
-
-            # q = m * cp * dT
-            required_water_flowrate_kg_s = total_heat_load_kw / (utils.SPECIFIC_HEAT_CAPACITY_OF_WATER_KJ_KGC * range_c)
-            fr_water = np.minimum(
-                required_water_flowrate_kg_s / design_water_mass_flowrate_kg_s * 1.1,
-                np.full_like(design_water_mass_flowrate_kg_s, fill_value=1.0)
-            )
-
-            tws_temp_at_max_fan_c = np.vectorize(ct.get_tws_temp_at_max_fan)(
-                fr_water=fr_water,
-                wetbulb_c=self.wetbulb_c,
-                range_c=range_c
-            )
-
-            tws_temp_free_convection_c = np.vectorize(ct.get_tws_temp_free_convection)(
-                tws_temp_at_max_fan_c=tws_temp_at_max_fan_c,
-                twr_temp_c=tws_temp_setpoint_c + range_c
+        if do_model == 'both' or do_model == 'baseline':
+            results.baseline_buffer, results.baseline_part_load_ratio_violations = self.simulate_design(
+                ResultsBuffer(index=index), inputs=inputs, design=inputs.baseline, run_stage=run_stage
             )
 
-            tws_temp, fr_air = np.vectorize(ct.get_tws_temp_and_fr_air)(
-                fr_water=fr_water,
-                tws_temp_at_max_fan_c=tws_temp_at_max_fan_c,
-                tws_temp_free_convection_c=tws_temp_free_convection_c,
-                tws_temp_setpoint_c=tws_temp_setpoint_c,
-                wetbulb_c=self.wetbulb_c
+        if do_model == 'both' or do_model == 'proposed':
+            results.proposed_buffer, results.proposed_part_load_ratio_violations = self.simulate_design(
+                ResultsBuffer(index=index), inputs=inputs, design=inputs.proposed, run_stage=run_stage
             )
 
-            ct_fan_kw = np.vectorize(ct.get_fan_power)(fr_air=fr_air)
-
-            makeup_flowrate_evaporation_m3_s, makeup_flowrate_drift_m3_s, \
-                makeup_flowrate_blowdown_m3_s, makeup_flowrate_total_m3_s = np.vectorize(
-                    ct.get_makeup_water_usage
-                )(
-                    drybulb_c=self.drybulb_c,
-                    humidity_ratio_kgh2o_kgair=self.humidity_ratio_kgh2o_kgair,
-                    pressure_pa=self.pressure_pa,
-                    specific_volume_moist_air=self.specific_volume_moist_air,
-                    air_flowrate_m3_hr=design_air_flowrate_m3_hr * fr_air,
-                    water_flowrate_m3_s=required_water_flowrate_kg_s / utils.STANDARD_DENSITY_OF_WATER_KG_M3,
-                    fr_air=fr_air
-                )
+        return results
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of the simulation pipeline, declared with everything it reads so callers can tell which stages
+    an input change invalidates.
+    `inputs` are dotted paths into the SimulationInputs (`inputs.<field>`) or the arm's DesignInputs
+    (`design.<field>`, optionally down to a single equipment field), and the upstream stages whose results
+    it reads (`stage.<name>`). `columns` are the results it writes.
+    Psychrometrics are not a stage here: they are computed once, when weather is fetched.
+    """
+    name: str
+    inputs: tuple
+    columns: tuple
+    run: object
+
+
+STAGES = (
+    Stage(
+        name='cooling_tower',
+        # the chiller's COP only enters through the estimate of compressor heat rejected by the tower
+        inputs=(
+            'inputs.weather', 'inputs.load_it_kw', 'design.additional_heat_load_kw', 'design.cooling_tower',
+            'design.chiller.design_cop'
+        ),
+        columns=RESULT_COLUMNS[RESULT_COLUMNS.index('ct_tower_water_supply_temp_at_max_fan [C]'):
+                               RESULT_COLUMNS.index('ct_makeup_flowrate_total [m^3]') + 1],
+        run=WaterCooledChiller.__cooling_tower_stage__
+    ),
+    Stage(
+        name='chiller',
+        inputs=('inputs.load_it_kw', 'design.additional_heat_load_kw', 'design.chiller', 'stage.cooling_tower'),
+        columns=RESULT_COLUMNS[RESULT_COLUMNS.index('chiller_operating_cooling_capacity [kW]'):
+                               RESULT_COLUMNS.index('chiller_coefficient_of_performance [-]') + 1],
+        run=WaterCooledChiller.__chiller_stage__
+    ),
+    Stage(
+        name='performance',
+        inputs=('inputs.load_it_kw', 'design.additional_power_kw', 'stage.cooling_tower', 'stage.chiller'),
+        columns=RESULT_COLUMNS[RESULT_COLUMNS.index('total_power_consumption [kW]'):
+                               RESULT_COLUMNS.index('ct_makeup_flowrate_total_cumulative [m^3]') + 1],
+        run=WaterCooledChiller.__performance_stage__
+    ),
+    Stage(
+        name='cost',
+        inputs=(
+            'inputs.energy_cost_dollar_per_kwh', 'inputs.water_cost_dollar_per_m3', 'stage.cooling_tower',
+            'stage.performance'
+        ),
+        columns=('Water Cost [$]', 'Energy Cost [$]'),
+        run=WaterCooledChiller.__cost_stage__
+    )
+)
+"""
+The pipeline in execution order. Every result column is written by exactly one stage.
+"""
 
-            results = pd.DataFrame({
-                'ct_tower_water_supply_temp_at_max_fan [C]': tws_temp_at_max_fan_c,
-                'ct_tower_water_supply_temp_free_convection [C]': tws_temp_free_convection_c,
-                'ct_tower_water_supply_temp [C]': tws_temp,
-                'ct_operating_fr_water [-]': fr_water,
-                'ct_air_flowrate_ratio [-]': fr_air,
-                'ct_fan_power [kW]': ct_fan_kw,
-                'ct_makeup_flowrate_evaporation [m^3]': makeup_flowrate_evaporation_m3_s * 3600,
-                'ct_makeup_flowrate_drift [m^3]': makeup_flowrate_drift_m3_s * 3600,
-                'ct_makeup_flowrate_blowdown [m^3]': makeup_flowrate_blowdown_m3_s * 3600,
-                'ct_makeup_flowrate_total [m^3]': makeup_flowrate_total_m3_s * 3600
-            })
-            results.index = model.index
-
-            return pd.concat([model, results], axis=1)
-
-        def __set_chiller_params__(model, chiller):
-            model['chiller_design_cooling_capacity_kw'] = chiller.design_cooling_capacity_kw
-            model['chiller_design_chw_supply_temp_c'] = chiller.design_chw_supply_temperature_c
-            return model
-
-        def __simulate_chiller__(model, chiller):
-
-            heat_load_kw = model['total_heat_load_kw'].to_numpy()
-
-            chw_supply_temp = model['chiller_design_chw_supply_temp_c'].to_numpy()
-            ct_tower_water_supply_temp = model['ct_tower_water_supply_temp [C]'].to_numpy()
-
-            cooling_capacity_kw = np.vectorize(chiller.get_cooling_capacity)(
-                chw_leaving_temp_c=chw_supply_temp,
-                cw_entering_temp_c=ct_tower_water_supply_temp
-            )
 
-            power_kw, eir_plr, eir_temps = np.vectorize(chiller.get_power)(
-                chw_leaving_temp_c=chw_supply_temp,
-                cw_entering_temp_c=ct_tower_water_supply_temp,
-                cooling_output_kw=heat_load_kw
+@dataclass
+class StreamingResults:
+    """
+    Aggregates of a streamed simulation.
+    `totals` holds the ANNUAL_METRICS over the whole record (plus `it_energy [kWh]`), and `periods` one row of the
+    same metrics per calendar period, with the cumulative makeup water at the end of each period.
+    """
+    totals: dict = None
+    periods: pd.DataFrame = None
+
+
+def iter_weather_chunks(weather, chunk_size: int = 8760):
+    """
+    Yield weather in chunks of at most `chunk_size` rows.
+    :param weather: a weather DataFrame, or an iterable of weather DataFrames that is passed through unchanged
+        (e.g. `pd.read_csv(..., chunksize=...)`), so the full record never needs to be in memory
+    """
+    if isinstance(weather, pd.DataFrame):
+        for start in range(0, len(weather), chunk_size):
+            yield weather.iloc[start:start + chunk_size]
+    else:
+        yield from weather
+
+
+def simulate_stream(
+        inputs: SimulationInputs,
+        design: DesignInputs = None,
+        chunk_size: int = 8760,
+        period: str = 'M',
+        timestep_h: float = 1.0,
+        on_chunk=None
+) -> StreamingResults:
+    """
+    Simulate one design chunk by chunk through the cooling tower, chiller and metrics stages, so memory stays
+    bounded by `chunk_size` regardless of record length (multi-year or sub-hourly weather).
+    Equipment operation is steady-state per timestep, so only the running totals, cumulative water and
+    per-period aggregates are carried from one chunk to the next: each chunk's periods are merged into the
+    aggregates as it completes, with a period that spans a chunk boundary held open until the next chunk.
+    :param inputs: loads and tariffs; `load_it_kw` is a constant or an array aligned with the whole weather record,
+        sliced chunk by chunk; `weather` may also be an iterable of weather chunks (see `iter_weather_chunks`)
+    :param design: design to simulate, defaults to `inputs.baseline`
+    :param chunk_size: rows per chunk when `inputs.weather` is a DataFrame
+    :param period: pandas period alias of the per-period aggregates (e.g. 'D', 'M', 'Y'), or None to skip them.
+        Requires a DatetimeIndex on every weather chunk, checked before the chunk is simulated
+    :param timestep_h: length of one weather record [h], e.g. 1 / 60 for 1-minute data
+    :param on_chunk: optional callable receiving each chunk's timestep results as a DataFrame, with cumulative
+        water continued across chunks, e.g. to append them to a file
+    :return: StreamingResults
+    """
+    design = inputs.baseline if design is None else design
+    ct, chiller = design.cooling_tower.compile(), design.chiller.compile()
+    load_it_kw_record = np.asarray(inputs.load_it_kw, dtype=float)
+
+    water_names = ('evaporation', 'drift', 'blowdown', 'total')
+    sums = dict.fromkeys(
+        ['it_energy [kWh]', 'total_energy [kWh]', 'ct_fan_energy [kWh]', 'chiller_energy [kWh]'] +
+        [f'ct_makeup_{name} [m^3]' for name in water_names] +
+        ['chiller_part_load_ratio_violations [hours]'],
+        0.0
+    )
+    peak_power_kw = np.nan
+    period_aggregations = {name: 'sum' for name in sums} | {'peak_power_consumption [kW]': 'max'}
+    # aggregates of the periods completed so far, and of the period still open at the end of the last chunk
+    completed_periods = []
+    open_period = None
+    offset = 0
+
+    for chunk in iter_weather_chunks(inputs.weather, chunk_size=chunk_size):
+        if period is not None and not isinstance(chunk.index, pd.DatetimeIndex):
+            raise ValueError(
+                f"`period={period!r}` aggregates need weather indexed by a DatetimeIndex, not a "
+                f"{type(chunk.index).__name__}; pass `period=None` to skip the per-period aggregates"
             )
-
-            cop = heat_load_kw / power_kw
-
-            results = pd.DataFrame({
-                'chiller_operating_cooling_capacity [kW]': cooling_capacity_kw,
-                'chiller_electric_input_ratio_function_of_part_load_ratio [-]': eir_plr,
-                'chiller_electric_input_ratio_function_of_temperatures [-]': eir_temps,
-                'chiller_power [kW]': power_kw,
-                'chiller_coefficient_of_performance [-]': cop
-            })
-            results.index = model.index
-
-            return pd.concat([model, results], axis=1)
-
-        def __set_performance_metrics__(model):
-            def __calculate_cumsum_water__(df) -> pd.DataFrame:
-                water_cumsum = df[[
-                    'ct_makeup_flowrate_evaporation [m^3]',
-                    'ct_makeup_flowrate_drift [m^3]',
-                    'ct_makeup_flowrate_blowdown [m^3]',
-                    'ct_makeup_flowrate_total [m^3]'
-                ]].cumsum()
-                water_cumsum.rename(
-                    columns={col: f"{col.split(' ')[0]}_cumulative {col.split(' ')[1]}" for col in
-                             water_cumsum.columns},
-                    inplace=True
+        drybulb_c, wetbulb_c, humidity_ratio_kgh2o_kgair, pressure_pa, specific_volume_moist_air = \
+            (chunk[column].to_numpy(dtype=float) for column in WEATHER_COLUMNS)
+
+        if load_it_kw_record.ndim == 0:
+            load_it_kw = float(load_it_kw_record)
+        else:
+            load_it_kw = load_it_kw_record[offset:offset + len(drybulb_c)]
+            if len(load_it_kw) != len(drybulb_c):
+                raise ValueError(
+                    f"`load_it_kw` has {len(load_it_kw_record)} values, fewer than the weather record's timesteps"
                 )
-                water_cumsum.index = df.index
-                return pd.concat([df, water_cumsum], axis=1)
-
-            model['total_power_consumption [kW]'] = model['it_load_kw'] + model['additional_power_kw'] + \
-                model['ct_fan_power [kW]'] + model['chiller_power [kW]']
-
-            model['PUE [-]'] = model['total_power_consumption [kW]'] / model['it_load_kw']
-
-            #  hourly timestep, so 1 kW = 1 kWh
-            model['WUE [L/kWh]'] = (model['ct_makeup_flowrate_total [m^3]'] * 1000) / (model['it_load_kw'] * 1)
-
-            model = __calculate_cumsum_water__(df=model)
-
-            model['Water Cost [$]'] = model['ct_makeup_flowrate_total [m^3]'] * \
-                st.session_state.water_cost_dollar_per_m3
-
-            #  hourly timestep, so 1 kW = 1 kWh
-            model['Energy Cost [$]'] = model['total_power_consumption [kW]'] * 1 * \
-                st.session_state.energy_cost_dollar_per_kwh
-
-            return model
-
-        common_model, self.drybulb_c, self.wetbulb_c, self.humidity_ratio_kgh2o_kgair, \
-            self.pressure_pa, self.specific_volume_moist_air = build_common_model()
-
-        if do_model == 'both' or do_model == 'baseline':
-
-            with st.spinner('Simulating Baseline...'):
-
-                self.baseline = apply_operational_efficiencies(common_model.copy(), baseline=True)
-                ct_b = st.session_state.baseline_ct
-                ch_b = st.session_state.baseline_chiller
-
-                self.baseline = __set_cooling_tower_params__(self.baseline, ct_b)
-                self.baseline = __simulate_cooling_tower__(self.baseline, ct=ct_b, ch=ch_b)
-                self.baseline = __set_chiller_params__(self.baseline, ch_b)
-                self.baseline = __simulate_chiller__(self.baseline, ch_b)
-
-                self.baseline = __set_performance_metrics__(self.baseline)
-
-        if do_model == 'both' or do_model == 'proposed':
-
-            with st.spinner('Simulating Proposed...'):
-
-                self.proposed = apply_operational_efficiencies(common_model.copy(), baseline=False)
-                ct_p = st.session_state.proposed_ct
-                ch_p = st.session_state.proposed_chiller
-
-                self.proposed = __set_cooling_tower_params__(self.proposed, ct_p)
-                self.proposed = __simulate_cooling_tower__(self.proposed, ct=ct_p, ch=ch_p)
-                self.proposed = __set_chiller_params__(self.proposed, ch_p)
-                self.proposed = __simulate_chiller__(self.proposed, ch_p)
-
-                self.proposed = __set_performance_metrics__(self.proposed)
-
-        return self.baseline, self.proposed
+        offset += len(drybulb_c)
+        total_heat_load_kw = np.full(drybulb_c.shape, load_it_kw + design.additional_heat_load_kw)
+
+        ct_results = simulate_cooling_tower(
+            ct=ct,
+            ch=chiller,
+            total_heat_load_kw=total_heat_load_kw,
+            drybulb_c=drybulb_c,
+            wetbulb_c=wetbulb_c,
+            humidity_ratio_kgh2o_kgair=humidity_ratio_kgh2o_kgair,
+            pressure_pa=pressure_pa,
+            specific_volume_moist_air=specific_volume_moist_air
+        )
+        chiller_results, part_load_ratio_violations = simulate_chiller(
+            chiller=chiller,
+            total_heat_load_kw=total_heat_load_kw,
+            tws_temp_c=ct_results['ct_tower_water_supply_temp [C]']
+        )
+
+        total_power_kw = load_it_kw + design.additional_power_kw + \
+            ct_results['ct_fan_power [kW]'] + chiller_results['chiller_power [kW]']
+
+        # makeup water results are hourly volumes [m^3/h]
+        step = pd.DataFrame({
+            'it_energy [kWh]': load_it_kw * timestep_h,
+            'total_energy [kWh]': total_power_kw * timestep_h,
+            'ct_fan_energy [kWh]': ct_results['ct_fan_power [kW]'] * timestep_h,
+            'chiller_energy [kWh]': chiller_results['chiller_power [kW]'] * timestep_h,
+            **{f'ct_makeup_{name} [m^3]': ct_results[f'ct_makeup_flowrate_{name} [m^3]'] * timestep_h
+               for name in water_names},
+            'chiller_part_load_ratio_violations [hours]': part_load_ratio_violations.out_of_bounds * timestep_h,
+            'peak_power_consumption [kW]': total_power_kw
+        }, index=chunk.index)
+
+        if on_chunk is not None:
+            results = pd.DataFrame({**ct_results, **chiller_results}, index=chunk.index)
+            results['total_power_consumption [kW]'] = total_power_kw
+            results['PUE [-]'] = total_power_kw / load_it_kw
+            results['WUE [L/kWh]'] = step['ct_makeup_total [m^3]'] * 1000 / step['it_energy [kWh]']
+            for name in water_names:
+                results[f'ct_makeup_flowrate_{name}_cumulative [m^3]'] = \
+                    step[f'ct_makeup_{name} [m^3]'].cumsum() + sums[f'ct_makeup_{name} [m^3]']
+            results['Water Cost [$]'] = step['ct_makeup_total [m^3]'] * inputs.water_cost_dollar_per_m3
+            results['Energy Cost [$]'] = step['total_energy [kWh]'] * inputs.energy_cost_dollar_per_kwh
+            on_chunk(results)
+
+        for name in sums:
+            sums[name] += step[name].sum()
+        peak_power_kw = np.nanmax([peak_power_kw, step['peak_power_consumption [kW]'].max()])
+
+        if period is not None and len(step.index):
+            chunk_periods = step.groupby(chunk.index.to_period(period)).agg(period_aggregations)
+            if open_period is not None:
+                # the period left open by the previous chunk continues into this one, or has ended
+                if open_period.index[0] == chunk_periods.index[0]:
+                    chunk_periods = pd.concat([open_period, chunk_periods]).groupby(level=0, sort=False).agg(
+                        period_aggregations
+                    )
+                else:
+                    completed_periods.append(open_period)
+            if len(chunk_periods.index) > 1:
+                completed_periods.append(chunk_periods.iloc[:-1])
+            open_period = chunk_periods.iloc[-1:]
+
+    if load_it_kw_record.ndim > 0 and offset != len(load_it_kw_record):
+        raise ValueError(
+            f"`load_it_kw` has {len(load_it_kw_record)} values but the weather record has {offset} timesteps"
+        )
+    if open_period is not None:
+        completed_periods.append(open_period)
+
+    def __get_metrics__(aggregates):
+        energy_cost = aggregates['total_energy [kWh]'] * inputs.energy_cost_dollar_per_kwh
+        water_cost = aggregates['ct_makeup_total [m^3]'] * inputs.water_cost_dollar_per_m3
+        return {
+            'it_energy [kWh]': aggregates['it_energy [kWh]'],
+            'total_energy [kWh]': aggregates['total_energy [kWh]'],
+            'ct_fan_energy [kWh]': aggregates['ct_fan_energy [kWh]'],
+            'chiller_energy [kWh]': aggregates['chiller_energy [kWh]'],
+            'peak_power_consumption [kW]': aggregates['peak_power_consumption [kW]'],
+            'PUE [-]': aggregates['total_energy [kWh]'] / aggregates['it_energy [kWh]'],
+            **{f'ct_makeup_{name} [m^3]': aggregates[f'ct_makeup_{name} [m^3]'] for name in water_names},
+            'WUE [L/kWh]': aggregates['ct_makeup_total [m^3]'] * 1000 / aggregates['it_energy [kWh]'],
+            'Energy Cost [$]': energy_cost,
+            'Water Cost [$]': water_cost,
+            'Total Cost [$]': energy_cost + water_cost,
+            'chiller_part_load_ratio_violations [hours]': aggregates['chiller_part_load_ratio_violations [hours]']
+        }
+
+    streaming_results = StreamingResults(
+        totals=__get_metrics__({**sums, 'peak_power_consumption [kW]': peak_power_kw})
+    )
+
+    if completed_periods:
+        # chunks out of time order could revisit a completed period
+        aggregates = pd.concat(completed_periods).groupby(level=0).agg(period_aggregations)
+        periods = pd.DataFrame(__get_metrics__(aggregates), index=aggregates.index)
+        periods['ct_makeup_cumulative_total [m^3]'] = periods['ct_makeup_total [m^3]'].cumsum()
+        streaming_results.periods = periods
+
+    return streaming_results
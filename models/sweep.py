@@ -0,0 +1,179 @@
+"""
+Parametric design sweeps.
+Many cooling tower / chiller designs are evaluated against one weather year in a single batched pass:
+design parameters that differ between designs become (designs, 1) columns and broadcast against the hourly
+weather arrays, so every equipment calculation runs over a (designs, hours) grid.
+"""
+import itertools
+import numbers
+import numpy as np
+import pandas as pd
+from dataclasses import fields, replace
+from models import equipment as eq
+from models import simulate as sim
+
+
+def __get_parameter_target__(parameter: str):
+    """
+    Resolve a sweep parameter name, using the same `ct_` / `chiller_` prefixes as the Performance page's
+    design comparison table.
+    :return: tuple of (DesignInputs field, equipment field or None)
+    """
+    for prefix, design_field, equipment in (
+            ('ct_', 'cooling_tower', eq.CoolingTower),
+            ('chiller_', 'chiller', eq.Chiller)
+    ):
+        if parameter.startswith(prefix):
+            name = parameter[len(prefix):]
+            if name in [f.name for f in fields(equipment) if not f.name.startswith('__')]:
+                return design_field, name
+    if parameter in ('additional_power_kw', 'additional_heat_load_kw'):
+        return parameter, None
+    raise ValueError(
+        f"sweep parameter must be one of: `ct_<CoolingTower field>`, `chiller_<Chiller field>`, "
+        f"`additional_power_kw` or `additional_heat_load_kw`, not {parameter}"
+    )
+
+
+def build_design_grid(base: sim.DesignInputs, **parameters) -> list:
+    """
+    Full-factorial grid of designs around a base design.
+    :param base: design supplying every parameter that is not swept
+    :param parameters: iterables of values per swept parameter, e.g. `ct_design_approach_c=[2.5, 3.0, 3.5]`
+        or `chiller_design_cop=[5.5, 6.0, 6.5]`
+    :return: list of DesignInputs, one per combination of parameter values
+    """
+    targets = {parameter: __get_parameter_target__(parameter) for parameter in parameters}
+
+    designs = []
+    for values in itertools.product(*parameters.values()):
+        changes = {'cooling_tower': {}, 'chiller': {}}
+        design_changes = {}
+        for parameter, value in zip(parameters, values):
+            design_field, name = targets[parameter]
+            if name is None:
+                design_changes[design_field] = value
+            else:
+                changes[design_field][name] = value
+        designs.append(replace(
+            base,
+            cooling_tower=replace(base.cooling_tower, **changes['cooling_tower']),
+            chiller=replace(base.chiller, **changes['chiller']),
+            **design_changes
+        ))
+
+    return designs
+
+
+def __get_varying_fields__(items: list) -> list:
+    """
+    Names of the dataclass fields whose values differ between `items`.
+    Only numeric fields may differ, since those are the ones that can be broadcast along the designs axis.
+    """
+    varying = []
+    for f in fields(items[0]):
+        values = [getattr(item, f.name) for item in items]
+        if all(value == values[0] for value in values[1:]):
+            continue
+        if not all(isinstance(value, numbers.Real) for value in values):
+            raise ValueError(f"designs in a sweep may only differ in numeric parameters, `{f.name}` differs")
+        varying.append(f.name)
+    return varying
+
+
+def __stack__(compiled: list):
+    """
+    Collapse the compiled forms of several designs (`CompiledCoolingTower` or `CompiledChiller`) into one whose
+    scalar fields that differ between them hold (designs, 1) arrays. Coefficient arrays and curve bounds are
+    shared, since designs in a sweep share performance curves.
+    """
+    names = [
+        f.name for f in fields(compiled[0])
+        if f.name != 'parameters' and np.ndim(getattr(compiled[0], f.name)) == 0 and
+        len({getattr(item, f.name) for item in compiled}) > 1
+    ]
+    return replace(compiled[0], parameters=tuple(item.parameters for item in compiled), **{
+        name: np.asarray([getattr(item, name) for item in compiled], dtype=float)[:, np.newaxis] for name in names
+    })
+
+
+def __simulate_chunk__(designs: list, inputs: sim.SimulationInputs, weather: dict) -> dict:
+    """
+    Annual totals for a chunk of designs, evaluated over a (designs, hours) grid.
+    Each design is compiled (memoized per design) before stacking, so its design-point derivations, like the
+    reference water flowrate ratio, are not repeated across chunks or sweeps.
+    :return: dict of metric name -> np.ndarray of shape (designs,)
+    """
+    ct = __stack__([design.cooling_tower.compile() for design in designs])
+    chiller = __stack__([design.chiller.compile() for design in designs])
+    additional_power_kw = np.asarray([design.additional_power_kw for design in designs], dtype=float)[:, np.newaxis]
+    additional_heat_load_kw = \
+        np.asarray([design.additional_heat_load_kw for design in designs], dtype=float)[:, np.newaxis]
+
+    total_heat_load_kw = inputs.load_it_kw + additional_heat_load_kw
+
+    ct_results = sim.simulate_cooling_tower(ct=ct, ch=chiller, total_heat_load_kw=total_heat_load_kw, **weather)
+    chiller_results, part_load_ratio_violations = sim.simulate_chiller(
+        chiller=chiller,
+        total_heat_load_kw=total_heat_load_kw,
+        tws_temp_c=ct_results['ct_tower_water_supply_temp [C]']
+    )
+
+    return sim.get_annual_metrics(
+        results={**ct_results, **chiller_results},
+        load_it_kw=inputs.load_it_kw,
+        additional_power_kw=additional_power_kw,
+        part_load_ratio_out_of_bounds=part_load_ratio_violations.out_of_bounds,
+        energy_cost_dollar_per_kwh=inputs.energy_cost_dollar_per_kwh,
+        water_cost_dollar_per_m3=inputs.water_cost_dollar_per_m3
+    )
+
+
+def simulate_designs(inputs: sim.SimulationInputs, designs: list, chunk_size: int = 16) -> pd.DataFrame:
+    """
+    Annual energy, water and cost totals for many designs in batched, vectorized passes.
+    The designs axis is processed `chunk_size` designs at a time: the widest intermediate is the
+    (35, chunk_size, hours) CoolTools basis, about 40 MB for 16 designs over a year of hourly weather.
+    :param inputs: weather, IT load and tariffs; `baseline` and `proposed` are ignored
+    :param designs: DesignInputs to evaluate, e.g. from `build_design_grid`. They may differ in any numeric
+        parameter, but must share performance curves
+    :param chunk_size: number of designs evaluated per pass
+    :return: pd.DataFrame with one row per design: the parameters that differ between designs
+        (named like `build_design_grid` arguments) followed by `simulate.ANNUAL_METRICS`
+    """
+    if not designs:
+        raise ValueError('`designs` must contain at least one DesignInputs')
+    if chunk_size < 1:
+        raise ValueError(f"`chunk_size` must be a positive integer, not {chunk_size}")
+
+    ct_fields = __get_varying_fields__([design.cooling_tower for design in designs])
+    chiller_fields = __get_varying_fields__([design.chiller for design in designs])
+    design_fields = [
+        name for name in ('additional_power_kw', 'additional_heat_load_kw')
+        if len({getattr(design, name) for design in designs}) > 1
+    ]
+
+    _, drybulb_c, wetbulb_c, humidity_ratio_kgh2o_kgair, pressure_pa, specific_volume_moist_air = \
+        sim.build_common_model(weather=inputs.weather)
+    weather = {
+        'drybulb_c': drybulb_c,
+        'wetbulb_c': wetbulb_c,
+        'humidity_ratio_kgh2o_kgair': humidity_ratio_kgh2o_kgair,
+        'pressure_pa': pressure_pa,
+        'specific_volume_moist_air': specific_volume_moist_air
+    }
+
+    chunks = [
+        __simulate_chunk__(designs=designs[start:start + chunk_size], inputs=inputs, weather=weather)
+        for start in range(0, len(designs), chunk_size)
+    ]
+
+    table = pd.DataFrame({
+        **{f'ct_{name}': [getattr(d.cooling_tower, name) for d in designs] for name in ct_fields},
+        **{f'chiller_{name}': [getattr(d.chiller, name) for d in designs] for name in chiller_fields},
+        **{name: [getattr(d, name) for d in designs] for name in design_fields},
+        **{metric: np.concatenate([chunk[metric] for chunk in chunks]) for metric in sim.ANNUAL_METRICS}
+    })
+    table.index.name = 'design'
+
+    return table
@@ -0,0 +1,136 @@
+import pandas as pd
+from dataclasses import replace
+from models import cache
+from models import simulate as sim
+
+
+def assert_results_equal(results: sim.SimulationResults, expected: sim.SimulationResults):
+    pd.testing.assert_frame_equal(results.baseline, expected.baseline)
+    pd.testing.assert_frame_equal(results.proposed, expected.proposed)
+    for arm in ('baseline', 'proposed'):
+        violations = getattr(results, f'{arm}_part_load_ratio_violations')
+        assert violations.hours == getattr(expected, f'{arm}_part_load_ratio_violations').hours
+
+
+def count_entries(simulation_cache: cache.SimulationCache) -> dict:
+    return {stage: len(entries) for stage, entries in simulation_cache.entries.items()}
+
+
+def test_stage_cache_hit_matches_a_fresh_run(inputs):
+    simulation_cache = cache.SimulationCache()
+
+    first = simulation_cache.simulate_stages(inputs)
+    assert (simulation_cache.hits, simulation_cache.misses) == (0, 2 * len(sim.STAGES))
+    second = simulation_cache.simulate_stages(inputs)
+    assert (simulation_cache.hits, simulation_cache.misses) == (2 * len(sim.STAGES), 2 * len(sim.STAGES))
+
+    fresh = sim.WaterCooledChiller().simulate(inputs)
+    assert_results_equal(first, fresh)
+    assert_results_equal(second, fresh)
+
+
+def test_unchanged_inputs_are_served_from_memory(inputs):
+    simulation_cache = cache.SimulationCache()
+
+    first = simulation_cache.simulate(inputs)
+    # equal inputs built anew, as on a Streamlit rerun
+    second = simulation_cache.simulate(replace(inputs, baseline=replace(inputs.baseline)))
+
+    assert second is first
+    assert (simulation_cache.result_hits, simulation_cache.result_misses) == (1, 1)
+    assert (simulation_cache.hits, simulation_cache.misses) == (0, 2 * len(sim.STAGES))
+
+
+def test_tariff_change_reruns_only_the_cost_stage(inputs):
+    simulation_cache = cache.SimulationCache()
+    simulation_cache.simulate(inputs)
+    entries = count_entries(simulation_cache)
+
+    changed = replace(inputs, energy_cost_dollar_per_kwh=0.2, water_cost_dollar_per_m3=4.5)
+    results = simulation_cache.simulate(changed)
+
+    assert simulation_cache.misses == 2 * len(sim.STAGES) + 2
+    assert count_entries(simulation_cache) == {**entries, 'cost': entries['cost'] + 2}
+    assert_results_equal(results, sim.WaterCooledChiller().simulate(changed))
+
+
+def test_proposed_chiller_change_reuses_the_baseline_and_tower(inputs, proposed):
+    simulation_cache = cache.SimulationCache()
+    simulation_cache.simulate(inputs)
+    entries = count_entries(simulation_cache)
+
+    changed = replace(
+        inputs,
+        proposed=replace(proposed, chiller=replace(proposed.chiller, design_cooling_capacity_kw=12000))
+    )
+    results = simulation_cache.simulate(changed)
+
+    # the chiller, performance and cost stages of the proposed arm only
+    assert simulation_cache.misses == 2 * len(sim.STAGES) + 3
+    assert count_entries(simulation_cache) == {
+        stage: count + (stage != 'cooling_tower') for stage, count in entries.items()
+    }
+    assert_results_equal(results, sim.WaterCooledChiller().simulate(changed))
+
+
+def count_files(directory) -> int:
+    return sum(1 for _ in directory.rglob('*.parquet'))
+
+
+def test_disk_cache_round_trip(inputs, tmp_path):
+    first = cache.DiskCache(directory=str(tmp_path)).simulate(inputs)
+    assert count_files(tmp_path) == 2
+
+    # a new instance, as after a restart or in another process
+    disk_cache = cache.DiskCache(directory=str(tmp_path))
+    loaded = disk_cache.simulate(inputs)
+
+    assert (disk_cache.hits, disk_cache.misses) == (2, 0)
+    fresh = sim.WaterCooledChiller().simulate(inputs)
+    assert_results_equal(first, fresh)
+    assert_results_equal(loaded, fresh)
+
+
+def test_disk_cache_recomputes_costs_and_misses_changed_designs(inputs, proposed, tmp_path):
+    disk_cache = cache.DiskCache(directory=str(tmp_path))
+    disk_cache.simulate(inputs)
+
+    new_tariffs = replace(inputs, energy_cost_dollar_per_kwh=0.2)
+    assert_results_equal(disk_cache.simulate(new_tariffs), sim.WaterCooledChiller().simulate(new_tariffs))
+    assert (disk_cache.hits, disk_cache.misses) == (2, 2)
+
+    new_design = replace(inputs, proposed=replace(proposed, additional_power_kw=2500))
+    assert_results_equal(disk_cache.simulate(new_design), sim.WaterCooledChiller().simulate(new_design))
+    assert (disk_cache.hits, disk_cache.misses) == (3, 3)
+    assert count_files(tmp_path) == 3
+
+
+def test_disk_cache_evicts_least_recently_used_files(inputs, tmp_path):
+    disk_cache = cache.DiskCache(directory=str(tmp_path))
+    disk_cache.simulate(inputs, do_model='baseline')
+    file_bytes = sum(path.stat().st_size for path in tmp_path.rglob('*.parquet'))
+
+    disk_cache.max_bytes = int(file_bytes * 1.5)
+    disk_cache.simulate(inputs, do_model='proposed')
+
+    assert count_files(tmp_path) == 1
+    disk_cache.simulate(inputs)
+    assert (disk_cache.hits, disk_cache.misses) == (1, 3)
+
+
+def test_memory_is_checked_before_the_disk_cache(inputs, tmp_path, monkeypatch):
+    store = cache.DiskCache(directory=str(tmp_path))
+    cache.SimulationCache().simulate(inputs, store=store)
+
+    # a new session: its first run loads both arms from disk
+    simulation_cache = cache.SimulationCache()
+    first = simulation_cache.simulate(inputs, store=store)
+    assert (store.hits, store.misses, simulation_cache.misses) == (2, 2, 0)
+
+    def read_parquet(*args, **kwargs):
+        raise AssertionError('unchanged inputs were read from disk')
+
+    monkeypatch.setattr(pd, 'read_parquet', read_parquet)
+    assert simulation_cache.simulate(inputs, store=store) is first
+    assert (store.hits, store.misses) == (2, 2)
+    assert_results_equal(first, sim.WaterCooledChiller().simulate(inputs))
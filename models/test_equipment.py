@@ -0,0 +1,239 @@
+import numpy as np
+import pytest
+from models import equipment as eq
+from models import simulate as sim
+
+
+def make_cooling_tower(**kwargs) -> eq.CoolingTower:
+    parameters = dict(
+        design_wetbulb_c=28,
+        design_approach_c=3.0,
+        design_range_c=5.5556,
+        design_water_flowrate_m3_hr=2800,
+        design_air_flowrate_m3_hr=2100000,
+        design_fan_power_kw=130,
+        operating_tower_water_supply_temperature_c=27.0,
+        operating_cycles_of_concentration=5
+    )
+    parameters.update(kwargs)
+    return eq.CoolingTower(**parameters)
+
+
+@pytest.mark.parametrize('design', [
+    dict(),
+    dict(design_wetbulb_c=20, design_approach_c=5, design_range_c=8),
+    dict(design_wetbulb_c=25, design_approach_c=2, design_range_c=3)
+])
+def test_reference_water_flowrate_meets_design_approach(design):
+    ct = make_cooling_tower(**design)
+    fr_water = ct.get_reference_water_volumetric_flowrate()
+
+    assert 0 < fr_water < 1
+    approach_c = ct.__get_approach_temp__(
+        fr_water=fr_water,
+        fr_air=1.0,
+        wetbulb_c=ct.design_wetbulb_c,
+        range_c=ct.design_range_c
+    )
+    assert approach_c == pytest.approx(ct.design_approach_c, abs=1e-9)
+
+
+def test_reference_water_flowrate_is_clamped_when_design_approach_is_not_met():
+    ct = make_cooling_tower(design_approach_c=3.5)
+
+    assert ct.get_reference_water_volumetric_flowrate() == ct.__maximum_water_flowrate_ratio__
+
+
+def test_compiled_tower_is_shared_by_equal_towers():
+    assert make_cooling_tower().compile() is make_cooling_tower().compile()
+    assert make_cooling_tower().compile() != make_cooling_tower(design_approach_c=3.5).compile()
+
+
+def test_compiled_chiller_matches_its_curves():
+    chiller = eq.Chiller(design_cop=6.5, design_cooling_capacity_kw=15000, design_chw_supply_temperature_c=9.0)
+    compiled = chiller.compile()
+    chw_leaving_temp_c, cw_entering_temp_c = 9.0, np.array([10., 20., 29.5, 35.])
+    cooling_output_kw = np.array([3000., 9000., 15000., 18000.])
+
+    assert compiled is eq.Chiller(**{'design_cop': 6.5, 'design_cooling_capacity_kw': 15000,
+                                     'design_chw_supply_temperature_c': 9.0}).compile()
+    assert not compiled.cooling_capacity_ratio_coefficients.flags.writeable
+
+    capacity_kw = chiller.__curve_cooling_capacity_ratio_function_of_temperature__.evaluate(
+        chw_leaving_temp_c, cw_entering_temp_c
+    ) * chiller.design_cooling_capacity_kw
+    eir_plr = chiller.__curve_energy_input_to_cooling_output_ratio_function_of_part_load_ratio__.evaluate(
+        cooling_output_kw / capacity_kw
+    )
+    eir_temps = chiller.__curve_energy_input_to_cooling_output_ratio_function_of_temperature__.evaluate(
+        chw_leaving_temp_c, cw_entering_temp_c
+    )
+    power_kw, *_ = compiled.get_power(chw_leaving_temp_c, cw_entering_temp_c, cooling_output_kw)
+
+    np.testing.assert_array_equal(compiled.get_cooling_capacity(chw_leaving_temp_c, cw_entering_temp_c), capacity_kw)
+    np.testing.assert_array_equal(power_kw, cooling_output_kw / chiller.design_cop * (eir_plr * eir_temps))
+
+
+def simulate_cooling_tower(weather, design, load_it_kw=10000) -> dict:
+    _, drybulb_c, wetbulb_c, humidity_ratio_kgh2o_kgair, pressure_pa, specific_volume_moist_air = \
+        sim.build_common_model(weather=weather)
+    return sim.simulate_cooling_tower(
+        ct=design.cooling_tower.compile(),
+        ch=design.chiller.compile(),
+        total_heat_load_kw=load_it_kw + design.additional_heat_load_kw,
+        drybulb_c=drybulb_c,
+        wetbulb_c=wetbulb_c,
+        humidity_ratio_kgh2o_kgair=humidity_ratio_kgh2o_kgair,
+        pressure_pa=pressure_pa,
+        specific_volume_moist_air=specific_volume_moist_air
+    )
+
+
+def test_modulating_hours_meet_setpoint(weather, proposed):
+    ct = proposed.cooling_tower
+    results = simulate_cooling_tower(weather, proposed)
+    fr_air = results['ct_air_flowrate_ratio [-]']
+    modulating = (fr_air > ct.__minimum_air_flowrate_ratio__) & (fr_air < ct.__maximum_air_flowrate_ratio__)
+
+    assert modulating.sum() > 100
+    np.testing.assert_allclose(
+        results['ct_tower_water_supply_temp [C]'][modulating],
+        ct.operating_tower_water_supply_temperature_c,
+        rtol=0,
+        atol=1e-9
+    )
+
+
+def test_saturated_hours_run_full_fan_above_setpoint(weather, proposed):
+    ct = proposed.cooling_tower
+    results = simulate_cooling_tower(weather, proposed)
+    saturated = results['ct_tower_water_supply_temp_at_max_fan [C]'] > ct.operating_tower_water_supply_temperature_c
+
+    assert saturated.sum() > 50
+    np.testing.assert_array_equal(results['ct_air_flowrate_ratio [-]'][saturated], 1.0)
+    np.testing.assert_array_equal(
+        results['ct_tower_water_supply_temp [C]'][saturated],
+        results['ct_tower_water_supply_temp_at_max_fan [C]'][saturated]
+    )
+
+
+def test_each_regime_is_solved_in_one_batch():
+    ct = make_cooling_tower()
+    setpoint_c = ct.operating_tower_water_supply_temperature_c
+    # a small range, as at low load, lets a cold hour reach setpoint in free convection
+    range_c = 2.0
+    fr_water = np.full(3, 0.8)
+    wetbulb_c = np.array([0., 24., 28.])
+    tws_temp_at_max_fan_c = ct.get_tws_temp_at_max_fan(fr_water=fr_water, wetbulb_c=wetbulb_c, range_c=range_c)
+    tws_temp_free_convection_c = ct.get_tws_temp_free_convection(
+        tws_temp_at_max_fan_c=tws_temp_at_max_fan_c,
+        twr_temp_c=setpoint_c + range_c
+    )
+
+    tws_temp_c, fr_air = ct.get_tws_temp_and_fr_air(
+        fr_water=fr_water,
+        tws_temp_at_max_fan_c=tws_temp_at_max_fan_c,
+        tws_temp_free_convection_c=tws_temp_free_convection_c,
+        tws_temp_setpoint_c=setpoint_c,
+        wetbulb_c=wetbulb_c,
+        range_c=range_c
+    )
+
+    # free convection, modulating and saturated, in that order
+    assert tws_temp_free_convection_c[0] <= setpoint_c
+    assert tws_temp_at_max_fan_c[2] > setpoint_c
+    assert fr_air[0] == 0.0 and 0 < fr_air[1] < 1 and fr_air[2] == 1.0
+    np.testing.assert_allclose(tws_temp_c, [setpoint_c, setpoint_c, tws_temp_at_max_fan_c[2]], rtol=0, atol=1e-9)
+
+
+def test_part_load_ratio_violations_are_masked_and_counted():
+    chiller = eq.Chiller(design_cop=6.5, design_cooling_capacity_kw=15000, design_chw_supply_temperature_c=9.0)
+
+    violations = chiller.check_part_load_ratio([0.1, 0.5, 1.0, 1.2, 1.5, 0.19, 1.04, 0.2])
+
+    np.testing.assert_array_equal(violations.out_of_bounds, [True, False, False, True, True, True, False, False])
+    assert violations.hours == 4
+    assert violations.worst_part_load_ratio == 1.5
+    assert violations.suggested_cooling_capacity_kw == 27000
+    assert '4 hour(s)' in violations.message
+
+
+def test_part_load_ratio_below_bounds_suggests_no_upsize():
+    chiller = eq.Chiller(design_cop=6.5, design_cooling_capacity_kw=15000, design_chw_supply_temperature_c=9.0)
+
+    violations = chiller.check_part_load_ratio(np.array([0.1, 0.05, 0.5]))
+    assert (violations.hours, violations.worst_part_load_ratio) == (2, 0.05)
+    assert violations.suggested_cooling_capacity_kw is None
+
+    assert chiller.check_part_load_ratio(np.linspace(0.2, 1.04, 10)).message == ''
+
+
+def test_undersized_chiller_completes_the_run(inputs, proposed):
+    chiller = eq.Chiller(design_cop=6.5, design_cooling_capacity_kw=10000, design_chw_supply_temperature_c=9.0)
+    design = sim.DesignInputs(
+        cooling_tower=proposed.cooling_tower,
+        chiller=chiller,
+        additional_power_kw=proposed.additional_power_kw,
+        additional_heat_load_kw=proposed.additional_heat_load_kw
+    )
+
+    results = sim.WaterCooledChiller().simulate(
+        sim.SimulationInputs(
+            weather=inputs.weather,
+            load_it_kw=inputs.load_it_kw,
+            energy_cost_dollar_per_kwh=inputs.energy_cost_dollar_per_kwh,
+            water_cost_dollar_per_m3=inputs.water_cost_dollar_per_m3,
+            baseline=design
+        ),
+        do_model='baseline'
+    )
+    part_load_ratio = results.baseline['chiller_part_load_ratio [-]'].to_numpy()
+    violations = results.baseline_part_load_ratio_violations
+
+    assert 0 < violations.hours < len(part_load_ratio)
+    assert violations.hours == ((part_load_ratio < 0.2) | (part_load_ratio > 1.04)).sum()
+    np.testing.assert_array_equal(violations.out_of_bounds, part_load_ratio > 1.04)
+    assert np.isfinite(results.baseline['chiller_power [kW]']).all()
+
+
+def test_blowdown_is_fractional_and_nonzero(weather, proposed):
+    ct = proposed.cooling_tower
+    results = simulate_cooling_tower(weather, proposed)
+    evaporation = results['ct_makeup_flowrate_evaporation [m^3]']
+    drift = results['ct_makeup_flowrate_drift [m^3]']
+    blowdown = results['ct_makeup_flowrate_blowdown [m^3]']
+
+    assert blowdown.dtype == np.float64
+    assert (blowdown > 0).sum() > len(blowdown) / 2
+    # fractional hourly volumes, not truncated to whole cubic meters
+    assert (blowdown % 1 != 0).any()
+    np.testing.assert_allclose(
+        blowdown,
+        np.maximum(evaporation / (ct.operating_cycles_of_concentration - 1) - drift, 0),
+        rtol=1e-12
+    )
+    np.testing.assert_allclose(
+        results['ct_makeup_flowrate_total [m^3]'], evaporation + drift + blowdown, rtol=1e-12
+    )
+
+
+def test_makeup_water_for_one_hour_matches_the_array_result(weather, proposed):
+    ct = proposed.cooling_tower
+    _, drybulb_c, _, humidity_ratio_kgh2o_kgair, pressure_pa, specific_volume_moist_air = \
+        sim.build_common_model(weather=weather)
+    hours = np.arange(0, len(drybulb_c), 97)
+    fr_air = np.linspace(0.2, 1.0, len(hours))
+    parameters = dict(
+        drybulb_c=drybulb_c[hours],
+        humidity_ratio_kgh2o_kgair=humidity_ratio_kgh2o_kgair[hours],
+        pressure_pa=pressure_pa[hours],
+        specific_volume_moist_air=specific_volume_moist_air[hours],
+        air_flowrate_m3_hr=ct.design_air_flowrate_m3_hr * fr_air,
+        water_flowrate_m3_s=0.7,
+        fr_air=fr_air
+    )
+
+    flowrates = np.array(ct.get_makeup_water_usage(**parameters))
+    for i in range(len(hours)):
+        hour = {name: value if np.ndim(value) == 0 else value[i] for name, value in parameters.items()}
+        np.testing.assert_allclose(ct.get_makeup_water_usage(**hour), flowrates[:, i], rtol=1e-12)
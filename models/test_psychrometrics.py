@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from models import psychrometrics as psy
+
+# reference values from PsychroLib 2.5 (psychrolib.GetSatVapPres, GetTDewPointFromVapPres, GetTWetBulbFromRelHum)
+SAT_VAP_PRES = {
+    'SI': [
+        (-60, 1.0816731664634545), (-20, 103.26037858050408), (-5, 401.7641224788012), (5, 872.4866542640299),
+        (25, 3169.2164701436277), (50, 12349.856466723748), (100, 101418.71682799235), (150, 476197.8759422016)
+    ],
+    'IP': [
+        (-76, 0.00015688327408454686), (-4, 0.014976639310442574), (23, 0.05827091398972691),
+        (41, 0.12654344113099805), (77, 0.4596557939864845), (122, 1.7911944230451267),
+        (212, 14.709533383681512), (302, 69.06662005922422)
+    ]
+}
+T_DEW_POINT = {
+    'SI': [(25, 1584.85, 13.866321068708261), (-10, 100.0, -20.33387132352077)],
+    'IP': [(77, 0.2, 53.13650440599488), (14, 0.02, 1.4906689657972798)]
+}
+T_WET_BULB = {
+    'SI': [(25, 0.5, 17.889432148552928), (-5, 0.8, -5.883952262502155), (40, 0.1, 18.565884569148306)],
+    'IP': [(77, 0.5, 64.1960838107664), (23, 0.8, 21.40661377469209), (104, 0.1, 65.40524801347593)]
+}
+PRESSURE = {'SI': 101325., 'IP': 14.696}
+TOLERANCE = {'SI': psy.TOLERANCE_SI, 'IP': psy.TOLERANCE_IP}
+
+
+@pytest.mark.parametrize('unit_system', ['SI', 'IP'])
+def test_sat_vap_pres_matches_psychrolib(unit_system):
+    t_dry_bulb, expected = np.array(SAT_VAP_PRES[unit_system]).T
+    np.testing.assert_allclose(psy.get_sat_vap_pres(t_dry_bulb, unit_system=unit_system), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('unit_system', ['SI', 'IP'])
+def test_t_dew_point_matches_psychrolib(unit_system):
+    t_dry_bulb, vap_pres, expected = np.array(T_DEW_POINT[unit_system]).T
+    t_dew_point = psy.get_t_dew_point_from_vap_pres(t_dry_bulb, vap_pres, unit_system=unit_system)
+    np.testing.assert_allclose(t_dew_point, expected, rtol=0, atol=TOLERANCE[unit_system])
+
+
+@pytest.mark.parametrize('unit_system', ['SI', 'IP'])
+def test_t_wet_bulb_matches_psychrolib(unit_system):
+    t_dry_bulb, rel_hum, expected = np.array(T_WET_BULB[unit_system]).T
+    hum_ratio = psy.get_hum_ratio_from_rel_hum(t_dry_bulb, rel_hum, PRESSURE[unit_system], unit_system=unit_system)
+    t_wet_bulb = psy.get_t_wet_bulb_from_hum_ratio(
+        t_dry_bulb, hum_ratio, PRESSURE[unit_system], unit_system=unit_system
+    )
+    np.testing.assert_allclose(t_wet_bulb, expected, rtol=0, atol=TOLERANCE[unit_system])
+
+
+def test_out_of_range_inputs_are_nan_for_their_element_only():
+    np.testing.assert_array_equal(np.isnan(psy.get_sat_vap_pres([25., 250., -150.])), [False, True, True])
+    np.testing.assert_array_equal(np.isnan(psy.get_vap_pres_from_rel_hum(25., [.5, 1.5, -.1])), [False, True, True])
+    np.testing.assert_array_equal(
+        np.isnan(psy.get_t_wet_bulb_from_t_dew_point([20., 20.], [10., 25.], 101325.)), [False, True]
+    )
+
+
+def test_out_of_range_hours_are_labeled_missing():
+    t_dry_bulb = np.array([20., 250., 15., 10., 5.])
+    t_dew_point = np.array([5., 5., 5., 3., 300.])
+    rel_hum = np.array([.5, .5, 1.5, np.nan, np.nan])
+
+    hum_ratio, t_wet_bulb, *_, method = psy.calc_psychrometrics(
+        t_dry_bulb, t_dew_point, rel_hum, 101325., unit_system='SI'
+    )
+
+    np.testing.assert_array_equal(method, [
+        psy.METHOD_RELATIVE_HUMIDITY, psy.METHOD_MISSING, psy.METHOD_DEW_POINT, psy.METHOD_DEW_POINT,
+        psy.METHOD_INTERPOLATED
+    ])
+    np.testing.assert_array_equal(np.isnan(t_wet_bulb), [False, True, False, False, False])
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+from dataclasses import replace
+from models import simulate as sim
+
+
+def test_stream_totals_match_a_whole_record_run(inputs):
+    streamed = sim.simulate_stream(inputs, chunk_size=100)
+    results = sim.WaterCooledChiller().simulate(inputs, do_model='baseline').baseline
+
+    assert streamed.totals['total_energy [kWh]'] == pytest.approx(results['total_power_consumption [kW]'].sum())
+    assert streamed.periods['total_energy [kWh]'].sum() == pytest.approx(streamed.totals['total_energy [kWh]'])
+
+
+def test_joined_frames_are_built_once_per_buffer(inputs):
+    results = sim.WaterCooledChiller().simulate(inputs)
+
+    baseline = results.baseline
+    assert results.baseline is baseline
+    assert list(baseline.columns[:len(inputs.weather.columns)]) == list(inputs.weather.columns)
+
+    # replacing a buffer, as DiskCache does when it fills in an arm, rebuilds that arm's frame
+    results.baseline_buffer = results.proposed_buffer
+    assert results.baseline is not baseline
+    pd.testing.assert_frame_equal(results.baseline, results.proposed)
+
+
+def test_stream_rejects_periods_without_a_datetime_index(inputs, weather):
+    unindexed = replace(inputs, weather=weather.reset_index(drop=True))
+
+    with pytest.raises(ValueError, match='RangeIndex'):
+        sim.simulate_stream(unindexed, chunk_size=100)
+
+    streamed = sim.simulate_stream(unindexed, chunk_size=100, period=None)
+    assert streamed.totals['total_energy [kWh]'] == pytest.approx(
+        sim.simulate_stream(inputs, chunk_size=100).totals['total_energy [kWh]']
+    )
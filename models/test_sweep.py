@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from dataclasses import replace
+from models import equipment as eq
+from models import simulate as sim
+from models import sweep
+
+# annual metric -> hourly result column it totals
+HOURLY_COLUMNS = {
+    'total_energy [kWh]': 'total_power_consumption [kW]',
+    'ct_fan_energy [kWh]': 'ct_fan_power [kW]',
+    'ct_makeup_total [m^3]': 'ct_makeup_flowrate_total [m^3]',
+    'Energy Cost [$]': 'Energy Cost [$]',
+    'Water Cost [$]': 'Water Cost [$]'
+}
+
+
+def test_design_grid_accepts_numpy_values(baseline):
+    designs = sweep.build_design_grid(
+        baseline,
+        ct_design_approach_c=np.array([3.0, 3.5]),
+        chiller_design_cop=np.linspace(5.5, 6.5, 3)
+    )
+
+    assert len(designs) == 6
+    assert sweep.__get_varying_fields__([design.chiller for design in designs]) == ['design_cop']
+
+
+def test_sweep_rejects_non_numeric_differences(inputs, baseline):
+    designs = [baseline, replace(baseline, chiller=replace(baseline.chiller, design_cop='6.5'))]
+
+    with pytest.raises(ValueError, match='design_cop'):
+        sweep.simulate_designs(inputs, designs)
+
+
+def test_sweep_totals_match_single_design_runs(inputs, baseline, proposed):
+    designs = sweep.build_design_grid(
+        baseline,
+        ct_design_approach_c=[3.0, 4.0],
+        ct_operating_cycles_of_concentration=[3.5, 5],
+        chiller_design_cop=np.array([5.5, 6.04]),
+        additional_power_kw=[2000, 3000]
+    ) + [proposed]
+
+    table = sweep.simulate_designs(inputs, designs, chunk_size=5)
+
+    assert len(table) == len(designs)
+    for i, design in enumerate(designs):
+        results = sim.WaterCooledChiller().simulate(replace(inputs, baseline=design), do_model='baseline').baseline
+        for metric, column in HOURLY_COLUMNS.items():
+            assert table.loc[i, metric] == pytest.approx(results[column].sum(), rel=1e-9), (i, metric)
+
+
+def test_designs_are_compiled_once(inputs, baseline):
+    designs = sweep.build_design_grid(baseline, ct_design_approach_c=[3.11, 3.22, 3.33], chiller_design_cop=[5.9, 6.1])
+
+    sweep.simulate_designs(inputs, designs, chunk_size=4)
+    misses = eq.CoolingTower.__compile__.cache_info().misses
+    sweep.simulate_designs(inputs, designs, chunk_size=4)
+
+    assert eq.CoolingTower.__compile__.cache_info().misses == misses
+    stacked = sweep.__stack__([design.cooling_tower.compile() for design in designs])
+    assert stacked.reference_fr_water.shape == (len(designs), 1)
+    assert np.ndim(stacked.design_fan_power_kw) == 0
@@ -0,0 +1,820 @@
+"""
+Local weather store and archive.
+
+Hourly weather is kept on disk per lat/lon grid cell, together with its derived psychrometric columns, so a
+location is downloaded and its psychrometrics computed once rather than on every session. Each request fetches
+only the hours the cell does not hold yet (e.g. the newest day of a rolling one-year window), and an offline store
+serves entirely from disk.
+
+Typical-year and actual-year weather files (EPW, TMY3) are parsed into the same columns with `load_weather_file`
+and can be batch-imported into the store, for design work and for machines that cannot reach Meteostat.
+
+For screening many sites, `write_weather_archive` packs the weather of any number of sites into a columnar
+archive of fixed-dtype .npy arrays that `WeatherArchive` memory-maps, so any site and time range is sliced without
+parsing or copying.
+"""
+import contextlib
+import csv
+import functools
+import io
+import json
+import os
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from models import psychrometrics as psy
+import utils
+
+GRID_RESOLUTION_DEG = 0.1  # about 11 km of latitude; sites within a cell share one weather record
+SETTLING_PERIOD = timedelta(days=7)  # stations report late, so the most recent hours are fetched again next time
+HOUR = pd.Timedelta(hours=1)
+METEOSTAT = 'meteostat'
+TYPICAL_YEAR_SOURCE = 'typical_year'
+TYPICAL_YEAR = 2001  # not a leap year; typical-year weather files are stitched from months of different years
+COVERAGE_METADATA_KEY = b'energy_water_nexus_coverage'  # Parquet metadata holding a cell's fetched hour ranges
+
+# https://dev.meteostat.net/formats.html#meteorological-data-units
+METEOSTAT_COLUMNS = {
+    'temp': 'temperature [C]',
+    'dwpt': 'dew_point [C]',
+    'rhum': 'relative_humidity [%]',
+    'pres': 'air_pressure [hPa]',
+    'wdir': 'wind_direction [deg]',
+    'wspd': 'wind_speed [km/h]'
+}
+RAW_COLUMNS = list(METEOSTAT_COLUMNS.values())
+
+
+def get_grid_cell(latitude: float, longitude: float, resolution_deg: float = GRID_RESOLUTION_DEG) -> tuple:
+    """
+    Snap a location to the center of its grid cell.
+    :return: tuple of (latitude, longitude)
+    """
+    return (
+        round(round(latitude / resolution_deg) * resolution_deg, 6),
+        round(round(longitude / resolution_deg) * resolution_deg, 6)
+    )
+
+
+def calculate_psychrometrics(dry_bulb, dew_point, rh, pressure, unit_system: str = 'SI') -> pd.DataFrame:
+    """
+    Utility function on top of the array-native `models.psychrometrics.calc_psychrometrics`
+    used to handle data structure. The calculation path is chosen per hour: relative humidity where valid,
+    dew point where relative humidity is missing, and interpolation where both are missing.
+    The path used for each hour is reported in the `Psychrometrics (out): method [-]` column.
+
+    Args:
+    dry_bulb: Series object containing Dry Bulb temperatures [F]
+    dew_point: Series object containing Dew Point temperatures [F]
+    rh: Series object containing Relative Humidity [%]
+    pressure: Series object containing ambient air Pressure [psi]
+
+    Returns:
+    Humidity ratio in lb_H₂O lb_Air⁻¹ [IP] or kg_H₂O kg_Air⁻¹ [SI]
+    Wet-bulb temperature in °F [IP] or °C [SI]
+    Dew-point temperature in °F [IP] or °C [SI]
+    Relative humidity [%]
+    Partial pressure of water vapor in moist air in Psi [IP] or Pa [SI]
+    Moist air enthalpy in Btu lb⁻¹ [IP] or J kg⁻¹ [SI]
+    Specific volume of moist air in ft³ lb⁻¹ [IP] or in m³ kg⁻¹ [SI]
+    Degree of saturation [unitless]
+    """
+
+    if unit_system == 'SI':
+        temp_units = 'C'
+        pressure_units = 'Pa'
+        hum_ratio_units = 'kgH2O/kgAir'
+        enthalpy_units = 'J/kg'
+        moist_air_volume_units = 'm^3/kg'
+    elif unit_system == 'IP':
+        temp_units = 'F'
+        pressure_units = 'psi'
+        hum_ratio_units = 'lbH2O/lbAir'
+        enthalpy_units = 'Btu/lb'
+        moist_air_volume_units = 'ft^3/lb'
+    else:
+        raise ValueError(f"`unit_system` parameter must be one of: `SI` or `IP`, not {unit_system}")
+
+    df = pd.DataFrame()
+
+    df[f'Psychrometrics (in): dry_bulb [{temp_units}]'] = dry_bulb
+    if dew_point is not None:
+        df[f'Psychrometrics (in): dew_point [{temp_units}]'] = dew_point
+    if rh is not None:
+        df[f'Psychrometrics (in): relative_humidity [%]'] = rh
+    df[f'Psychrometrics (in): ambient_pressure [{pressure_units}]'] = pressure
+
+    df[f'Psychrometrics (out): humidity_ratio [{hum_ratio_units}]'], \
+        df[f'Psychrometrics (out): wet_bulb [{temp_units}]'], \
+        df[f'Psychrometrics (out): dew_point [{temp_units}]'], \
+        df[f'Psychrometrics (out): relative_humidity [%]'], \
+        df[f'Psychrometrics (out): partial_pressure_water_vapor [{pressure_units}]'], \
+        df[f'Psychrometrics (out): moist_air_enthalpy [{enthalpy_units}]'], \
+        df[f'Psychrometrics (out): specific_volume_moist_air [{moist_air_volume_units}]'], \
+        df[f'Psychrometrics (out): degree_of_saturation [-]'], \
+        df[f'Psychrometrics (out): method [-]'] = \
+        psy.calc_psychrometrics(
+            t_dry_bulb=dry_bulb,
+            t_dew_point=dew_point,
+            rel_hum=rh / 100 if rh is not None else None,
+            pressure=pressure,
+            unit_system=unit_system
+        )
+    df[f'Psychrometrics (out): relative_humidity [%]'] *= 100
+
+    return df
+
+
+def derive_weather(raw: pd.DataFrame, unit_system: str = 'SI') -> pd.DataFrame:
+    """
+    Weather table as used throughout the app: the raw `RAW_COLUMNS` followed by unit conversions and psychrometrics.
+    :param raw: hourly weather with `RAW_COLUMNS`
+    :param unit_system: `SI`, or `IP` to add IP conversions and psychrometrics to the SI ones
+    """
+
+    def convert_hpa_to_pa(hpa):
+        return hpa * 100
+
+    def convert_pa_to_psi(pa):
+        return pa / 6_894.76
+
+    def convert_kmh_to_mph(kmh):
+        return kmh / 1.609
+
+    weather = raw[RAW_COLUMNS].copy()
+    weather['air_pressure [Pa]'] = convert_hpa_to_pa(weather['air_pressure [hPa]'])
+
+    psychro = calculate_psychrometrics(
+        dry_bulb=weather['temperature [C]'],
+        dew_point=weather['dew_point [C]'],
+        rh=weather['relative_humidity [%]'],
+        pressure=weather['air_pressure [Pa]']
+    )
+
+    if unit_system == 'IP':
+
+        weather['temperature [F]'] = utils.convert_degC_to_degF(weather['temperature [C]'])
+        weather['dew_point [F]'] = utils.convert_degC_to_degF(weather['dew_point [C]'])
+        weather['air_pressure [psi]'] = convert_pa_to_psi(weather['air_pressure [Pa]'])
+        weather['wind_speed [mph]'] = convert_kmh_to_mph(weather['wind_speed [km/h]'])
+
+        psychro_ip = calculate_psychrometrics(
+            dry_bulb=weather['temperature [F]'],
+            dew_point=weather['dew_point [F]'],
+            rh=weather['relative_humidity [%]'],
+            pressure=weather['air_pressure [psi]'],
+            unit_system=unit_system
+        )
+
+        # because these are dimensionless units, they are duplicated between 'IP' and 'SI' calculations
+        psychro_ip.drop(
+            columns=[
+                'Psychrometrics (in): relative_humidity [%]',
+                'Psychrometrics (out): relative_humidity [%]',
+                'Psychrometrics (out): degree_of_saturation [-]',
+                'Psychrometrics (out): method [-]'
+            ],
+            inplace=True
+        )
+
+        weather_psychro = [weather, psychro, psychro_ip]
+
+    elif unit_system == 'SI':
+        weather_psychro = [weather, psychro]
+
+    else:
+        raise ValueError(f"`unit_system` parameter must be one of: `SI` or `IP`, not {unit_system}")
+
+    return pd.concat(weather_psychro, axis=1)
+
+
+@functools.lru_cache(maxsize=None)
+def get_weather_columns(unit_system: str = 'SI') -> tuple:
+    """
+    Columns of `derive_weather` for a unit system. The `IP` columns are a superset of the `SI` ones.
+    """
+    sample = pd.DataFrame([[20., 10., 50., 1013.25, 0., 0.]], columns=RAW_COLUMNS)
+    return tuple(derive_weather(sample, unit_system=unit_system).columns)
+
+
+def fetch_meteostat(latitude: float, longitude: float, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """
+    Hourly weather from https://dev.meteostat.net/ between `start` and `end` (inclusive, UTC).
+    :return: pd.DataFrame of `RAW_COLUMNS`, without rows for hours that have no observations
+    """
+    from meteostat import Point, Hourly  # imported here so weather stored on disk can be read without Meteostat
+
+    raw = Hourly(loc=Point(lat=latitude, lon=longitude), start=start.to_pydatetime(), end=end.to_pydatetime()).fetch()
+    raw = raw[list(METEOSTAT_COLUMNS)].rename(columns=METEOSTAT_COLUMNS)
+    return raw.loc[(raw.index >= start) & (raw.index <= end)]
+
+
+def __merge_intervals__(intervals: list) -> list:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + HOUR:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def __get_missing_intervals__(start: pd.Timestamp, end: pd.Timestamp, coverage: list) -> list:
+    """
+    Hour ranges between `start` and `end` (inclusive) not covered by the (merged, sorted) `coverage` intervals.
+    """
+    missing = []
+    cursor = start
+    for covered_start, covered_end in coverage:
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            missing.append((cursor, covered_start - HOUR))
+        cursor = max(cursor, covered_end + HOUR)
+    if cursor <= end:
+        missing.append((cursor, end))
+    return missing
+
+
+def __get_runs__(mask: np.ndarray) -> list:
+    """
+    (first, last) positions of each run of True values in a boolean array.
+    """
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1))
+
+
+def __update_table__(table: pd.DataFrame, raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge newly fetched raw hours into a stored table, deriving psychrometrics only where they can change.
+    Interpolated humidity depends on the nearest hours with known humidity, so each run of new hours is derived
+    together with the stored hours back to (and forward to) the nearest stored hour with known humidity,
+    which gives the same result as deriving the whole table again.
+    """
+    if table is None or table.empty:
+        return derive_weather(raw.sort_index(), unit_system='IP')
+
+    merged = pd.concat([table[RAW_COLUMNS], raw])
+    merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+
+    is_new = merged.index.isin(raw.index)
+    method = table['Psychrometrics (out): method [-]'].reindex(merged.index)
+    is_known = ~is_new & method.isin([psy.METHOD_RELATIVE_HUMIDITY, psy.METHOD_DEW_POINT]).to_numpy()
+    known = np.flatnonzero(is_known)
+
+    dirty = np.zeros(len(merged.index), dtype=bool)
+    for first, last in __get_runs__(is_new):
+        before = known[known < first]
+        after = known[known > last]
+        dirty[before[-1] if before.size else 0:after[0] + 1 if after.size else len(dirty)] = True
+
+    updated = table.reindex(merged.index)
+    for first, last in __get_runs__(dirty):
+        derived = derive_weather(merged.iloc[first:last + 1], unit_system='IP')
+        updated.iloc[first:last + 1] = derived[updated.columns]
+    return updated
+
+
+@dataclass(frozen=True)
+class WeatherFile:
+    """
+    Hourly weather read from a typical-year or actual-year weather file, with the location from its header.
+    `raw` holds `RAW_COLUMNS` indexed by the start of each hour in local standard time.
+    """
+    location: str
+    country: str
+    latitude: float
+    longitude: float
+    raw: pd.DataFrame
+
+
+def __read_text__(source) -> str:
+    if hasattr(source, 'read'):
+        text = source.read()
+        return text.decode('utf-8', errors='replace') if isinstance(text, bytes) else text
+    with open(source, encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def __get_time_index__(year: np.ndarray, month: np.ndarray, day: np.ndarray, hour: np.ndarray, normalize) -> tuple:
+    """
+    Hour-starting timestamps from the hour-ending (1 to 24) convention of weather files. Typical years are stitched
+    from months of different years, so unless the years are in order they are replaced by `TYPICAL_YEAR`
+    (dropping any leap day). `normalize` forces a year (int), or keeps the file's years (False).
+    :return: tuple of (DatetimeIndex, boolean mask of the rows it covers)
+    """
+    if normalize is None:
+        normalize = False if np.all(np.diff(year) >= 0) else TYPICAL_YEAR
+    if normalize is not False:
+        year = np.full(year.shape, normalize)
+    time = pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': day}), errors='coerce') + \
+        pd.to_timedelta(hour - 1, unit='h')
+    valid = time.notna().to_numpy()
+    return pd.DatetimeIndex(time[valid], name='time'), valid
+
+
+def read_epw(source, year=None) -> WeatherFile:
+    """
+    Read an EnergyPlus weather (EPW) file, https://energyplus.net/weather.
+    :param source: path or file-like object
+    :param year: year to assign to every hour, None to keep actual-year files and set typical years to
+        `TYPICAL_YEAR`, or False to keep the file's years
+    """
+    text = __read_text__(source)
+    location = next(csv.reader([text.split('\n', 1)[0].strip()]))
+    if location[0].upper() != 'LOCATION':
+        raise ValueError(f"EPW file must start with a `LOCATION` line: {getattr(source, 'name', source)}")
+
+    data = pd.read_csv(
+        io.StringIO(text),
+        skiprows=8,
+        header=None,
+        usecols=[0, 1, 2, 3, 6, 7, 8, 9, 20, 21],
+        names=['year', 'month', 'day', 'hour', 'drybulb', 'dewpoint', 'rh', 'pressure', 'wdir', 'wspd']
+    )
+    time, valid = __get_time_index__(
+        *(data[column].to_numpy() for column in ('year', 'month', 'day', 'hour')), normalize=year
+    )
+    data = data[valid]
+
+    # missing-value codes of the EPW data dictionary (EnergyPlus Auxiliary Programs)
+    raw = pd.DataFrame({
+        'temperature [C]': data['drybulb'].where(data['drybulb'] < 99.9).to_numpy(),
+        'dew_point [C]': data['dewpoint'].where(data['dewpoint'] < 99.9).to_numpy(),
+        'relative_humidity [%]': data['rh'].where(data['rh'] < 999).to_numpy(),
+        'air_pressure [hPa]': data['pressure'].where(data['pressure'] < 999999).to_numpy() / 100,
+        'wind_direction [deg]': data['wdir'].where(data['wdir'] < 999).to_numpy(),
+        'wind_speed [km/h]': data['wspd'].where(data['wspd'] < 999).to_numpy() * 3.6
+    }, index=time)
+
+    return WeatherFile(
+        location=', '.join(part for part in location[1:4] if part and part != '-'),
+        country=location[3],
+        latitude=float(location[6]),
+        longitude=float(location[7]),
+        raw=raw
+    )
+
+
+def read_tmy3(source, year=None) -> WeatherFile:
+    """
+    Read an NSRDB TMY3 .csv file, https://www.nrel.gov/docs/fy08osti/43156.pdf.
+    :param source: path or file-like object
+    :param year: as for `read_epw`
+    """
+    text = __read_text__(source)
+    header = next(csv.reader([text.split('\n', 1)[0].strip()]))
+    if len(header) < 7:
+        raise ValueError(f"TMY3 file must start with a site header line: {getattr(source, 'name', source)}")
+
+    columns = {
+        'Dry-bulb (C)': 'temperature [C]',
+        'Dew-point (C)': 'dew_point [C]',
+        'RHum (%)': 'relative_humidity [%]',
+        'Pressure (mbar)': 'air_pressure [hPa]',
+        'Wdir (degrees)': 'wind_direction [deg]',
+        'Wspd (m/s)': 'wind_speed [km/h]'
+    }
+    data = pd.read_csv(io.StringIO(text), skiprows=1, usecols=['Date (MM/DD/YYYY)', 'Time (HH:MM)', *columns])
+    date = pd.to_datetime(data['Date (MM/DD/YYYY)'], format='%m/%d/%Y')
+    time, valid = __get_time_index__(
+        date.dt.year.to_numpy(),
+        date.dt.month.to_numpy(),
+        date.dt.day.to_numpy(),
+        data['Time (HH:MM)'].str.slice(0, 2).astype(int).to_numpy(),
+        normalize=year
+    )
+
+    # TMY3 marks missing values as -9900
+    raw = data[list(columns)][valid].rename(columns=columns)
+    raw = raw.where(raw > -9900).set_axis(time, axis=0)
+    raw['wind_speed [km/h]'] *= 3.6
+
+    return WeatherFile(
+        location=', '.join(part.strip() for part in header[1:3]),
+        country='USA',
+        latitude=float(header[4]),
+        longitude=float(header[5]),
+        raw=raw[RAW_COLUMNS]
+    )
+
+
+WEATHER_FILE_READERS = {'.epw': read_epw, '.csv': read_tmy3}
+
+
+def read_weather_file(source, year=None) -> WeatherFile:
+    """
+    Read an EPW or TMY3 weather file, chosen by its extension.
+    :param source: path or file-like object with a `name` (e.g. a Streamlit upload)
+    :param year: as for `read_epw`
+    """
+    extension = os.path.splitext(str(getattr(source, 'name', source)))[1].lower()
+    if extension not in WEATHER_FILE_READERS:
+        raise ValueError(
+            f"weather file must be one of: {', '.join(f'`{e}`' for e in WEATHER_FILE_READERS)}, not {source}"
+        )
+    return WEATHER_FILE_READERS[extension](source, year=year)
+
+
+def load_weather_file(source, unit_system: str = 'SI', year=None) -> pd.DataFrame:
+    """
+    Weather table from an EPW or TMY3 file, with the same columns as the Weather page's table, e.g. for
+    `simulate.SimulationInputs.weather` without network access.
+    """
+    return derive_weather(read_weather_file(source, year=year).raw, unit_system=unit_system)
+
+
+def __read_and_derive__(path: str, year) -> tuple:
+    weather_file = read_weather_file(path, year=year)
+    return weather_file, derive_weather(weather_file.raw, unit_system='IP')
+
+
+@dataclass
+class WeatherStore:
+    """
+    Hourly weather on disk, one Parquet file per source and grid cell holding the raw observations and every
+    derived column of both unit systems, and in its metadata the hour ranges that have already been fetched
+    (hours without observations are remembered as fetched, so they are not requested again). Updates to a cell
+    are serialized by a lock file, so sessions and processes sharing a store do not lose each other's hours.
+    Sources keep e.g. typical years imported from weather files apart from the Meteostat record of the same place.
+    :param fetch: callable (latitude, longitude, start, end) -> raw hourly weather, defaults to Meteostat
+    :param offline: serve only what is already on disk, never fetching
+    """
+    directory: str
+    resolution_deg: float = GRID_RESOLUTION_DEG
+    offline: bool = False
+    fetch: callable = fetch_meteostat
+
+    def __get_path__(self, cell: tuple, extension: str, source: str) -> str:
+        return os.path.join(self.directory, source, f'{cell[0]:+.4f}_{cell[1]:+.4f}.{extension}')
+
+    @contextlib.contextmanager
+    def __lock__(self, cell: tuple, source: str):
+        """
+        Exclusive lock on a cell's record, held across its read-modify-write by any thread or process (e.g. other
+        sessions, or other processes importing weather files) using the same store directory.
+        """
+        path = self.__get_path__(cell, 'lock', source=source)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a+b') as f:
+            if os.name == 'nt':
+                import msvcrt
+
+                f.seek(0)
+                # LK_LOCK gives up after 10 s, so keep waiting until the first byte of the lock file is free
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+                try:
+                    yield
+                finally:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def __read__(self, cell: tuple, source: str) -> tuple:
+        try:
+            parquet = pq.read_table(self.__get_path__(cell, 'parquet', source=source))
+        except FileNotFoundError:
+            return None, []
+        return parquet.to_pandas(), self.__get_coverage__(cell, parquet.schema, source=source)
+
+    def __read_coverage__(self, cell: tuple, source: str) -> list:
+        """
+        Coverage of a cell from the Parquet footer alone, without reading the table.
+        """
+        try:
+            schema = pq.read_schema(self.__get_path__(cell, 'parquet', source=source))
+        except FileNotFoundError:
+            return []
+        return self.__get_coverage__(cell, schema, source=source)
+
+    def __get_coverage__(self, cell: tuple, schema: pa.Schema, source: str) -> list:
+        metadata = schema.metadata or {}
+        if COVERAGE_METADATA_KEY in metadata:
+            intervals = json.loads(metadata[COVERAGE_METADATA_KEY])
+        else:
+            # stores written before coverage was kept in the Parquet file record it next to it
+            try:
+                with open(self.__get_path__(cell, 'json', source=source)) as f:
+                    intervals = json.load(f)['coverage']
+            except FileNotFoundError:
+                intervals = []
+        return [(pd.Timestamp(start), pd.Timestamp(end)) for start, end in intervals]
+
+    def __write__(self, path: str, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f'{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+        try:
+            write(temporary_path)
+            os.replace(temporary_path, path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    def __save__(self, cell: tuple, table: pd.DataFrame, coverage: list, source: str):
+        # coverage is kept in the Parquet file's metadata, so the table and its coverage are replaced together
+        parquet = pa.Table.from_pandas(table)
+        parquet = parquet.replace_schema_metadata({
+            **(parquet.schema.metadata or {}),
+            COVERAGE_METADATA_KEY: json.dumps([[start.isoformat(), end.isoformat()] for start, end in coverage])
+        })
+        self.__write__(
+            self.__get_path__(cell, 'parquet', source=source),
+            lambda path: pq.write_table(parquet, path, compression='zstd')
+        )
+
+        legacy_coverage_path = self.__get_path__(cell, 'json', source=source)
+        if os.path.exists(legacy_coverage_path):
+            os.remove(legacy_coverage_path)
+
+    def update(
+            self,
+            cell: tuple,
+            raw: pd.DataFrame,
+            start: pd.Timestamp,
+            end: pd.Timestamp,
+            settled: bool = True,
+            source: str = METEOSTAT,
+            derived: pd.DataFrame = None
+    ):
+        """
+        Merge raw hourly weather into a cell's record and mark `start` to `end` as fetched.
+        :param settled: whether the data is final; if not, hours within `SETTLING_PERIOD` of now stay unfetched
+        :param derived: `derive_weather(raw, 'IP')` if already computed (e.g. in a worker process), used when the
+            cell holds no weather yet
+        """
+        with self.__lock__(cell, source=source):
+            table, coverage = self.__read__(cell, source=source)
+            if not raw.empty:
+                if (table is None or table.empty) and derived is not None:
+                    table = derived.sort_index()
+                else:
+                    table = __update_table__(table, raw[RAW_COLUMNS])
+            if not settled:
+                end = min(end, pd.Timestamp.now(tz='UTC').tz_localize(None).floor('h') - SETTLING_PERIOD)
+            if start <= end:
+                coverage = __merge_intervals__(coverage + [(start, end)])
+            if table is not None:
+                self.__save__(cell, table, coverage, source=source)
+
+    def get(
+            self,
+            latitude: float,
+            longitude: float,
+            start=None,
+            end=None,
+            unit_system: str = 'SI',
+            source: str = METEOSTAT
+    ) -> pd.DataFrame:
+        """
+        Hourly weather for the grid cell of a location. For Meteostat, only the hours the store does not hold yet
+        are fetched; other sources are served from disk.
+        :param start: first hour (UTC for Meteostat), defaulting to the start of the stored record
+        :param end: last hour, inclusive, defaulting to the end of the stored record
+        :param unit_system: `SI` or `IP` columns, as produced by `derive_weather`
+        :param source: `METEOSTAT`, or the source weather files were imported under with `import_files`
+        :return: pd.DataFrame indexed by hour; empty if no observations are available (e.g. offline)
+        """
+        cell = get_grid_cell(latitude, longitude, resolution_deg=self.resolution_deg)
+        start = None if start is None else pd.Timestamp(start).floor('h')
+        end = None if end is None else pd.Timestamp(end).floor('h')
+        columns = list(get_weather_columns(unit_system))
+
+        if source == METEOSTAT and not self.offline:
+            if start is None or end is None:
+                raise ValueError('`start` and `end` are required to fetch weather from Meteostat')
+            coverage = self.__read_coverage__(cell, source=source)
+            for missing_start, missing_end in __get_missing_intervals__(start, end, coverage):
+                raw = self.fetch(cell[0], cell[1], missing_start, missing_end)
+                self.update(cell, raw=raw, start=missing_start, end=missing_end, settled=False)
+
+        table, _ = self.__read__(cell, source=source)
+        if table is None:
+            return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='time'))
+        return table.loc[start:end, columns]
+
+    def import_files(
+            self,
+            paths: list,
+            source: str = TYPICAL_YEAR_SOURCE,
+            year=None,
+            max_workers: int = None
+    ) -> pd.DataFrame:
+        """
+        Import EPW / TMY3 weather files into the store, e.g. a library of typical years for offline use.
+        Files are parsed and their psychrometrics derived across a process pool, then written cell by cell;
+        a file that cannot be read is reported rather than aborting the import.
+        :param paths: weather file paths
+        :param source: store source to import under, read back with `get(..., source=source)`
+        :param year: as for `read_epw`
+        :param max_workers: number of worker processes, defaulting to all cores
+        :return: pd.DataFrame with one row per file: path, location, latitude, longitude, hours, status
+            (`ok` or `failed`) and error
+        """
+        rows = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(__read_and_derive__, path, year) for path in paths]
+            for path, future in zip(paths, futures):
+                row = {'path': path, 'status': 'ok', 'error': None}
+                try:
+                    weather_file, derived = future.result()
+                    raw = weather_file.raw
+                    self.update(
+                        get_grid_cell(weather_file.latitude, weather_file.longitude, self.resolution_deg),
+                        raw=raw,
+                        start=raw.index.min(),
+                        end=raw.index.max(),
+                        source=source,
+                        derived=derived
+                    )
+                    row.update({
+                        'location': weather_file.location,
+                        'latitude': weather_file.latitude,
+                        'longitude': weather_file.longitude,
+                        'hours': len(raw.index)
+                    })
+                except Exception as e:
+                    row.update({'status': 'failed', 'error': repr(e)})
+                rows.append(row)
+
+        return pd.DataFrame(
+            rows, columns=['path', 'location', 'latitude', 'longitude', 'hours', 'status', 'error']
+        )
+
+    def import_directory(self, directory: str, **kwargs) -> pd.DataFrame:
+        """
+        `import_files` for every EPW / TMY3 file in a directory (not recursive).
+        """
+        paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if os.path.splitext(name)[1].lower() in WEATHER_FILE_READERS
+        )
+        return self.import_files(paths, **kwargs)
+
+
+ARCHIVE_VERSION = 1
+
+
+def __is_categorical__(values: pd.Series) -> bool:
+    return values.dtype == object or isinstance(values.dtype, pd.CategoricalDtype)
+
+
+def write_weather_archive(directory: str, sites: dict, columns: list = None):
+    """
+    Write the weather of many sites as a memory-mappable columnar archive, read with `WeatherArchive`.
+    Every column is one .npy file holding all sites back to back: float64 for numeric columns and int16 codes
+    for label columns (e.g. the psychrometrics method), plus an int64 file of timestamps. `index.json` records
+    each site's rows and each label column's categories.
+    :param directory: archive directory, created if missing; an existing archive in it is overwritten
+    :param sites: dict of site name -> weather DataFrame indexed by hour, e.g. from `WeatherStore.get`
+    :param columns: columns to archive, defaulting to every column of the first site's weather
+    """
+    if not sites:
+        raise ValueError('`sites` must contain at least one weather DataFrame')
+
+    columns = list(next(iter(sites.values())).columns) if columns is None else list(columns)
+    for site, weather in sites.items():
+        missing = [column for column in columns if column not in weather.columns]
+        if missing:
+            raise ValueError(f"weather of site `{site}` is missing columns: {missing}")
+        if not isinstance(weather.index, pd.DatetimeIndex):
+            raise ValueError(f"weather of site `{site}` must be indexed by a DatetimeIndex")
+
+    first = next(iter(sites.values()))
+    categories = {
+        column: sorted({label for weather in sites.values() for label in weather[column].dropna().unique()})
+        for column in columns if __is_categorical__(first[column])
+    }
+
+    os.makedirs(directory, exist_ok=True)
+    rows = sum(len(weather.index) for weather in sites.values())
+    files = {column: f'column_{i}.npy' for i, column in enumerate(columns)}
+    arrays = {
+        column: np.lib.format.open_memmap(
+            os.path.join(directory, files[column]),
+            mode='w+',
+            dtype=np.int16 if column in categories else np.float64,
+            shape=(rows,)
+        )
+        for column in columns
+    }
+    time = np.lib.format.open_memmap(os.path.join(directory, 'time.npy'), mode='w+', dtype=np.int64, shape=(rows,))
+
+    index = {}
+    offset = 0
+    for site, weather in sites.items():
+        weather = weather.sort_index()
+        length = len(weather.index)
+        site_rows = slice(offset, offset + length)
+        time[site_rows] = (weather.index.tz_convert(None) if weather.index.tz else weather.index).as_unit('ns').asi8
+        for column in columns:
+            if column in categories:
+                arrays[column][site_rows] = pd.Categorical(weather[column], categories=categories[column]).codes
+            else:
+                arrays[column][site_rows] = weather[column].to_numpy(dtype=float)
+        index[site] = {
+            'offset': offset,
+            'length': length,
+            'start': weather.index[0].isoformat() if length else None,
+            'end': weather.index[-1].isoformat() if length else None
+        }
+        offset += length
+
+    for array in (time, *arrays.values()):
+        array.flush()
+    del time, arrays
+
+    # written last, so an archive is only readable once all of its arrays are complete
+    temporary_path = os.path.join(directory, f'index.json.{os.getpid()}.{uuid.uuid4().hex}.tmp')
+    with open(temporary_path, 'w') as f:
+        json.dump({'version': ARCHIVE_VERSION, 'files': files, 'categories': categories, 'sites': index}, f)
+    os.replace(temporary_path, os.path.join(directory, 'index.json'))
+
+
+@dataclass
+class WeatherArchive:
+    """
+    Read side of `write_weather_archive`. Column files are memory-mapped on first use, so opening an archive is
+    cheap in every worker process and slices are views into the page cache rather than copies.
+    """
+    directory: str
+    index: dict = field(init=False, repr=False)
+    __arrays__: dict = field(init=False, repr=False, default_factory=dict)
+
+    def __post_init__(self):
+        with open(os.path.join(self.directory, 'index.json')) as f:
+            self.index = json.load(f)
+        if self.index['version'] != ARCHIVE_VERSION:
+            raise ValueError(f"unsupported weather archive version {self.index['version']} in {self.directory}")
+
+    @property
+    def sites(self) -> list:
+        return list(self.index['sites'])
+
+    @property
+    def columns(self) -> list:
+        return list(self.index['files'])
+
+    def __get_array__(self, name: str) -> np.ndarray:
+        if name not in self.__arrays__:
+            file = 'time.npy' if name == 'time' else self.index['files'][name]
+            self.__arrays__[name] = np.load(os.path.join(self.directory, file), mmap_mode='r')
+        return self.__arrays__[name]
+
+    def __get_rows__(self, site: str, start=None, end=None) -> slice:
+        if site not in self.index['sites']:
+            raise ValueError(f"site `{site}` is not in the weather archive, which holds: {self.sites}")
+        offset, length = self.index['sites'][site]['offset'], self.index['sites'][site]['length']
+        time = self.__get_array__('time')[offset:offset + length]
+        first = 0 if start is None else np.searchsorted(time, pd.Timestamp(start).as_unit('ns').value, side='left')
+        last = length if end is None else np.searchsorted(time, pd.Timestamp(end).as_unit('ns').value, side='right')
+        return slice(offset + first, offset + last)
+
+    def get_arrays(self, site: str, start=None, end=None, columns: list = None) -> dict:
+        """
+        Zero-copy slice of one site's weather, e.g. one year: `get_arrays(site, '2021', '2021-12-31 23:00')`.
+        The result can be passed as `simulate.SimulationInputs.weather` or to `simulate.build_common_model`.
+        :param start: first hour, defaulting to the start of the site's record
+        :param end: last hour (inclusive), defaulting to the end of the site's record
+        :param columns: columns to slice, defaulting to all
+        :return: dict of column -> read-only np.ndarray view, with the timestamps under `time` (datetime64[ns]).
+            Label columns hold int16 codes into `index['categories'][column]`, -1 where missing
+        """
+        rows = self.__get_rows__(site, start=start, end=end)
+        arrays = {'time': self.__get_array__('time')[rows].view('datetime64[ns]')}
+        for column in self.columns if columns is None else columns:
+            if column not in self.index['files']:
+                raise ValueError(f"column `{column}` is not in the weather archive")
+            arrays[column] = self.__get_array__(column)[rows]
+        return arrays
+
+    def get_weather(self, site: str, start=None, end=None, columns: list = None) -> pd.DataFrame:
+        """
+        One site's weather as a DataFrame shaped like the Weather page's table, with label columns decoded.
+        Unlike `get_arrays` this copies the slice.
+        """
+        arrays = self.get_arrays(site, start=start, end=end, columns=columns)
+        index = pd.DatetimeIndex(arrays.pop('time'), name='time')
+        return pd.DataFrame({
+            column: pd.Categorical.from_codes(values, categories=self.index['categories'][column]).astype(object)
+            if column in self.index['categories'] else np.array(values)
+            for column, values in arrays.items()
+        }, index=index)
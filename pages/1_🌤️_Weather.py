@@ -1,262 +1,172 @@
 from datetime import datetime
 from datetime import timedelta
-import requests
+import os
 import pandas as pd
 import numpy as np
-import psychrolib
 import streamlit as st
-from meteostat import Point, Hourly
-import plotly.express as px
 import plotly.graph_objects as go
+from models import psychrometrics as psy
+from models import weather as wx
+from models import geocode as geo
+import charts
+import exports
 import utils
 
 
-def geocode(query: str) -> tuple:
+def get_geocoder(offline: bool):
     """
-    API wrapper to geocode a given query via https://positionstack.com/
-    :param query: location query to geocode
-    :return: tuple of (json response, latitude, longitude)
+    Geocoder for the session: the local gazetteer in offline mode, otherwise https://positionstack.com/
     """
+    if offline:
+        return geo.GazetteerGeocoder(path=utils.GAZETTEER_PATH)
+    return geo.PositionstackGeocoder(access_key=st.secrets['POSITIONSTACK_API_KEY'])
 
-    base_url = "http://api.positionstack.com/v1/"
-    response = requests.get(f"{base_url}forward?access_key={st.secrets['POSITIONSTACK_API_KEY']}&query={query}")
 
-    if response.status_code == 200:
-
-        resp = response.json()
-        data = resp['data'][0]
-        latitude, longitude = data['latitude'], data['longitude']
+def geocode(query: str) -> tuple:
+    """
+    Geocode a query through the session's geocode cache
+    :param query: location query to geocode
+    :return: tuple of (result, latitude, longitude)
+    """
+    geocode_cache = st.session_state.geocode_cache
 
-        return data, latitude, longitude
+    if geocode_cache.backend is None:
+        geocode_cache.backend = get_geocoder(offline=st.session_state.weather_store.offline)
 
-    else:
-        raise ValueError(f"Could not geocode query '{query}'\nError: '{response.text}'")
+    data = geocode_cache.geocode(query)
+    return data, data['latitude'], data['longitude']
 
 
 def update_geo(query: str):
     st.session_state.location_query = query
-    # utils.initialize_st_session_state(['geo', 'lat', 'lon'])
 
-    geo, lat, lon = geocode(query=query)
+    data, lat, lon = geocode(query=query)
 
-    st.session_state.geo = geo
+    # weather is shared by every location in a grid cell, so it only needs fetching again for a new cell
+    if st.session_state.lat is None or \
+            wx.get_grid_cell(lat, lon) != wx.get_grid_cell(st.session_state.lat, st.session_state.lon):
+        st.session_state.weather_data = None
+
+    st.session_state.geo = data
     st.session_state.lat = lat
     st.session_state.lon = lon
 
-    st.session_state.weather_data = None
-
 
-def calculate_psychrometrics(dry_bulb, dew_point, rh, pressure, unit_system: str = 'SI') -> pd.DataFrame:
-    """
-    Utility function on top of Psychrolib's "CalcPsychrometricsFrom__"
-    functions used to handle data structure and errors.
-
-    Args:
-    dry_bulb: Series object containing Dry Bulb temperatures [F]
-    dew_point: Series object containing Dew Point temperatures [F]
-    rh: Series object containing Relative Humidity [%]
-    pressure: Series object containing ambient air Pressure [psi]
-
-    Returns:
-    Humidity ratio in lb_H₂O lb_Air⁻¹ [IP] or kg_H₂O kg_Air⁻¹ [SI]
-    Wet-bulb temperature in °F [IP] or °C [SI]
-    Dew-point temperature in °F [IP] or °C [SI]
-    Partial pressure of water vapor in moist air in Psi [IP] or Pa [SI]
-    Moist air enthalpy in Btu lb⁻¹ [IP] or J kg⁻¹ [SI]
-    Specific volume of moist air in ft³ lb⁻¹ [IP] or in m³ kg⁻¹ [SI]
-    Degree of saturation [unitless]
-    """
-
-    if unit_system == 'SI':
-        psychrolib.SetUnitSystem(psychrolib.SI)
-        temp_units = 'C'
-        pressure_units = 'Pa'
-        hum_ratio_units = 'kgH2O/kgAir'
-        enthalpy_units = 'J/kg'
-        moist_air_volume_units = 'm^3/kg'
-    elif unit_system == 'IP':
-        psychrolib.SetUnitSystem(psychrolib.IP)
-        temp_units = 'F'
-        pressure_units = 'psi'
-        hum_ratio_units = 'lbH2O/lbAir'
-        enthalpy_units = 'Btu/lb'
-        moist_air_volume_units = 'ft^3/lb'
-    else:
-        raise ValueError(f"`unit_system` parameter must be one of: `SI` or `IP`, not {unit_system}")
-
-    df = pd.DataFrame()
-
-    df[f'Psychrometrics (in): dry_bulb [{temp_units}]'] = dry_bulb
-    if dew_point is not None:
-        df[f'Psychrometrics (in): dew_point [{temp_units}]'] = dew_point
-    if rh is not None:
-        df[f'Psychrometrics (in): relative_humidity [%]'] = rh
-    df[f'Psychrometrics (in): ambient_pressure [{pressure_units}]'] = pressure
-
-    try:
-        df[f'Psychrometrics (out): humidity_ratio [{hum_ratio_units}]'], \
-            df[f'Psychrometrics (out): wet_bulb [{temp_units}]'], \
-            df[f'Psychrometrics (out): dew_point [{temp_units}]'], \
-            df[f'Psychrometrics (out): partial_pressure_water_vapor [{pressure_units}]'], \
-            df[f'Psychrometrics (out): moist_air_enthalpy [{enthalpy_units}]'], \
-            df[f'Psychrometrics (out): specific_volume_moist_air [{moist_air_volume_units}]'], \
-            df[f'Psychrometrics (out): degree_of_saturation [-]'] = \
-            np.vectorize(psychrolib.CalcPsychrometricsFromRelHum)(dry_bulb, rh, pressure)
-
-    except Exception as e:
-        try:
-            df[f'Psychrometrics (out): humidity_ratio [{hum_ratio_units}]'], \
-                df[f'Psychrometrics (out): wet_bulb [{temp_units}]'], \
-                df[f'Psychrometrics (out): relative_humidity [%]'], \
-                df[f'Psychrometrics (out): partial_pressure_water_vapor [{pressure_units}]'], \
-                df[f'Psychrometrics (out): moist_air_enthalpy [{enthalpy_units}]'], \
-                df[f'Psychrometrics (out): specific_volume_moist_air [{moist_air_volume_units}]'], \
-                df[f'Psychrometrics (out): degree_of_saturation [-]'] = \
-                np.vectorize(psychrolib.CalcPsychrometricsFromTDewPoint)(dry_bulb, dew_point, pressure)
-        except Exception as e:
-            print(f'Error: {e}', 'Did not calculate with rh or dew_point, calculating wet_bulb only..')
-            df[f'Psychrometrics (out): wet_bulb [{temp_units}]'] = \
-                np.vectorize(psychrolib.GetTWetBulbFromTDewPoint)(dry_bulb, dew_point, pressure)
-
-    return df
-
-
-@st.cache
 def get_weather_data(unit_system: str = 'SI') -> pd.DataFrame:
 
-    def convert_hpa_to_pa(hpa):
-        return hpa * 100
-
-    def convert_pa_to_psi(pa):
-        return pa / 6_894.76
-
-    def convert_kmh_to_mph(kmh):
-        return kmh / 1.609
-
     yesterday = datetime.now() - timedelta(days=1)
     one_year_ago = yesterday - timedelta(days=365)
 
-    weather = Hourly(
-        loc=Point(lat=st.session_state.lat, lon=st.session_state.lon),
+    weather = st.session_state.weather_store.get(
+        latitude=st.session_state.lat,
+        longitude=st.session_state.lon,
         start=one_year_ago,
-        end=yesterday
-    ).fetch()
+        end=yesterday,
+        unit_system=unit_system
+    )
 
     if len(weather.index) < 1:
-        raise ValueError(f"Weather data unavailable for {st.session_state.geo['label']}. Please try another location.")
-
-    # https://dev.meteostat.net/formats.html#meteorological-data-units
-    weather = weather[['temp', 'dwpt', 'rhum', 'pres', 'wdir', 'wspd']]
-    weather.rename(columns={
-        'temp': 'temperature [C]',
-        'dwpt': 'dew_point [C]',
-        'rhum': 'relative_humidity [%]',
-        'pres': 'air_pressure [hPa]',
-        'wdir': 'wind_direction [deg]',
-        'wspd': 'wind_speed [km/h]'
-    }, inplace=True)
-    weather['air_pressure [Pa]'] = convert_hpa_to_pa(weather['air_pressure [hPa]'])
-
-    psychro = calculate_psychrometrics(
-        dry_bulb=weather['temperature [C]'],
-        dew_point=weather['dew_point [C]'],
-        rh=weather['relative_humidity [%]'],
-        pressure=weather['air_pressure [Pa]']
+        offline = ' stored for offline use' if st.session_state.weather_store.offline else ''
+        raise ValueError(
+            f"Weather data{offline} unavailable for {st.session_state.geo['label']}. Please try another location."
+        )
+
+    st.session_state.weather_data = weather
+    return weather
+
+
+def load_weather_file(uploaded_file):
+    weather_file = wx.read_weather_file(uploaded_file)
+
+    st.session_state.weather_file_name = uploaded_file.name
+    st.session_state.geo = {'label': weather_file.location, 'country_code': weather_file.country}
+    st.session_state.lat = weather_file.latitude
+    st.session_state.lon = weather_file.longitude
+
+    st.session_state.weather_data = wx.derive_weather(
+        weather_file.raw,
+        unit_system='SI' if weather_file.country != 'USA' else 'IP'
     )
 
-    if unit_system == 'IP':
 
-        weather['temperature [F]'] = utils.convert_degC_to_degF(weather['temperature [C]'])
-        weather['dew_point [F]'] = utils.convert_degC_to_degF(weather['dew_point [C]'])
-        weather['air_pressure [psi]'] = convert_pa_to_psi(weather['air_pressure [Pa]'])
-        weather['wind_speed [mph]'] = convert_kmh_to_mph(weather['wind_speed [km/h]'])
+def update_weather_source(weather_source: str):
+    st.session_state.weather_source = weather_source
 
-        psychro_ip = calculate_psychrometrics(
-            dry_bulb=weather['temperature [F]'],
-            dew_point=weather['dew_point [F]'],
-            rh=weather['relative_humidity [%]'],
-            pressure=weather['air_pressure [psi]'],
-            unit_system=unit_system
-        )
+    for v in ['location_query', 'weather_file_name', 'geo', 'lat', 'lon', 'weather_data']:
+        st.session_state[v] = None
 
-        # because these are dimensionless units, they are duplicated between 'IP' and 'SI' calculations
-        psychro_ip.drop(
-            columns=[
-                'Psychrometrics (in): relative_humidity [%]',
-                'Psychrometrics (out): relative_humidity [%]',
-                'Psychrometrics (out): degree_of_saturation [-]'
-            ],
-            inplace=True
-        )
 
-        weather_psychro = [weather, psychro, psychro_ip]
+def build_min_max_avg_figure(values: pd.Series, resample_type: str = None, time_window: tuple = None) -> go.Figure:
+    col = values.name
 
+    if 'wet' in col:
+        min_fill_color = '#34004e'
+        max_fill_color = '#8d56b7'
     else:
-        weather_psychro = [weather, psychro]
+        min_fill_color = '#00224E'
+        max_fill_color = '#b76856'
+
+    dff = values.to_frame() if time_window is None else values.loc[time_window[0]:time_window[1]].to_frame()
+    dfr = dff.resample(resample_type or charts.get_resample_rule(dff.index)).agg(['min', 'mean', 'max'])
+    dfr.columns = dfr.columns.map(' - '.join).str.strip(' - ')
+
+    col_min = [c for c in dfr.columns if 'min' in c][0]
+    col_avg = [c for c in dfr.columns if 'mean' in c][0]
+    col_max = [c for c in dfr.columns if 'max' in c][0]
+
+    fig = go.Figure([
+        go.Scatter(
+            name='Max',
+            x=dfr.index,
+            y=dfr[col_max],
+            mode='lines',
+            line=dict(color=max_fill_color),
+        ),
+        go.Scatter(
+            name='Avg',
+            x=dfr.index,
+            y=dfr[col_avg],
+            mode='lines',
+            line=dict(color='black'),
+            fillcolor=max_fill_color,
+            fill='tonexty'
+        ),
+        go.Scatter(
+            name='Min',
+            x=dfr.index,
+            y=dfr[col_min],
+            line=dict(color=min_fill_color),
+            mode='lines',
+            fillcolor=min_fill_color,
+            fill='tonexty',
+        )
+    ])
+    fig.update_layout(
+        yaxis_title=col,
+        hovermode='x',
+        showlegend=False,
+        title=col
+    )
+    return fig
 
-    weather = pd.concat(weather_psychro, axis=1)
 
-    st.session_state.weather_data = weather
-    return weather
+def build_density_contour_figure(x: pd.Series, y: pd.Series, title: str) -> go.Figure:
+    fig = charts.density_contour(
+        x=x,
+        y=y,
+        x_title=x.name,
+        y_title=y.name,
+        title=title,
+        height=600,
+    )
+    fig.update_traces(contours_coloring="fill", contours_showlabels=True, colorscale='Cividis')
+    return fig
 
 
 def plot_weather_data(unit_system: str = 'SI'):
+    # figures are served from the figure cache while the weather and plot parameters are unchanged
 
-    def plot_column_min_max_avg(df: pd.DataFrame, cols: list, resample_type: str = '1d'):
-
-        for col in cols:
-
-            if 'wet' in col:
-                min_fill_color = '#34004e'
-                max_fill_color = '#8d56b7'
-            else:
-                min_fill_color = '#00224E'
-                max_fill_color = '#b76856'
-
-            dff = df[[col]].copy()
-            dfr = dff.resample(resample_type).agg(['min', 'mean', 'max'])
-            dfr.columns = dfr.columns.map(' - '.join).str.strip(' - ')
-
-            col_min = [c for c in dfr.columns if 'min' in c][0]
-            col_avg = [c for c in dfr.columns if 'mean' in c][0]
-            col_max = [c for c in dfr.columns if 'max' in c][0]
-
-            fig = go.Figure([
-                go.Scatter(
-                    name='Max',
-                    x=dfr.index,
-                    y=dfr[col_max],
-                    mode='lines',
-                    line=dict(color=max_fill_color),
-                ),
-                go.Scatter(
-                    name='Avg',
-                    x=dfr.index,
-                    y=dfr[col_avg],
-                    mode='lines',
-                    line=dict(color='black'),
-                    fillcolor=max_fill_color,
-                    fill='tonexty'
-                ),
-                go.Scatter(
-                    name='Min',
-                    x=dfr.index,
-                    y=dfr[col_min],
-                    line=dict(color=min_fill_color),
-                    mode='lines',
-                    fillcolor=min_fill_color,
-                    fill='tonexty',
-                )
-            ])
-            fig.update_layout(
-                yaxis_title=col,
-                hovermode='x',
-                showlegend=False,
-                title=col
-            )
-            st.plotly_chart(fig, use_container_width=True)
-
-    df = st.session_state.weather_data.copy()
+    df = st.session_state.weather_data
 
     temp_units = '[C]' if unit_system == 'SI' else '[F]'
 
@@ -264,31 +174,46 @@ def plot_weather_data(unit_system: str = 'SI'):
     col_rh = f'Psychrometrics (in): relative_humidity [%]'
     col_wet_bulb = f'Psychrometrics (out): wet_bulb {temp_units}'
 
-    fig_db_wb_contour = px.density_contour(
-        df,
-        x=col_dry_bulb,
-        y=col_wet_bulb,
-        title=f"Heat Map of Dry Bulb vs Wet Bulb",
-        height=600,
+    fig_db_wb_contour = charts.get_figure(
+        build_density_contour_figure,
+        x=df[col_dry_bulb],
+        y=df[col_wet_bulb],
+        title=f"Heat Map of Dry Bulb vs Wet Bulb"
     )
-    fig_db_wb_contour.update_traces(contours_coloring="fill", contours_showlabels=True, colorscale='Cividis')
-
-    fig_db_rh_contour = px.density_contour(
-        df,
-        x=col_dry_bulb,
-        y=col_rh,
-        # range_y=[0, 100],
-        title=f"Heat Map of Dry Bulb vs Relative Humidity",
-        height=600,
+
+    fig_db_rh_contour = charts.get_figure(
+        build_density_contour_figure,
+        x=df[col_dry_bulb],
+        y=df[col_rh],
+        title=f"Heat Map of Dry Bulb vs Relative Humidity"
     )
-    fig_db_rh_contour.update_traces(contours_coloring="fill", contours_showlabels=True, colorscale='Cividis')
 
     col01, col02 = st.columns(2)
 
     col01.plotly_chart(fig_db_rh_contour, use_container_width=True)
     col02.plotly_chart(fig_db_wb_contour, use_container_width=True)
 
-    plot_column_min_max_avg(df, [col_dry_bulb, col_wet_bulb])
+    time_window = charts.select_time_window(df.index, key='weather_time_window')
+    for col in [col_dry_bulb, col_wet_bulb]:
+        st.plotly_chart(
+            charts.get_figure(build_min_max_avg_figure, values=df[col], time_window=time_window),
+            use_container_width=True
+        )
+
+
+def __report_psychrometrics_methods__():
+    methods = st.session_state.weather_data['Psychrometrics (out): method [-]'].value_counts()
+    fallback = methods.drop(psy.METHOD_RELATIVE_HUMIDITY, errors='ignore')
+
+    if fallback.sum() > 0:
+        st.info(
+            f"Psychrometrics were calculated from relative humidity for "
+            f"{methods.get(psy.METHOD_RELATIVE_HUMIDITY, 0):,} hours, from dew point for "
+            f"{methods.get(psy.METHOD_DEW_POINT, 0):,} hours and interpolated for "
+            f"{methods.get(psy.METHOD_INTERPOLATED, 0):,} hours with missing humidity data. "
+            f"{methods.get(psy.METHOD_MISSING, 0):,} hours could not be calculated.",
+            icon='🌡️'
+        )
 
 
 def __app_set_location__():
@@ -307,6 +232,27 @@ def __app_set_location__():
         if location_query != st.session_state.location_query:
             update_geo(location_query)
 
+    __app_show_location__()
+
+
+def __app_set_weather_file__():
+    st.subheader('Load a weather file')
+
+    uploaded_file = st.file_uploader(
+        label='Weather file',
+        type=['epw', 'csv'],
+        help='Typical-year or actual-year weather as an EnergyPlus (.epw) or NSRDB TMY3 (.csv) file.'
+    )
+
+    if uploaded_file is not None:
+
+        if uploaded_file.name != st.session_state.weather_file_name:
+            load_weather_file(uploaded_file)
+
+    __app_show_location__()
+
+
+def __app_show_location__():
     if st.session_state.geo:
         geo = st.session_state.geo
         lat = st.session_state.lat
@@ -329,14 +275,15 @@ def __app_set_weather__():
         if isinstance(st.session_state.weather_data, pd.DataFrame):
 
             st.subheader("Weather Data")
+            __report_psychrometrics_methods__()
             plot_weather_data(unit_system='SI' if st.session_state.geo['country_code'] != 'USA' else 'IP')
 
             with st.expander('View Raw Weather Data'):
                 st.dataframe(st.session_state.weather_data)
-                st.download_button(
-                    label='Download as CSV',
-                    data=st.session_state.weather_data.to_csv().encode('utf-8'),
-                    file_name=f"weather_data_{st.session_state.geo['label'].replace(', ', '_')}.csv"
+                exports.download(
+                    st.session_state.weather_data,
+                    file_name=f"weather_data_{st.session_state.geo['label'].replace(', ', '_')}",
+                    key='weather_export'
                 )
 
 
@@ -353,11 +300,43 @@ st.set_page_config(
 with st.sidebar:
     st.info('Geocoding provided by [positionstack](https://positionstack.com/)', icon='🗺️')
     st.info('Weather data provided by [Metostat](https://dev.meteostat.net/)', icon='🌤️')
-    st.info('Psychrometrics calculated with [PsychroLib](https://github.com/psychrometrics/psychrolib)', icon='🌡️')
+    st.info('Psychrometric equations from [PsychroLib](https://github.com/psychrometrics/psychrolib)', icon='🌡️')
+    weather_offline = st.checkbox(
+        label='Offline mode',
+        help='Use only weather data already stored on this machine, without downloading from Meteostat, '
+             'and geocode from the local gazetteer.'
+    )
 
-utils.initialize_st_session_state(['location_query', 'geo', 'lat', 'lon', 'weather_data'])
+utils.initialize_st_session_state([
+    'weather_source', 'location_query', 'weather_file_name', 'geo', 'lat', 'lon', 'weather_data'
+])
+utils.initialize_st_session_state({
+    'weather_store': wx.WeatherStore(directory=os.path.join(utils.CACHE_DIRECTORY, 'weather')),
+    'geocode_cache': geo.GeocodeCache(directory=os.path.join(utils.CACHE_DIRECTORY, 'geocode'))
+})
+# the geocoder is chosen again, on the next lookup, only when offline mode is toggled
+if weather_offline != st.session_state.weather_store.offline:
+    st.session_state.geocode_cache.backend = None
+st.session_state.weather_store.offline = weather_offline
 
 st.header('Weather Data Acquisition and Analysis')
 
-__app_set_location__()
+weather_sources = ['Meteostat', 'Weather file']
+weather_source = st.radio(
+    label='Weather source',
+    options=weather_sources,
+    index=weather_sources.index(st.session_state.weather_source) if st.session_state.weather_source else 0,
+    horizontal=True,
+    help='Trailing year of observations for any location from Meteostat, or a typical-year (EPW / TMY3) file.'
+)
+
+if st.session_state.weather_source is None:
+    st.session_state.weather_source = weather_source
+elif weather_source != st.session_state.weather_source:
+    update_weather_source(weather_source)
+
+if weather_source == 'Meteostat':
+    __app_set_location__()
+else:
+    __app_set_weather_file__()
 __app_set_weather__()
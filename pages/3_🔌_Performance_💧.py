@@ -1,10 +1,13 @@
+import os
 import pandas as pd
 import numpy as np
 import streamlit as st
-import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from models import simulate as sim
+from models import cache
+import charts
+import exports
 import utils
 
 
@@ -57,22 +60,69 @@ def compare_design_inputs() -> dict:
     return {**diff_common, **diff_ct, **diff_chiller}
 
 
+def build_simulation_inputs() -> sim.SimulationInputs:
+    """
+    Adapter from the Design and Weather pages' session state to the headless simulation engine.
+    """
+    return sim.SimulationInputs(
+        weather=st.session_state.weather_data,
+        load_it_kw=st.session_state.load_it_kw,
+        energy_cost_dollar_per_kwh=st.session_state.energy_cost_dollar_per_kwh,
+        water_cost_dollar_per_m3=st.session_state.water_cost_dollar_per_m3,
+        baseline=sim.DesignInputs(
+            cooling_tower=st.session_state.baseline_ct,
+            chiller=st.session_state.baseline_chiller,
+            additional_power_kw=st.session_state.baseline_add_power_kw,
+            additional_heat_load_kw=st.session_state.baseline_add_heat_load_kw
+        ),
+        proposed=sim.DesignInputs(
+            cooling_tower=st.session_state.proposed_ct,
+            chiller=st.session_state.proposed_chiller,
+            additional_power_kw=st.session_state.proposed_add_power_kw,
+            additional_heat_load_kw=st.session_state.proposed_add_heat_load_kw
+        )
+    )
+
+
 def simulate():
 
     mechanical_system = st.session_state.mechanical_system
 
     if mechanical_system == 'Water-Cooled-Chiller':
-        system = sim.WaterCooledChiller()
-        return system.simulate()
+        # unchanged inputs are served from memory; otherwise arms simulated before, even by an earlier session,
+        # load from disk, and the rest are re-simulated incrementally, re-running only the stages whose inputs changed
+        with st.spinner('Simulating Baseline and Proposed...'):
+            results = st.session_state.simulation_cache.simulate(
+                inputs=build_simulation_inputs(),
+                store=st.session_state.result_store
+            )
+
+        for name, violations in (
+                ('Baseline', results.baseline_part_load_ratio_violations),
+                ('Proposed', results.proposed_part_load_ratio_violations)
+        ):
+            if violations is not None and violations.hours:
+                st.warning(f"**{name} Chiller:** {violations.message}", icon='⚠️')
+
+        # each arm's own results only; weather stays in `st.session_state.weather_data`, shared rather than copied
+        # into both tables
+        return results.baseline_buffer.to_frame(), results.proposed_buffer.to_frame()
 
     else:
         print('Future support for additional mechanical system archetypes.')
 
 
+def __get_it_energy_kwh__(results: pd.DataFrame) -> float:
+    #  hourly timestep, so 1 kW = 1 kWh; a constant IT load is a run parameter, not a column
+    if 'it_load_kw' in results:
+        return results['it_load_kw'].sum()
+    return results.attrs['parameters']['it_load_kw'] * len(results.index)
+
+
 def get_performance_metrics(baseline, proposed):
 
     b_energy_kwh = round(baseline['total_power_consumption [kW]'].sum(), 0)
-    b_it_energy_kwh = baseline['it_load_kw'].sum()
+    b_it_energy_kwh = __get_it_energy_kwh__(baseline)
     b_water_liters = round(baseline['ct_makeup_flowrate_total [m^3]'].sum() * 1000, 0)
     b_energy_cost = round(baseline['Energy Cost [$]'].sum(), 0)
     b_water_cost = round(baseline['Water Cost [$]'].sum(), 0)
@@ -81,7 +131,7 @@ def get_performance_metrics(baseline, proposed):
     b_wue = round(b_water_liters / b_it_energy_kwh, 2)
 
     p_energy_kwh = round(proposed['total_power_consumption [kW]'].sum(), 0)
-    p_it_energy_kwh = proposed['it_load_kw'].sum()
+    p_it_energy_kwh = __get_it_energy_kwh__(proposed)
     p_water_liters = round(proposed['ct_makeup_flowrate_total [m^3]'].sum() * 1000, 0)
     p_energy_cost = round(proposed['Energy Cost [$]'].sum(), 0)
     p_water_cost = round(proposed['Water Cost [$]'].sum(), 0)
@@ -179,39 +229,34 @@ def plot_performance_metrics(metrics, baseline, proposed, energy_savings_kwh, wa
     )
 
 
-def plot_results(baseline, proposed):
-    def __update_legend_bottom_left__(fig):
-        fig.update_layout(legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=-0.4,
-            xanchor="left",
-            x=0
-        ))
+def __update_legend_bottom_left__(fig):
+    fig.update_layout(legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=-0.4,
+        xanchor="left",
+        x=0
+    ))
 
-    st.subheader('Performance Insights')
-
-    comparison = pd.DataFrame({
-        'baseline_total_water_consumption [m^3]': baseline['ct_makeup_flowrate_total [m^3]'],
-        'proposed_total_water_consumption [m^3]': proposed['ct_makeup_flowrate_total [m^3]']
-    })
-    comparison.index = baseline.index
 
+def build_performance_over_time_figure(pue: pd.Series, wue: pd.Series, time_window: tuple = None) -> go.Figure:
     fig_pue_wue_time = make_subplots(specs=[[{'secondary_y': True}]])
     fig_pue_wue_time.add_trace(
-        go.Line(
-            x=proposed.index,
-            y=proposed['PUE [-]'],
+        charts.line(
+            x=pue.index,
+            y=pue,
             name='PUE [-]',
+            time_window=time_window,
             line=dict(color='#2f964a')
         ),
         secondary_y=False,
     )
     fig_pue_wue_time.add_trace(
-        go.Line(
-            x=proposed.index,
-            y=proposed['WUE [L/kWh]'],
+        charts.line(
+            x=wue.index,
+            y=wue,
             name='WUE [L/kWh]',
+            time_window=time_window,
             line=dict(color='#161870')
         ),
         secondary_y=True
@@ -220,76 +265,143 @@ def plot_results(baseline, proposed):
     fig_pue_wue_time.update_yaxes(title_text="PUE [-]", secondary_y=False)
     fig_pue_wue_time.update_yaxes(title_text="WUE [L/kWh]", secondary_y=True)
     __update_legend_bottom_left__(fig_pue_wue_time)
-    st.plotly_chart(fig_pue_wue_time, use_container_width=True)
+    return fig_pue_wue_time
 
-    unit_system = 'SI' if st.session_state.geo['country_code'] != 'USA' else 'IP'
-    temp_units = '[C]' if unit_system == 'SI' else '[F]'
 
-    col_dry_bulb = f'Psychrometrics (in): dry_bulb {temp_units}'
-    col_rh = f'Psychrometrics (in): relative_humidity [%]'
-    col_wet_bulb = f'Psychrometrics (out): wet_bulb {temp_units}'
-
-    col01, col02 = st.columns(2)
-
-    fig_pue_wue_heatmap = px.density_contour(
-        proposed,
-        x='PUE [-]',
-        range_x=[proposed['PUE [-]'].min(), proposed['PUE [-]'].max()],
-        y='WUE [L/kWh]',
-        range_y=[proposed['WUE [L/kWh]'].min(), proposed['WUE [L/kWh]'].max()],
+def build_pue_wue_heatmap_figure(pue: pd.Series, wue: pd.Series) -> go.Figure:
+    fig_pue_wue_heatmap = charts.density_contour(
+        x=pue,
+        y=wue,
+        x_title='PUE [-]',
+        y_title='WUE [L/kWh]',
+        range_x=(pue.min(), pue.max()),
+        range_y=(wue.min(), wue.max()),
         title=f"Heat Map of PUE vs WUE",
         height=600,
     )
-    fig_pue_wue_heatmap.update_traces(contours_coloring="fill", contours_showlabels=True, colorscale='Cividis', showscale=False)
-    col01.plotly_chart(fig_pue_wue_heatmap, use_container_width=True)
-
-    fig_water_cumsum_heatmap = px.density_heatmap(
-        proposed,
-        x=proposed.index,
-        y=col_wet_bulb,
-        z='ct_makeup_flowrate_total [m^3]',
-        nbinsx=365,
-        histfunc='sum',
+    fig_pue_wue_heatmap.update_traces(
+        contours_coloring="fill", contours_showlabels=True, colorscale='Cividis', showscale=False
+    )
+    return fig_pue_wue_heatmap
+
+
+def build_water_cumsum_heatmap_figure(wet_bulb: pd.Series, water: pd.Series) -> go.Figure:
+    fig_water_cumsum_heatmap = charts.density_heatmap(
+        x=wet_bulb.index,
+        y=wet_bulb,
+        z=water,
+        x_title='',
+        y_title=wet_bulb.name,
+        nbins_x=365,
         height=600,
-        color_continuous_scale='Cividis',
         title='Cumulative Water Consumption by Day and Wetbulb'
     )
-    fig_water_cumsum_heatmap.update(layout_coloraxis_showscale=False)
-    col02.plotly_chart(fig_water_cumsum_heatmap, use_container_width=True)
-
-    wetbulb_bin_count = int(proposed[col_wet_bulb].max() - proposed[col_wet_bulb].min()) * 4
-    fig_water_consumption_by_wetbulb = px.histogram(
-        proposed,
-        x=col_wet_bulb,
-        y=[
-            'ct_makeup_flowrate_evaporation [m^3]',
-            'ct_makeup_flowrate_drift [m^3]',
-            'ct_makeup_flowrate_blowdown [m^3]'
-        ],
-        histfunc='sum',
+    fig_water_cumsum_heatmap.update_traces(colorscale='Cividis', showscale=False)
+    return fig_water_cumsum_heatmap
+
+
+def build_water_consumption_by_wetbulb_figure(wet_bulb: pd.Series, end_uses: pd.DataFrame) -> go.Figure:
+    wetbulb_bin_count = int(wet_bulb.max() - wet_bulb.min()) * 4
+    fig_water_consumption_by_wetbulb = charts.histogram(
+        x=wet_bulb,
+        ys={column: end_uses[column] for column in end_uses.columns},
+        x_title=wet_bulb.name,
         height=600,
-        nbins=wetbulb_bin_count,
+        nbins=max(wetbulb_bin_count, 1),
         title='Water Consumption by Wetbulb and End-Use'
     )
     __update_legend_bottom_left__(fig_water_consumption_by_wetbulb)
-    col01.plotly_chart(fig_water_consumption_by_wetbulb, use_container_width=True)
-
-    fig_water_consumption_comparison = px.line(
-        comparison,
-        x=comparison.index,
-        y=[
-            'baseline_total_water_consumption [m^3]',
-            'proposed_total_water_consumption [m^3]'
-        ],
+    return fig_water_consumption_by_wetbulb
+
+
+def build_water_consumption_comparison_figure(comparison: pd.DataFrame, time_window: tuple = None) -> go.Figure:
+    fig_water_consumption_comparison = go.Figure([
+        charts.line(
+            x=comparison.index,
+            y=comparison[column],
+            name=column,
+            # the chart is half the page wide
+            width_px=charts.CHART_WIDTH_PX // 2,
+            time_window=time_window,
+            line=dict(color=color)
+        )
+        for column, color in (
+            ('baseline_total_water_consumption [m^3]', '#161870'),
+            ('proposed_total_water_consumption [m^3]', '#2f964a')
+        )
+    ])
+    fig_water_consumption_comparison.update_layout(
         height=600,
         title='Total Water Consumption | Baseline vs Proposed',
-        color_discrete_map={
-            'baseline_total_water_consumption [m^3]': '#161870',
-            'proposed_total_water_consumption [m^3]': '#2f964a'
-        }
+        yaxis_title='value'
     )
     __update_legend_bottom_left__(fig_water_consumption_comparison)
-    col02.plotly_chart(fig_water_consumption_comparison, use_container_width=True)
+    return fig_water_consumption_comparison
+
+
+def plot_results(weather, baseline, proposed):
+    # figures are served from the figure cache while the results and plot parameters are unchanged
+
+    st.subheader('Performance Insights')
+
+    comparison = pd.DataFrame({
+        'baseline_total_water_consumption [m^3]': baseline['ct_makeup_flowrate_total [m^3]'],
+        'proposed_total_water_consumption [m^3]': proposed['ct_makeup_flowrate_total [m^3]']
+    })
+    comparison.index = baseline.index
+
+    time_window = charts.select_time_window(proposed.index, key='performance_time_window')
+
+    st.plotly_chart(
+        charts.get_figure(
+            build_performance_over_time_figure,
+            pue=proposed['PUE [-]'],
+            wue=proposed['WUE [L/kWh]'],
+            time_window=time_window
+        ),
+        use_container_width=True
+    )
+
+    unit_system = 'SI' if st.session_state.geo['country_code'] != 'USA' else 'IP'
+    temp_units = '[C]' if unit_system == 'SI' else '[F]'
+
+    col_dry_bulb = f'Psychrometrics (in): dry_bulb {temp_units}'
+    col_rh = f'Psychrometrics (in): relative_humidity [%]'
+    col_wet_bulb = f'Psychrometrics (out): wet_bulb {temp_units}'
+
+    col01, col02 = st.columns(2)
+
+    col01.plotly_chart(
+        charts.get_figure(build_pue_wue_heatmap_figure, pue=proposed['PUE [-]'], wue=proposed['WUE [L/kWh]']),
+        use_container_width=True
+    )
+
+    col02.plotly_chart(
+        charts.get_figure(
+            build_water_cumsum_heatmap_figure,
+            wet_bulb=weather[col_wet_bulb],
+            water=proposed['ct_makeup_flowrate_total [m^3]']
+        ),
+        use_container_width=True
+    )
+
+    col01.plotly_chart(
+        charts.get_figure(
+            build_water_consumption_by_wetbulb_figure,
+            wet_bulb=weather[col_wet_bulb],
+            end_uses=proposed[[
+                'ct_makeup_flowrate_evaporation [m^3]',
+                'ct_makeup_flowrate_drift [m^3]',
+                'ct_makeup_flowrate_blowdown [m^3]'
+            ]]
+        ),
+        use_container_width=True
+    )
+
+    col02.plotly_chart(
+        charts.get_figure(build_water_consumption_comparison_figure, comparison=comparison, time_window=time_window),
+        use_container_width=True
+    )
 
 
 st.set_page_config(
@@ -335,6 +447,11 @@ st.set_page_config(
 #
 #             st.experimental_rerun()
 
+utils.initialize_st_session_state({
+    'simulation_cache': cache.SimulationCache(maxsize=8),
+    'result_store': cache.DiskCache(directory=os.path.join(utils.CACHE_DIRECTORY, 'results'))
+})
+
 baseline, proposed = simulate()
 metrics = get_performance_metrics(baseline, proposed)
 
@@ -343,7 +460,7 @@ water_savings_liters = metrics['proposed_water_savings_liters']
 
 st.header('Performance')
 plot_performance_metrics(metrics, baseline, proposed, energy_savings_kwh, water_savings_liters)
-plot_results(baseline, proposed)
+plot_results(st.session_state.weather_data, baseline, proposed)
 
 savings_water_consumption_liters = metrics['proposed_water_savings_liters']
 
@@ -392,15 +509,7 @@ with st.expander('View Raw Results'):
     col01, col02 = st.columns(2)
     col01.text('Baseline Model')
     col01.dataframe(baseline)
-    col01.download_button(
-        label='Download as CSV',
-        data=baseline.to_csv().encode('utf-8'),
-        file_name=f"baseline.csv"
-    )
+    exports.download(baseline, file_name='baseline', key='baseline_export', container=col01)
     col02.text('Proposed Model')
     col02.dataframe(proposed)
-    col02.download_button(
-        label='Download as CSV',
-        data=baseline.to_csv().encode('utf-8'),
-        file_name=f"proposed.csv"
-    )
+    exports.download(proposed, file_name='proposed', key='proposed_export', container=col02)
@@ -1,9 +1,14 @@
-import streamlit as st
+import os
 
 STANDARD_DENSITY_OF_WATER_KG_M3 = 1_000  # [kg/m^3]
 SPECIFIC_HEAT_CAPACITY_OF_WATER_KJ_KGC = 4.184  # [kJ/kg-C]
 VOLUME_OF_OLYMPIC_SIZED_SWIMMING_POOL_LITERS = 2_500_000  # https://en.wikipedia.org/wiki/Olympic-size_swimming_pool
 HUMAN_DAILY_DRINKING_WATER_REQUIREMENT_LITERS = 3.0
+CACHE_DIRECTORY = os.environ.get(
+    'ENERGY_WATER_NEXUS_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'energy-water-nexus')
+)
+GAZETTEER_PATH = os.environ.get('ENERGY_WATER_NEXUS_GAZETTEER', os.path.join(CACHE_DIRECTORY, 'gazetteer.csv'))
 
 
 def convert_degC_to_degF(degC):
@@ -19,6 +24,7 @@ def convert_deltaF_to_deltaC(deltaF):
 
 
 def initialize_st_session_state(variables):
+    import streamlit as st  # imported here so the simulation engine can import `utils` without Streamlit
 
     if isinstance(variables, list):
         for v in variables: